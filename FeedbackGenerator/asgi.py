@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FeedbackGenerator.settings')
 
-application = get_asgi_application()
+# Django нужно инициализировать до импорта channels (он обращается к settings и моделям)
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter  # noqa: E402
+
+# HTTP обслуживает Django (в т.ч. прокси-вью к микросервисам),
+# websocket-маршруты добавляются сюда, когда появятся consumers
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+})
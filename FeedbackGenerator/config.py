@@ -0,0 +1,62 @@
+"""
+Единая загрузка конфигурации проекта из окружения (.env).
+
+`.env` читается ровно один раз за процесс — при первом вызове `get_config()`.
+Все остальные модули берут значения через `django.conf.settings`,
+а не вызывают `load_dotenv()` / `os.getenv()` самостоятельно.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Config:
+    secret_key: str
+    debug: bool
+    allowed_origin: Optional[str]
+    encryption_key: Optional[str]
+    dgis_service_replicas: Tuple[str, ...]
+    flamp_service_replicas: Tuple[str, ...]
+    dgis_batch_actions: bool
+    redis_url: Optional[str]
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """
+    Читает булево значение из окружения ('true' в любом регистре → True).
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() == 'true'
+
+
+def env_list(name: str) -> Tuple[str, ...]:
+    """
+    Читает список значений через запятую из окружения (пустые элементы отбрасываются).
+    """
+    return tuple(item.strip() for item in os.getenv(name, '').split(',') if item.strip())
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """
+    Загружает .env и возвращает типизированную конфигурацию.
+    Результат кешируется, поэтому повторные вызовы не перечитывают файл.
+    """
+    load_dotenv()
+
+    return Config(
+        secret_key=os.getenv('SECRET_KEY', 'default-secret-key'),
+        debug=env_bool('DEBUG'),
+        allowed_origin=os.getenv('ALLOWED_ORIGIN'),
+        encryption_key=os.getenv('ENCRYPTION_KEY'),
+        dgis_service_replicas=env_list('DGIS_SERVICE_ADDRESS'),
+        flamp_service_replicas=env_list('FLAMP_SERVICE_ADDRESS'),
+        dgis_batch_actions=env_bool('DGIS_BATCH_ACTIONS'),
+        redis_url=os.getenv('REDIS_URL'),
+    )
@@ -9,18 +9,17 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
-import logging
 import os
 from datetime import datetime
 from pathlib import Path
 
-from django.contrib import staticfiles
-from dotenv import load_dotenv
 from pythonjsonlogger.json import JsonFormatter
 
+from FeedbackGenerator.config import get_config
 from FeedbackGenerator.utils.mask_data import MaskingFilter
 
-load_dotenv()
+# .env читается один раз за процесс, дальше значения берутся из settings
+config = get_config()
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,10 +30,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.getenv('SECRET_KEY', 'default-secret-key')
+SECRET_KEY = config.secret_key
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+DEBUG = config.debug
 
 ALLOWED_HOSTS = ['*']
 
@@ -56,17 +55,30 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'FeedbackGenerator.utils.query_budget.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'FeedbackGenerator.utils.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'FeedbackGenerator.utils.throttling.InFlightLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 MIDDLEWARE.insert(0, 'corsheaders.middleware.CorsMiddleware')
 
+# Бюджет SQL-запросов на один HTTP-запрос (QueryCountMiddleware пишет warning при превышении)
+QUERY_COUNT_WARNING_THRESHOLD = 20
+# Сколько раз один и тот же шаблон запроса может повториться, прежде чем считать это N+1
+QUERY_REPEAT_WARNING_THRESHOLD = 5
+
+# Ответы меньше этого размера (байт) не сжимаются (FeedbackGenerator/utils/compression.py).
+# Сжатие — gzip; br и zstd выключены, пока не установлены пакеты brotli / zstandard (их нет в req.txt,
+# и у этих кодировок нет защиты от BREACH, которая есть у gzip)
+COMPRESSION_MIN_SIZE = 1024
+
 ROOT_URLCONF = 'FeedbackGenerator.urls'
 
 TEMPLATES = [
@@ -94,9 +106,32 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'EXCEPTION_HANDLER': 'FeedbackGenerator.utils.exceptions.custom_exception_handler',
-
+    # JSON кодируется и разбирается msgspec (FeedbackGenerator/utils/json_codec.py), формы — как обычно
+    'DEFAULT_RENDERER_CLASSES': (
+        'FeedbackGenerator.utils.json_codec.MsgspecJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'FeedbackGenerator.utils.json_codec.MsgspecJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Скользящее окно в Redis (или в памяти процесса без REDIS_URL), см. FeedbackGenerator/utils/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': (
+        'FeedbackGenerator.utils.throttling.UserSlidingWindowThrottle',
+        'FeedbackGenerator.utils.throttling.EndpointSlidingWindowThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '600/min',  # Все эндпоинты вместе
+        'endpoint': '120/min',  # Один эндпоинт и действие, если у вью не задан свой throttle_scope
+        'search': '60/min',
+        'photos': '600/min',  # Страница отзывов грузит десятки фото за раз
+    },
 }
 
+# Одновременных запросов одного пользователя к /api/ (остальные получают 429)
+MAX_IN_FLIGHT_PER_USER = 8
+
 WSGI_APPLICATION = 'FeedbackGenerator.wsgi.application'
 
 
@@ -165,7 +200,7 @@ SESSION_SAVE_EVERY_REQUEST = True
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB, например
 
-ASGI_APPLICATION = 'finApplications.asgi.application'
+ASGI_APPLICATION = 'FeedbackGenerator.asgi.application'
 
 CHANNEL_LAYERS = {
     'default': {
@@ -176,17 +211,87 @@ CHANNEL_LAYERS = {
     },
 }
 
-CORS_ALLOWED_ORIGINS = [
-    os.getenv("ALLOWED_ORIGIN"),  # Адрес фронта
-]
+# Адрес фронта (если ALLOWED_ORIGIN не задан — список пустой, а не [None])
+CORS_ALLOWED_ORIGINS = [config.allowed_origin] if config.allowed_origin else []
 
 CORS_ALLOW_CREDENTIALS = True  # Для передачи cookies/токенов аутентификации
 
-CSRF_TRUSTED_ORIGINS = [
-    os.getenv("ALLOWED_ORIGIN"),  # Адрес фронта
-]
+CSRF_TRUSTED_ORIGINS = [config.allowed_origin] if config.allowed_origin else []
 CSRF_COOKIE_HTTPONLY = False  # Чтобы фронт мог читать токен из cookie
 
+# Адреса микросервисов площадок. В окружении можно указать несколько реплик через запятую:
+# URL запросов строятся от первой, а запросы распределяются между всеми (main_site/services/replicas.py)
+DGIS_SERVICE_REPLICAS = config.dgis_service_replicas
+FLAMP_SERVICE_REPLICAS = config.flamp_service_replicas
+DGIS_SERVICE_ADDRESS = DGIS_SERVICE_REPLICAS[0] if DGIS_SERVICE_REPLICAS else None
+FLAMP_SERVICE_ADDRESS = FLAMP_SERVICE_REPLICAS[0] if FLAMP_SERVICE_REPLICAS else None
+# Параметр запроса, по которому запросы одного аккаунта закрепляются за репликой (None — только по нагрузке)
+UPSTREAM_STICKY_PARAM = 'main_user_id'
+# Реплика исключается из балансировки после стольких ошибок подряд на столько секунд
+UPSTREAM_EJECT_AFTER = 3
+UPSTREAM_EJECT_SECONDS = 30
+
+# Одновременных запросов к микросервисам на процесс (main_site/services/upstream.py): сколько из них
+# зарезервировано под пользовательские запросы и сколько секунд ждать свободного слота.
+# Столько же соединений в пуле общего клиента event loop (upstream.loop_client)
+UPSTREAM_MAX_CONCURRENCY = 32
+UPSTREAM_INTERACTIVE_RESERVED = 8
+UPSTREAM_QUEUE_TIMEOUT = 10
+# Фоновых запросов одновременно на всех воркерах (только при REDIS_URL) и срок аренды слота, сек:
+# аренда упавшего воркера освобождается через это время, поэтому он больше таймаута любого запроса
+UPSTREAM_BACKGROUND_LIMIT = 16
+UPSTREAM_BACKGROUND_LEASE = 120
+# Одновременных запросов к микросервисам на одну страницу общей ленты отзывов (по запросу на филиал)
+INBOX_CONCURRENCY = 4
+
+# Ключ шифрования паролей профилей (Fernet)
+ENCRYPTION_KEY = config.encryption_key
+
+# Массовые операции с отзывами (ответы, избранное, жалобы)
+BULK_MAX_ITEMS = 500  # Отзывов в одном запросе
+BULK_CONCURRENCY = 4  # Параллельных запросов к микросервису на один массовый запрос
+# Лимит запросов к площадке от имени одного аккаунта (профиля): скорость в секунду и допустимый всплеск.
+# Одиночный запрос ждёт своей очереди не дольше MAX_WAIT секунд, иначе получает 429 с Retry-After.
+ACCOUNT_RATE_LIMIT_PER_SECOND = 2.0
+ACCOUNT_RATE_LIMIT_BURST = 5
+ACCOUNT_RATE_LIMIT_MAX_WAIT = 5
+# Массовая операция ждёт очереди аккаунта на каждый отзыв не дольше этого, иначе отзыв получает ошибку
+BULK_ACCOUNT_MAX_WAIT = 60
+# Redis для общих между воркерами счётчиков (лимит аккаунтов); без него счётчики в памяти процесса
+REDIS_URL = config.redis_url
+# Микросервис 2GIS принимает пакетные запросы избранного и жалоб (/api/favorite/batch, /api/complaints/batch)
+DGIS_BATCH_ACTIONS = config.dgis_batch_actions
+BULK_BATCH_SIZE = 50  # Отзывов в одном пакетном запросе
+
+# Журнал изменений профилей и филиалов (main_site/services/audit.py): буфер сбрасывается в БД после каждого
+# запроса, а вне запросов — раз в AUDIT_FLUSH_INTERVAL секунд или при AUDIT_BUFFER_SIZE записях
+AUDIT_FLUSH_INTERVAL = 5
+AUDIT_BUFFER_SIZE = 200
+
+# Прокси фото отзывов (main_site/services/photo_proxy.py): миниатюры WebP в кеше на диске
+PHOTO_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'photos')
+PHOTO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PHOTO_THUMBNAIL_SIZES = (160, 320, 640)  # Допустимые ширины миниатюр, px
+PHOTO_PROXY_WORKERS = 2  # Процессов для уменьшения фото
+PHOTO_PROXY_MAX_BYTES = 15 * 1024 * 1024  # Максимальный размер оригинала
+PHOTO_PROXY_MAX_PIXELS = 50_000_000  # Максимум пикселей оригинала (защита от «декомпрессионных бомб»)
+# Хосты CDN площадок (и их поддомены), с которых прокси скачивает фото
+PHOTO_PROXY_ALLOWED_HOSTS = ('2gis.com', '2gis.ru', 'flamp.ru')
+
+# Последние успешные ответы микросервисов (main_site/services/last_known_good.py): отдаются с пометкой stale,
+# пока микросервис недоступен. Хранятся в Redis (общие для воркеров) или в памяти процесса без REDIS_URL
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'last_known_good': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+        if REDIS_URL else
+        {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'last-known-good'}
+    ),
+}
+LKG_MAX_AGE = 24 * 60 * 60  # Сек, дольше последний ответ не хранится
+LKG_REFRESH_ATTEMPTS = 3  # Попыток фонового обновления после ошибки микросервиса
+LKG_REFRESH_BACKOFF = 1  # Сек до второй попытки, дальше пауза удваивается
+
 
 LOGGING = {
     'version': 1,
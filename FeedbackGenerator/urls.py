@@ -18,8 +18,6 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
-
 from main_site.views.auth import UserLoginAPIView, LogoutAPIView
 
 urlpatterns = [
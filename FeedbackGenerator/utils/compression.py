@@ -0,0 +1,212 @@
+"""
+Сжатие ответов API по Accept-Encoding клиента.
+
+Отзывы и выгрузки — крупный однообразный JSON с русским текстом, сжимается в несколько раз.
+Кодировки в порядке предпочтения сервера: zstd и br — если установлены пакеты zstandard / brotli
+(необязательные, импортируются при первом использовании), gzip — всегда (стандартная библиотека).
+
+- Обычные ответы меньше COMPRESSION_MIN_SIZE байт не сжимаются: выигрыша нет, а время тратится.
+- Потоковые ответы (NDJSON массовых операций) сжимаются по частям: каждая часть сбрасывается
+  в выходной поток сразу (sync flush), поэтому клиент по-прежнему видит прогресс построчно.
+- Защита от BREACH, как в GZipMiddleware Django 4.2+: в заголовок gzip добавляется имя файла случайной
+  длины (до GZIP_MAX_RANDOM_BYTES байт), и длина ответа перестаёт точно отражать степень сжатия.
+  У br и zstd такого поля нет, поэтому они без этой защиты; пакеты brotli и zstandard не входят в req.txt,
+  и в поставке эти кодировки выключены — ставить их стоит, только если в сжатых ответах нет секретов
+  рядом с данными из запроса.
+"""
+import gzip
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+# Сжимаемые типы содержимого (картинки и архивы уже сжаты)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                      'text/')
+
+
+GZIP_MAX_RANDOM_BYTES = 100  # Как GZipMiddleware.max_random_bytes
+
+
+def _gzip_header():
+    """
+    Заголовок gzip (RFC 1952) с именем файла случайной длины, как у django.utils.text.compress_sequence.
+    """
+    filename = b'a' * secrets.randbelow(GZIP_MAX_RANDOM_BYTES)
+    return b'\x1f\x8b\x08' + bytes([gzip.FNAME]) + b'\x00\x00\x00\x00\x00\xff' + filename + b'\x00'
+
+
+class GzipCoding:
+    name = 'gzip'
+    level = 6  # Как в compress_string
+
+    def compress(self, content):
+        return compress_string(content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+    def stream(self):
+        # Сырой deflate: заголовок со случайным именем и хвост (CRC32, размер) gzip пишутся здесь
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        header = [_gzip_header()]
+        crc = size = 0
+
+        def compress(chunk):
+            nonlocal crc, size
+            crc, size = zlib.crc32(chunk, crc), size + len(chunk)
+            return (header.pop() if header else b'') + compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish():
+            return (header.pop() if header else b'') + compressor.flush() + struct.pack('<II', crc, size & 0xffffffff)
+
+        return compress, finish
+
+
+class BrotliCoding:
+    name = 'br'
+    quality = 5  # Максимум (11) слишком медленный для ответов «на лету»
+
+    def compress(self, content):
+        import brotli
+
+        return brotli.compress(content, quality=self.quality)
+
+    def stream(self):
+        import brotli
+
+        compressor = brotli.Compressor(quality=self.quality)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+
+
+class ZstdCoding:
+    name = 'zstd'
+    level = 3
+
+    def compress(self, content):
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=self.level).compress(content)
+
+    def stream(self):
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return (lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), \
+            compressor.flush
+
+
+def _installed(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+_codings = None
+
+
+def available_codings():
+    """
+    Кодировки, доступные в этом окружении, в порядке предпочтения сервера.
+    """
+    global _codings
+    if _codings is None:
+        _codings = [coding for coding, module in ((ZstdCoding(), 'zstandard'), (BrotliCoding(), 'brotli'))
+                    if _installed(module)] + [GzipCoding()]
+    return _codings
+
+
+def accepted_encodings(header):
+    """
+    :param header: Значение Accept-Encoding, например "gzip, br;q=0.9, zstd;q=0".
+    :return: {кодировка: q} без кодировок с q=0.
+    """
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    return {name: quality for name, quality in accepted.items() if quality > 0}
+
+
+def negotiate(header):
+    """
+    :return: Кодировка с наибольшим q у клиента (при равных — по предпочтению сервера) или None.
+    """
+    accepted = accepted_encodings(header or '')
+    candidates = [coding for coding in available_codings() if accepted.get(coding.name, accepted.get('*', 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda coding: accepted.get(coding.name, accepted.get('*', 0)))
+
+
+def _compressed_stream(coding, content):
+    compress, finish = coding.stream()
+    for chunk in content:
+        if chunk:
+            yield compress(chunk)
+    yield finish()
+
+
+async def _compressed_stream_async(coding, content):
+    compress, finish = coding.stream()
+    async for chunk in content:
+        if chunk:
+            yield compress(chunk)
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip / br / zstd по Accept-Encoding (как django.middleware.gzip.GZipMiddleware,
+    но с выбором кодировки и порогом размера COMPRESSION_MIN_SIZE).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        # Ответ зависит от Accept-Encoding, даже если этот клиент сжатие не поддерживает
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.headers.get('Accept-Encoding'))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _compressed_stream_async(coding, response.streaming_content)
+            else:
+                response.streaming_content = _compressed_stream(coding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = coding.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело побайтово отличается от исходного, поэтому строгий ETag становится слабым (как в GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding.name
+        return response
@@ -9,12 +9,14 @@ def custom_exception_handler(exc, context):
 
     if response is not None:
         # Возвращаем JSON-ответ, если DRF обработал исключение
+        # (с заголовками DRF: Retry-After при троттлинге, WWW-Authenticate)
         return Response(
             {
                 "error": response.data.get("detail", "Произошла ошибка"),
                 "status_code": response.status_code,
             },
             status=response.status_code,
+            headers={key: value for key, value in response.items() if key != 'Content-Type'},
         )
 
     # Если исключение не обработано, например, 404
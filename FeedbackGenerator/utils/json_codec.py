@@ -0,0 +1,94 @@
+"""
+Общий JSON-кодек проекта на msgspec (уже используется для быстрого пути отзывов 2GIS).
+
+- MsgspecJSONRenderer / MsgspecJSONParser — замена JSONRenderer / JSONParser DRF (REST_FRAMEWORK в settings).
+- response_json() — тело ответа микросервиса (httpx): декодируется один раз, результат сохраняется на объекте
+  ответа, повторные вызовы (например, при логировании ошибки) его переиспользуют.
+"""
+import msgspec
+from django.db.models.query import QuerySet
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+
+def _enc_hook(obj):
+    """
+    Типы, которые JSONEncoder DRF умеет сериализовать, а msgspec — нет.
+    """
+    if isinstance(obj, Promise):  # Ленивые строки переводов
+        return str(obj)
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if hasattr(obj, 'tolist'):  # numpy-массивы и скаляры
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise NotImplementedError(f"Объект типа {type(obj).__name__} не сериализуется в JSON")
+
+
+_encoder = msgspec.json.Encoder(enc_hook=_enc_hook)
+_decoder = msgspec.json.Decoder()
+
+
+def dumps(obj) -> bytes:
+    """
+    :raises TypeError: Если объект не сериализуется.
+    """
+    try:
+        return _encoder.encode(obj)
+    except NotImplementedError as exc:
+        raise TypeError(str(exc)) from exc
+
+
+def loads(content):
+    """
+    :raises ValueError: Если content — не корректный JSON (как json.loads).
+    """
+    try:
+        return _decoder.decode(content)
+    except msgspec.DecodeError as exc:
+        raise ValueError(str(exc)) from exc
+
+
+def response_json(response):
+    """
+    JSON-тело ответа httpx. Декодируется при первом вызове, дальше берётся из response.extensions.
+
+    :raises ValueError: Если тело — не JSON.
+    """
+    if 'decoded_json' not in response.extensions:
+        response.extensions['decoded_json'] = loads(response.content)
+    return response.extensions['decoded_json']
+
+
+class MsgspecJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer с кодированием через msgspec: компактный UTF-8 вывод, как у DRF с настройками по умолчанию.
+    Отличия: datetime — с микросекундами (RFC 3339), timedelta — ISO 8601 (PT90S) вместо секунд строкой,
+    bytes — base64 вместо декодированной строки.
+    Отступы (indent из Accept для BrowsableAPI) не поддерживаются — для них используется стандартный рендерер.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class MsgspecJSONParser(JSONParser):
+    renderer_class = MsgspecJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
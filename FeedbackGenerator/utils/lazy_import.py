@@ -0,0 +1,36 @@
+"""
+Отложенный импорт тяжёлых библиотек, нужных только при обработке запроса (httpx и т.п.).
+
+    httpx = lazy_module('httpx')
+
+Модуль импортируется при первом обращении к его атрибуту, поэтому старт воркера
+(django.setup() и загрузка URLconf) его не загружает. Обращения к атрибутам в теле функций
+и в except-ветках работают как с обычным модулем; на уровне модуля (базовые классы, аннотации)
+атрибуты прокси использовать нельзя — это сразу загрузит библиотеку.
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    Прокси модуля, импортирующий его при первом обращении к атрибуту.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
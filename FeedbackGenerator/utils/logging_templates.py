@@ -1,5 +1,7 @@
 import logging
 
+from FeedbackGenerator.utils.json_codec import response_json
+
 logger = logging.getLogger(__name__)
 
 
@@ -112,6 +114,21 @@ def log_response(*, request, request_name, **kwargs):
     )
 
 
+def _response_data(response):
+    """
+    Тело ответа для лога: у DRF Response берём data (content до рендера недоступен), у httpx — JSON или текст.
+    """
+    if hasattr(response, 'data'):
+        return response.data
+    if not response.content:
+        return None
+    try:
+        # Если вызывающий код уже декодировал тело, повторно оно не разбирается
+        return response_json(response)
+    except ValueError:
+        return response.text
+
+
 def log_error_response(*, service_name, service_url=None, method=None, headers=None, params=None, payload=None,
                        response=None, exception=None, request=None, exc_info=False, **kwargs):
     """
@@ -136,10 +153,10 @@ def log_error_response(*, service_name, service_url=None, method=None, headers=N
         "params": params,
         "payload": payload,
     }
-    if response:
+    if response is not None:
         log_data.update({
             "status_code": response.status_code,
-            "response_data": response.json() if response.content else None,
+            "response_data": _response_data(response),
         })
     if exception:
         log_data.update({"error": str(exception)})
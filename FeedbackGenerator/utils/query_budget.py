@@ -0,0 +1,64 @@
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Обёртка для connection.execute_wrapper: считает SQL-запросы и повторы одного и того же шаблона.
+    Django передаёт SQL с плейсхолдерами отдельно от параметров, поэтому одинаковые
+    запросы с разными ID дают один шаблон — это и есть признак N+1.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        self.templates[sql] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.templates.most_common() if count >= threshold]
+
+
+class QueryCountMiddleware:
+    """
+    Считает SQL-запросы на каждый HTTP-запрос.
+
+    Пишет предупреждение, если запросов больше QUERY_COUNT_WARNING_THRESHOLD
+    или один и тот же шаблон запроса повторился QUERY_REPEAT_WARNING_THRESHOLD раз (N+1).
+    В DEBUG добавляет заголовок X-Query-Count.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_queries = getattr(settings, 'QUERY_COUNT_WARNING_THRESHOLD', 20)
+        self.repeat_threshold = getattr(settings, 'QUERY_REPEAT_WARNING_THRESHOLD', 5)
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        repeated = counter.repeated(self.repeat_threshold)
+        if counter.total > self.max_queries or repeated:
+            logger.warning(
+                "Превышен бюджет SQL-запросов" if not repeated else "Возможный N+1 в SQL-запросах",
+                extra={
+                    "path": request.path,
+                    "method": request.method,
+                    "query_count": counter.total,
+                    "max_queries": self.max_queries,
+                    "repeated_queries": [{"sql": sql[:300], "count": count} for sql, count in repeated[:3]],
+                },
+            )
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(counter.total)
+        return response
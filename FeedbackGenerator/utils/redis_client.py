@@ -0,0 +1,25 @@
+"""
+Общий клиент Redis для счётчиков, которые должны быть едиными для всех воркеров (лимиты запросов).
+
+Redis необязателен: без REDIS_URL get_redis() возвращает None, и вызывающий код использует счётчики в памяти процесса.
+"""
+from django.conf import settings
+
+REDIS_TIMEOUT = 1  # Таймаут подключения и команд, сек: лимиты не должны тормозить запросы, если Redis завис
+
+_clients = {}
+
+
+def get_redis():
+    """
+    :return: Клиент redis.Redis для REDIS_URL или None, если Redis не настроен.
+    :raises ImportError: Если REDIS_URL задан, а пакет redis не установлен.
+    """
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url:
+        return None
+    if url not in _clients:
+        import redis
+
+        _clients[url] = redis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+    return _clients[url]
@@ -0,0 +1,274 @@
+"""
+Ограничение входящих запросов к API.
+
+- UserSlidingWindowThrottle — общая квота пользователя на все эндпоинты (DEFAULT_THROTTLE_RATES['user']).
+- EndpointSlidingWindowThrottle — квота пользователя на один эндпоинт и действие: по умолчанию
+  DEFAULT_THROTTLE_RATES['endpoint'], вью может задать свою через throttle_scope.
+- InFlightLimitMiddleware — не больше MAX_IN_FLIGHT_PER_USER одновременных запросов пользователя к /api/,
+  чтобы одна зациклившаяся вкладка не заняла все воркеры и соединения с микросервисами.
+
+Окно скользящее (лог запросов за последние N секунд), а не фиксированное: на границе минуты нельзя
+получить двойную квоту. Если задан REDIS_URL, счётчики хранятся в Redis и общие для всех воркеров,
+иначе (или если Redis недоступен) — в памяти процесса.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from FeedbackGenerator.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_TTL = 300  # Через сколько секунд слот считается утёкшим (воркер умер, не освободив его)
+
+# KEYS[1] — лог запросов (sorted set по времени); ARGV: окно в мс, лимит, уникальный ID запроса.
+# Возвращает 0, если запрос принят, иначе через сколько мс освободится место в окне.
+HIT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local window = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return math.max(1, oldest[2] + window - now)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return 0
+"""
+
+# KEYS[1] — запросы в работе (sorted set по времени начала); ARGV: лимит, ID запроса, TTL слота в мс.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class LocalStore:
+    """
+    Счётчики в памяти процесса: та же логика, что в Lua-скриптах.
+    """
+
+    def __init__(self):
+        self.hits = defaultdict(deque)
+        self.in_flight = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        with self.lock:
+            now = time.monotonic()
+            hits = self.hits[key]
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return hits[0] + window - now
+            hits.append(now)
+            return 0
+
+    def acquire(self, key, limit, token):
+        with self.lock:
+            now = time.monotonic()
+            slots = self.in_flight[key]
+            for stale in [token for token, started in slots.items() if started <= now - IN_FLIGHT_TTL]:
+                del slots[stale]
+            if len(slots) >= limit:
+                return False
+            slots[token] = now
+            return True
+
+    def release(self, key, token):
+        with self.lock:
+            self.in_flight[key].pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.hits.clear()
+            self.in_flight.clear()
+
+
+class RedisStore:
+    """
+    Счётчики в Redis, общие для всех воркеров.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.hit_script = client.register_script(HIT_SCRIPT)
+        self.acquire_script = client.register_script(ACQUIRE_SCRIPT)
+
+    def hit(self, key, limit, window):
+        return int(self.hit_script(keys=[key], args=[int(window * 1000), limit, uuid.uuid4().hex])) / 1000
+
+    def acquire(self, key, limit, token):
+        return bool(self.acquire_script(keys=[key], args=[limit, token, IN_FLIGHT_TTL * 1000]))
+
+    def release(self, key, token):
+        self.client.zrem(key, token)
+
+
+local_store = LocalStore()
+
+
+def _call(method, *args):
+    """
+    Вызывает метод хранилища счётчиков: Redis, если настроен и доступен, иначе память процесса.
+    """
+    try:
+        client = get_redis()
+        if client is not None:
+            return getattr(RedisStore(client), method)(*args)
+    except Exception as exc:
+        logger.warning("Лимит запросов: Redis недоступен, используются счётчики в памяти процесса",
+                       extra={'error': str(exc)})
+    return getattr(local_store, method)(*args)
+
+
+def request_ident(request):
+    """
+    Кого ограничиваем: пользователь, для анонимных запросов — IP клиента так же, как у троттлинга DRF
+    (X-Forwarded-For с учётом NUM_PROXIES, иначе REMOTE_ADDR): за прокси REMOTE_ADDR у всех один.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle со скользящим окном в общем хранилище (атомарно, в отличие от кеша Django).
+    """
+
+    def get_rate(self):
+        # Квоты читаются при каждом запросе, а не при импорте, чтобы их можно было менять через override_settings
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        return super().get_rate()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = _call('hit', self.key, self.num_requests, self.duration)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        return f"throttle:user:{request_ident(request)}"
+
+
+class EndpointSlidingWindowThrottle(SlidingWindowThrottle):
+    """
+    Квота на эндпоинт: вью и действие (action из URL) считаются отдельно, review_id — нет.
+    """
+    scope = 'endpoint'
+
+    def __init__(self):
+        # Квота выбирается по вью в allow_request
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scope', None) or EndpointSlidingWindowThrottle.scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        endpoint = f"{view.__class__.__name__}:{view.kwargs.get('action', '')}:{request.method}"
+        return f"throttle:endpoint:{request_ident(request)}:{endpoint}"
+
+
+class StreamRelease:
+    """
+    Обёртка потока ответа, которая вызывает release, когда поток отдан целиком или закрыт (Django закрывает
+    ответ и тогда, когда клиент отключился, не дочитав поток). release вызывается один раз.
+    """
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def close(self):
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+
+
+class ReleasingStream(StreamRelease):
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+
+class AsyncReleasingStream(StreamRelease):
+    """
+    Для асинхронных потоков (ответы под ASGI).
+    """
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.close()
+
+
+class InFlightLimitMiddleware:
+    """
+    Не больше MAX_IN_FLIGHT_PER_USER одновременных запросов одного пользователя к /api/, лишние получают 429.
+    Для потоковых ответов слот занят, пока поток не отдан или не закрыт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        limit = getattr(settings, 'MAX_IN_FLIGHT_PER_USER', None)
+        if not limit or not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        key = f"in_flight:{request_ident(request)}"
+        token = uuid.uuid4().hex
+        if not _call('acquire', key, limit, token):
+            logger.warning("Превышен лимит одновременных запросов пользователя",
+                           extra={'path': request.path, 'ident': key, 'limit': limit})
+            response = JsonResponse({"error": "Слишком много одновременных запросов", "status_code": 429}, status=429)
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _call('release', key, token)
+            raise
+
+        if response.streaming:
+            # Поток у ответа с close(): Django вызывает его при закрытии ответа
+            stream_class = AsyncReleasingStream if response.is_async else ReleasingStream
+            response.streaming_content = stream_class(response.streaming_content, lambda: _call('release', key, token))
+        else:
+            _call('release', key, token)
+        return response
@@ -0,0 +1,61 @@
+"""
+Конфигурация gunicorn для продакшн-запуска (вместо `manage.py runserver`).
+
+Режимы (переменная окружения SERVER_MODE):
+    - wsgi (по умолчанию): воркеры gthread + FeedbackGenerator.wsgi.
+      Вью синхронные и большую часть времени ждут ответа микросервиса,
+      поэтому потоки внутри процесса дают основную пропускную способность.
+    - asgi: воркеры uvicorn + FeedbackGenerator.asgi (Channels).
+
+Все параметры можно переопределить через переменные окружения GUNICORN_*.
+Запуск: gunicorn -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() == 'true'
+
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'FeedbackGenerator.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # Асинхронному воркеру хватает процесса на ядро
+    workers = _env_int('GUNICORN_WORKERS', CPU_COUNT + 1)
+else:
+    wsgi_app = 'FeedbackGenerator.wsgi:application'
+    worker_class = 'gthread'
+    # Классическая формула для I/O-bound нагрузки: 2 * CPU + 1 процессов
+    workers = _env_int('GUNICORN_WORKERS', CPU_COUNT * 2 + 1)
+    threads = _env_int('GUNICORN_THREADS', 4)
+
+# Загружаем приложение в мастере до fork: воркеры стартуют быстрее и делят память (copy-on-write).
+# С preload код не перечитывается по SIGHUP — для выкладки нового кода используйте USR2 + QUIT старого мастера.
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+# Перезапуск воркера после N запросов (с разбросом, чтобы воркеры не рестартовали одновременно)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# Привязка профиля к микросервису (логин в 2GIS/Flamp) может занимать до 30 секунд
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
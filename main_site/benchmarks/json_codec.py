@@ -0,0 +1,66 @@
+"""
+Микро-бенчмарк JSON-кодека API: стандартные JSONRenderer / JSONParser DRF и json (httpx response.json())
+против msgspec (FeedbackGenerator/utils/json_codec.py).
+
+Меряется процессорное время (process_time) на одну операцию — то, что тратит воркер на запрос,
+без учёта ожидания сети.
+"""
+import io
+import json
+import time
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from FeedbackGenerator.utils.json_codec import MsgspecJSONParser, MsgspecJSONRenderer, loads
+from main_site.benchmarks.reviews import make_payload
+from main_site.services.Dgis.Dgis_reviews import filter_review
+
+
+def measure_cpu(func, iterations=50):
+    """
+    Возвращает процессорное время одного вызова в миллисекундах.
+    """
+    func()  # Прогрев
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1000
+
+
+def _row(name, payload_bytes, standard_ms, msgspec_ms):
+    return {
+        "case": name,
+        "payload_bytes": payload_bytes,
+        "standard_ms": round(standard_ms, 3),
+        "msgspec_ms": round(msgspec_ms, 3),
+        "saved_ms": round(standard_ms - msgspec_ms, 3),
+        "speedup": round(standard_ms / msgspec_ms, 2) if msgspec_ms else None,
+    }
+
+
+def run(reviews=1000, iterations=50):
+    upstream_body = make_payload(reviews)
+    page = {"reviews": [filter_review(review) for review in json.loads(upstream_body)["reviews"]],
+            "count": reviews, "filial_id": "1"}
+    rendered = JSONRenderer().render(page)
+    request_body = json.dumps({"items": [{"review_id": str(i), "text": "Спасибо за отзыв!"} for i in range(500)]},
+                              ensure_ascii=False).encode()
+
+    cases = [
+        ("Ответ API (рендер)", len(rendered),
+         lambda: JSONRenderer().render(page), lambda: MsgspecJSONRenderer().render(page)),
+        ("Тело запроса (парсер)", len(request_body),
+         lambda: JSONParser().parse(io.BytesIO(request_body)),
+         lambda: MsgspecJSONParser().parse(io.BytesIO(request_body))),
+        ("Ответ микросервиса", len(upstream_body),
+         lambda: json.loads(upstream_body), lambda: loads(upstream_body)),
+    ]
+    rows = [_row(name, size, measure_cpu(standard, iterations), measure_cpu(fast, iterations))
+            for name, size, standard, fast in cases]
+    return {
+        "reviews": reviews,
+        "cases": rows,
+        # Запрос отзывов: декодирование ответа микросервиса + рендер ответа API
+        "saved_ms_per_reviews_request": round(rows[0]["saved_ms"] + rows[2]["saved_ms"], 3),
+    }
@@ -0,0 +1,53 @@
+"""
+Микро-бенчмарк преобразования отзывов 2GIS: стандартный путь (json + dict + JSONRenderer DRF)
+против быстрого (msgspec-структуры + кодирование сразу в байты).
+"""
+import json
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from main_site.benchmarks.stub_service import StubConfig, build_reviews
+from main_site.services.Dgis.Dgis_reviews import decode_reviews, encode_reviews_page, filter_review
+
+
+def make_payload(reviews=1000, text_length=300, photos=2) -> bytes:
+    """
+    Тело ответа микросервиса `/api/get_reviews` с заданным кол-вом отзывов.
+    """
+    config = StubConfig(reviews=reviews, text_length=text_length, photos=photos)
+    return json.dumps({"reviews": build_reviews(config)}, ensure_ascii=False).encode()
+
+
+def standard_path(content: bytes, filial_id='1') -> bytes:
+    data = json.loads(content)
+    filtered = [filter_review(review) for review in data.get("reviews", [])]
+    return JSONRenderer().render({"reviews": filtered, "count": len(filtered), "filial_id": filial_id})
+
+
+def fast_path(content: bytes, filial_id='1') -> bytes:
+    return encode_reviews_page(decode_reviews(content), filial_id)
+
+
+def measure(func, content, iterations=50):
+    """
+    Возвращает среднее время одного вызова в миллисекундах.
+    """
+    func(content)  # Прогрев
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(content)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run(reviews=1000, iterations=50):
+    content = make_payload(reviews)
+    standard_ms = measure(standard_path, content, iterations)
+    fast_ms = measure(fast_path, content, iterations)
+    return {
+        "reviews": reviews,
+        "payload_bytes": len(content),
+        "standard_ms": round(standard_ms, 3),
+        "fast_ms": round(fast_ms, 3),
+        "speedup": round(standard_ms / fast_ms, 2) if fast_ms else None,
+    }
@@ -0,0 +1,265 @@
+"""
+Прогон нагрузочных сценариев по эндпоинтам и сбор метрик.
+
+Два транспорта:
+    - DjangoClientTransport — запросы идут через django.test.Client внутри процесса,
+      дополнительно считается кол-во SQL-запросов на каждый HTTP-запрос;
+    - HttpTransport — запросы идут по сети в запущенный сервер (gunicorn/uvicorn),
+      SQL-запросы в этом режиме не считаются.
+"""
+import json
+import math
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str  # Может содержать плейсхолдеры {profile_id}, {filial_id}, ... (см. discover_ids)
+    params: Optional[dict] = None
+    data: Optional[dict] = None
+
+
+@dataclass
+class RequestResult:
+    status_code: int
+    elapsed: float  # Секунды
+    queries: Optional[int] = None
+
+
+@dataclass
+class ScenarioReport:
+    name: str
+    requests: int
+    errors: int
+    duration: float
+    latencies: list = field(repr=False, default_factory=list)
+    queries: list = field(repr=False, default_factory=list)
+
+    @property
+    def throughput(self):
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, p):
+        return percentile(self.latencies, p) * 1000
+
+    @property
+    def avg_queries(self):
+        return statistics.mean(self.queries) if self.queries else None
+
+    @property
+    def max_queries(self):
+        return max(self.queries) if self.queries else None
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput_rps": round(self.throughput, 2),
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "avg_queries": self.avg_queries,
+            "max_queries": self.max_queries,
+        }
+
+
+def percentile(values, p):
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+DEFAULT_SCENARIOS = [
+    # Внешние (прокси к микросервисам)
+    Scenario('2gis reviews', 'GET', '/api/external/api_2gis_profiles/reviews/',
+             params={'main_user_id': '{profile_id}', 'filial_id': '{filial_id}'}),
+    Scenario('2gis stats', 'GET', '/api/external/api_2gis_profiles/stats/', params={'filial_id': '{filial_id}'}),
+    Scenario('2gis trigger_stats', 'POST', '/api/external/api_2gis_profiles/trigger_stats/',
+             data={'filial_id': '{filial_id}'}),
+    Scenario('2gis toggle_favorite', 'POST', '/api/external/api_2gis_reviews/toggle_favorite/1000000/'),
+    Scenario('2gis toggle_complaint', 'POST', '/api/external/api_2gis_reviews/toggle_complaint/1000000/',
+             data={'main_user_id': '{profile_id}', 'complaint_text': 'Спам', 'is_no_client_complaint': True}),
+    Scenario('2gis toggle_reply', 'POST', '/api/external/api_2gis_reviews/toggle_reply/1000000/',
+             data={'main_user_id': '{profile_id}', 'text': 'Спасибо за отзыв!', 'is_official': True}),
+    Scenario('flamp reviews', 'GET', '/api/external/api_flamp_profiles/reviews/',
+             params={'filial_id': '{flamp_filial_id}'}),
+    Scenario('flamp stats', 'GET', '/api/external/api_flamp_profiles/stats/', params={'filial_id': '{flamp_filial_id}'}),
+    # Внутренние (работают только с БД)
+    Scenario('2gis profiles', 'GET', '/api/internal/2gis_profiles/'),
+    Scenario('2gis filials', 'GET', '/api/internal/2gis_filials/{profile_id}/'),
+    Scenario('flamp profiles', 'GET', '/api/internal/flamp_profiles/'),
+    Scenario('flamp filials', 'GET', '/api/internal/flamp_filials/{flamp_profile_id}/'),
+]
+
+
+class DjangoClientTransport:
+    """
+    Запросы через django.test.Client (у каждого потока свой клиент и своё соединение с БД).
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = Client()
+            client.force_login(self.user)
+            self._local.client = client
+        return client
+
+    def request(self, method, path, params=None, data=None):
+        client = self._client()
+        with CaptureQueriesContext(connections['default']) as ctx:
+            start = time.perf_counter()
+            if method == 'GET':
+                response = client.get(path, params)
+            else:
+                response = client.generic(method, path, data=json.dumps(data or {}),
+                                          content_type='application/json')
+            elapsed = time.perf_counter() - start
+        return RequestResult(response.status_code, elapsed, len(ctx.captured_queries)), _json(response)
+
+    def close_thread(self):
+        # Соединения с БД у каждого потока свои — закрываем их при завершении потока
+        connections.close_all()
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """
+    Запросы по сети в уже запущенный сервер. Логинится через /login/ и подставляет CSRF-токен.
+    """
+
+    def __init__(self, base_url, username, password, timeout=60):
+        import httpx
+
+        self.client = httpx.Client(base_url=base_url, timeout=timeout)
+        self.client.get('/api/internal/csrf/')
+        response = self.client.post('/login/', json={'username': username, 'password': password},
+                                    headers=self._csrf_headers())
+        response.raise_for_status()
+
+    def _csrf_headers(self):
+        return {'X-CSRFToken': self.client.cookies.get('csrftoken', '')}
+
+    def request(self, method, path, params=None, data=None):
+        start = time.perf_counter()
+        response = self.client.request(method, path, params=params, json=data if method != 'GET' else None,
+                                       headers=self._csrf_headers())
+        elapsed = time.perf_counter() - start
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return RequestResult(response.status_code, elapsed), body
+
+    def close_thread(self):
+        pass
+
+    def close(self):
+        self.client.close()
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def discover_ids(transport):
+    """
+    Находит ID профилей и филиалов через сами внутренние эндпоинты,
+    чтобы одинаково работать и с тестовой БД, и с запущенным сервером.
+    """
+    ids = {}
+    for platform, prefix in (('2gis', ''), ('flamp', 'flamp_')):
+        _, body = transport.request('GET', f'/api/internal/{platform}_profiles/')
+        profiles = (body or {}).get('profiles') or []
+        if not profiles:
+            continue
+        profile_id = profiles[0]['id']
+        ids[f'{prefix}profile_id'] = profile_id
+
+        _, body = transport.request('GET', f'/api/internal/{platform}_filials/{profile_id}/')
+        filials = (body or {}).get('filials') or []
+        if filials:
+            ids[f'{prefix}filial_id'] = filials[0]['dgis_filial_id' if platform == '2gis' else 'flamp_filial_id']
+    return ids
+
+
+def _format(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _format(item, ids) for key, item in value.items()}
+    return value
+
+
+def run_scenario(transport, scenario, ids, requests=100, concurrency=8):
+    """
+    Выполняет `requests` запросов сценария в `concurrency` потоках и собирает отчёт.
+    """
+    path = _format(scenario.path, ids)
+    params = _format(scenario.params, ids)
+    data = _format(scenario.data, ids)
+
+    results = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                result, _ = transport.request(scenario.method, path, params, data)
+                with lock:
+                    results.append(result)
+        finally:
+            transport.close_thread()
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        # Без потоков — удобно в тестах, где данные видны только в текущей транзакции
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            results.append(transport.request(scenario.method, path, params, data)[0])
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    duration = time.perf_counter() - start
+
+    return ScenarioReport(
+        name=scenario.name,
+        requests=len(results),
+        errors=sum(1 for result in results if result.status_code >= 400),
+        duration=duration,
+        latencies=[result.elapsed for result in results],
+        queries=[result.queries for result in results if result.queries is not None],
+    )
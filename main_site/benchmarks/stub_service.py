@@ -0,0 +1,180 @@
+"""
+Локальная заглушка микросервисов 2GIS и Flamp для нагрузочных тестов.
+
+Отвечает на те же маршруты, что и настоящие микросервисы (пути 2GIS и Flamp не пересекаются,
+поэтому одна заглушка обслуживает обе площадки), с настраиваемой задержкой и размером ответа.
+Сделана на стандартном http.server, чтобы бенчмарк не требовал дополнительных зависимостей.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 50.0  # Задержка ответа, мс
+    jitter_ms: float = 0.0  # Случайный разброс задержки, мс
+    reviews: int = 20  # Кол-во отзывов в ответе на получение отзывов
+    text_length: int = 300  # Длина текста отзыва, символов
+    photos: int = 2  # Кол-во фото в отзыве
+    history: Optional[int] = None  # Всего отзывов у филиала (None — бесконечная история)
+
+
+REVIEW_TEXT = 'Отличное обслуживание, вежливый персонал, но долго ждали заказ. '
+# Самый новый отзыв заглушки; отзывы идут в прошлое с шагом в час
+NEWEST_REVIEW_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def build_reviews(config: StubConfig, filial_id='1', offset_date=None):
+    """
+    Генерирует страницу отзывов в формате микросервиса 2GIS, от новых к старым.
+    С offset_date отдаются отзывы строго старше неё (пагинация как у микросервиса), ID отзывов стабильны.
+    """
+    first = 0
+    if offset_date:
+        offset = datetime.fromisoformat(offset_date)
+        first = max(0, math.floor((NEWEST_REVIEW_AT - offset) / timedelta(hours=1)) + 1)
+    last = first + config.reviews
+    if config.history is not None:
+        last = min(last, config.history)
+
+    text = (REVIEW_TEXT * (config.text_length // len(REVIEW_TEXT) + 1))[:config.text_length]
+    reviews = []
+    for i in range(first, last):
+        reviews.append({
+            "id": 1_000_000 + i,
+            "filial_id": filial_id,
+            "rating": i % 5 + 1,
+            "text": text,
+            "created_at": (NEWEST_REVIEW_AT - timedelta(hours=i)).isoformat(),
+            "user_name": f"Пользователь {i}",
+            "comments_count": i % 3,
+            "likes_count": i % 7,
+            "photos": [
+                {"preview_urls": {"url": f"https://i.example.com/{i}/{n}.jpg"}, "id": n}
+                for n in range(config.photos)
+            ],
+            "is_favorite": i % 4 == 0,
+        })
+    return reviews
+
+
+STATS = {
+    "one_star": 10, "two_stars": 5, "three_stars": 15, "four_stars": 30, "five_stars": 40,
+    "rating": 3.85, "count_reviews": 100,
+}
+
+
+def toggle_favorite(handler, review_id):
+    """
+    Переключает избранное, как микросервис: состояние хранится в заглушке, начальное — как в build_reviews.
+    """
+    review_id = str(review_id)
+    state = handler.favorites.get(review_id, review_id.isdigit() and (int(review_id) - 1_000_000) % 4 == 0)
+    handler.favorites[review_id] = not state
+    return not state
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = StubConfig()
+    requests: list = []  # Пути полученных запросов (свой список у каждой заглушки)
+    favorites: dict = {}  # Избранное, переключённое через заглушку: ID отзыва -> состояние
+
+    # Маршрут → (код ответа, функция построения тела)
+    GET_ROUTES = [
+        (re.compile(r'^/api/get_reviews$'),
+         lambda h, m, q: (200, {"reviews": build_reviews(h.config, q.get('filial_id'), q.get('offset_date'))})),
+        (re.compile(r'^/api/stats/(?P<filial_id>[^/]+)$'), lambda h, m, q: (200, STATS)),
+        (re.compile(r'^/api/reviews/(?P<filial_id>[^/]+)$'),
+         lambda h, m, q: (200, {"data": build_reviews(h.config, m['filial_id'], q.get('offset_date'))})),
+    ]
+    POST_ROUTES = [
+        (re.compile(r'^/api/start_stats_collection$'), lambda h, m, q: (200, {"status": "pending"})),
+        (re.compile(r'^/api/favorite/(?P<review_id>\d+)$'),
+         lambda h, m, q: (200, {"is_favorite": toggle_favorite(h, m['review_id'])})),
+        (re.compile(r'^/api/favorite/batch$'),
+         lambda h, m, q: (200, {"results": [{"review_id": review_id, "is_favorite": toggle_favorite(h, review_id)}
+                                            for review_id in h.body.get("review_ids", [])]})),
+        (re.compile(r'^/api/complaints/(?P<review_id>\d+)$'), lambda h, m, q: (200, {"status": "ok"})),
+        (re.compile(r'^/api/complaints/batch$'),
+         lambda h, m, q: (200, {"results": [{"review_id": review_id, "status": "ok"}
+                                            for review_id in h.body.get("review_ids", [])]})),
+        (re.compile(r'^/api/post_review_reply/(?P<review_id>\d+)$'), lambda h, m, q: (200, {"status": "ok"})),
+        (re.compile(r'^/api/create_or_update_user$'), lambda h, m, q: (201, {"user_info_and_filials": []})),
+    ]
+
+    def do_GET(self):
+        self._dispatch(self.GET_ROUTES)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        self._dispatch(self.POST_ROUTES)
+
+    def _dispatch(self, routes):
+        path, _, query = self.path.partition('?')
+        params = dict(parse_qsl(query))
+        self.requests.append(path)
+
+        delay = self.config.latency_ms + random.uniform(0, self.config.jitter_ms)
+        time.sleep(delay / 1000)
+
+        for pattern, handler in routes:
+            match = pattern.match(path)
+            if match:
+                status_code, body = handler(self, match, params)
+                break
+        else:
+            status_code, body = 404, {"detail": "Not Found"}
+
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Не засоряем вывод бенчмарка access-логом заглушки
+        pass
+
+
+class StubService:
+    """
+    Заглушка в фоновом потоке. Использование:
+
+        with StubService(StubConfig(latency_ms=20)) as stub:
+            stub.url  # http://127.0.0.1:<порт>
+    """
+
+    def __init__(self, config: StubConfig = None, host='127.0.0.1', port=0):
+        handler = type('ConfiguredStubHandler', (StubHandler,),
+                       {'config': config or StubConfig(), 'requests': [], 'favorites': {}})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def requests(self):
+        return self.server.RequestHandlerClass.requests
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
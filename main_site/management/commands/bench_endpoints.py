@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from main_site.benchmarks.runner import DEFAULT_SCENARIOS, DjangoClientTransport, HttpTransport, discover_ids, \
+    run_scenario
+from main_site.benchmarks.stub_service import StubConfig, StubService
+from main_site.models import DgisProfile, DgisFilial, FlampProfile, FlampFilial
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон эндпоинтов против локальной заглушки микросервисов 2GIS/Flamp. "
+        "Выводит пропускную способность, p50/p95/p99 и кол-во SQL-запросов на запрос."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=8, help='Параллельных клиентов')
+        parser.add_argument('--latency-ms', type=float, default=50, help='Задержка ответа заглушки, мс')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Случайный разброс задержки заглушки, мс')
+        parser.add_argument('--reviews', type=int, default=20, help='Отзывов в ответе заглушки')
+        parser.add_argument('--text-length', type=int, default=300, help='Длина текста отзыва, символов')
+        parser.add_argument('--filials', type=int, default=50, help='Филиалов на профиль в тестовой БД')
+        parser.add_argument('--only', nargs='*', help='Запустить только сценарии с этими подстроками в названии')
+        parser.add_argument('--json', action='store_true', help='Вывести отчёт в JSON')
+        parser.add_argument('--base-url', help='Гонять запросы в запущенный сервер вместо тестового клиента')
+        parser.add_argument('--username', help='Логин для --base-url')
+        parser.add_argument('--password', help='Пароль для --base-url')
+
+    def handle(self, *args, **options):
+        scenarios = DEFAULT_SCENARIOS
+        if options['only']:
+            scenarios = [s for s in scenarios if any(part in s.name for part in options['only'])]
+
+        if options['base_url']:
+            # Сервер и микросервисы уже запущены — заглушка и тестовая БД не нужны
+            transport = HttpTransport(options['base_url'], options['username'], options['password'])
+            try:
+                reports = self._run(transport, scenarios, options)
+            finally:
+                transport.close()
+        else:
+            reports = self._run_in_process(scenarios, options)
+
+        self._print(reports, options['json'])
+
+    def _run_in_process(self, scenarios, options):
+        stub_config = StubConfig(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            reviews=options['reviews'],
+            text_length=options['text_length'],
+        )
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        test_db_file = None
+        if connection.vendor == 'sqlite':
+            # In-memory SQLite с shared cache блокирует таблицы при параллельной записи сессий,
+            # поэтому для бенчмарка используем временный файл
+            fd, test_db_file = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = test_db_file
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            user = self._seed(options['filials'])
+            # Бенчмарк меряет сами эндпоинты, поэтому лимиты входящих запросов отключены
+            no_throttling = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user': None, 'endpoint': None,
+                                                                                   'search': None}}
+            with StubService(stub_config) as stub, \
+                    override_settings(DGIS_SERVICE_ADDRESS=stub.url, FLAMP_SERVICE_ADDRESS=stub.url,
+                                      REST_FRAMEWORK=no_throttling, MAX_IN_FLIGHT_PER_USER=None):
+                return self._run(DjangoClientTransport(user), scenarios, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if test_db_file and os.path.exists(test_db_file):
+                os.remove(test_db_file)
+
+    def _run(self, transport, scenarios, options):
+        ids = discover_ids(transport)
+        return [
+            run_scenario(transport, scenario, ids, requests=options['requests'], concurrency=options['concurrency'])
+            for scenario in scenarios
+        ]
+
+    @staticmethod
+    def _seed(filials_count):
+        user = User.objects.create_user(username='bench', password='bench')
+        dgis_profile = DgisProfile.objects.create(user=user, username='bench_2gis', hashed_password='-',
+                                                  is_active=True)
+        flamp_profile = FlampProfile.objects.create(user=user, username='bench_flamp', hashed_password='-',
+                                                    is_active=True)
+        DgisFilial.objects.bulk_create(
+            DgisFilial(profile=dgis_profile, dgis_filial_id=str(70000001 + i), name=f'Филиал {i}')
+            for i in range(filials_count)
+        )
+        FlampFilial.objects.bulk_create(
+            FlampFilial(profile=flamp_profile, flamp_filial_id=str(80000001 + i), name=f'Филиал {i}')
+            for i in range(filials_count)
+        )
+        return user
+
+    def _print(self, reports, as_json):
+        rows = [report.as_dict() for report in reports]
+        if as_json:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+
+        header = f"{'Сценарий':<24}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL':>6}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            queries = '-' if row['max_queries'] is None else str(row['max_queries'])
+            self.stdout.write(
+                f"{row['name']:<24}{row['requests']:>6}{row['errors']:>5}{row['throughput_rps']:>9.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{queries:>6}"
+            )
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main_site.benchmarks.json_codec import run
+
+
+class Command(BaseCommand):
+    help = "Микро-бенчмарк JSON-кодека API: стандартный json + DRF против msgspec (процессорное время)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', type=int, default=1000, help='Отзывов в ответе')
+        parser.add_argument('--iterations', type=int, default=50, help='Повторов на замер')
+
+    def handle(self, *args, **options):
+        result = run(reviews=options['reviews'], iterations=options['iterations'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main_site.benchmarks.reviews import run
+
+
+class Command(BaseCommand):
+    help = "Микро-бенчмарк преобразования отзывов 2GIS: json + DRF против msgspec."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', type=int, default=1000, help='Отзывов в ответе микросервиса')
+        parser.add_argument('--iterations', type=int, default=50, help='Повторов на замер')
+
+    def handle(self, *args, **options):
+        result = run(reviews=options['reviews'], iterations=options['iterations'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_site.services import audit
+from main_site.services.platforms import PLATFORMS
+from main_site.services.review_sync import MAX_PAGES, sync_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Инкрементальная синхронизация отзывов 2GIS/Flamp в локальную БД. "
+        "Синхронизируются выбранные филиалы, у которых подошло время по расписанию активности."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platform', nargs='*', choices=list(PLATFORMS), help='Площадки (по умолчанию все)')
+        parser.add_argument('--limit', type=int, help='Максимум филиалов на площадку за проход')
+        parser.add_argument('--max-pages', type=int, default=MAX_PAGES, help='Максимум страниц на филиал за проход')
+        parser.add_argument('--force', action='store_true', help='Синхронизировать все филиалы, не глядя на расписание')
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Работать постоянно, проверяя расписание каждые SECONDS секунд')
+
+    def handle(self, *args, **options):
+        while True:
+            results = sync_due(options['platform'], limit=options['limit'], force=options['force'],
+                               max_pages=options['max_pages'])
+            for result in results:
+                line = (f"{result.platform:<6} филиал {result.filial_id}: страниц {result.pages}, "
+                        f"получено {result.fetched}, сохранено {result.saved}")
+                if result.error:
+                    self.stderr.write(f"{line}, ошибка: {result.error}")
+                else:
+                    if result.backfill_offset:
+                        line = f"{line}, история догружается с {result.backfill_offset}"
+                    self.stdout.write(f"{line}, следующая синхронизация {result.next_sync_at:%Y-%m-%d %H:%M}")
+
+            if not options['loop']:
+                return
+            # Сброс буфера журнала иначе ждал бы следующей записи или завершения процесса
+            audit.flush()
+            time.sleep(options['loop'])
@@ -0,0 +1,126 @@
+# Generated by Django 5.1.1 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0010_alter_dgisprofile_username_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DgisReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_id', models.CharField(max_length=50)),
+                ('rating', models.PositiveSmallIntegerField(default=0)),
+                ('text', models.TextField(blank=True, null=True)),
+                ('user_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('has_answer', models.BooleanField(default=False)),
+                ('is_favorite', models.BooleanField(default=False)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('filial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='main_site.dgisfilial')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DgisReviewPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='main_site.dgisreview')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DgisReviewReply',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reply_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('text', models.TextField()),
+                ('is_official', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='main_site.dgisreview')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlampReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_id', models.CharField(max_length=50)),
+                ('rating', models.PositiveSmallIntegerField(default=0)),
+                ('text', models.TextField(blank=True, null=True)),
+                ('user_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('has_answer', models.BooleanField(default=False)),
+                ('is_favorite', models.BooleanField(default=False)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('filial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='main_site.flampfilial')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlampReviewPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='main_site.flampreview')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlampReviewReply',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reply_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('text', models.TextField()),
+                ('is_official', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='main_site.flampreview')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dgisreview',
+            index=models.Index(fields=['filial', '-created_at'], name='dgisreview_filial_created'),
+        ),
+        migrations.AddIndex(
+            model_name='dgisreview',
+            index=models.Index(fields=['filial', 'rating', '-created_at'], name='dgisreview_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='dgisreview',
+            index=models.Index(fields=['filial', 'has_answer', '-created_at'], name='dgisreview_has_answer'),
+        ),
+        migrations.AddIndex(
+            model_name='dgisreview',
+            index=models.Index(fields=['filial', 'is_favorite', '-created_at'], name='dgisreview_is_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='dgisreview',
+            constraint=models.UniqueConstraint(fields=('filial', 'review_id'), name='dgisreview_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='flampreview',
+            index=models.Index(fields=['filial', '-created_at'], name='flampreview_filial_created'),
+        ),
+        migrations.AddIndex(
+            model_name='flampreview',
+            index=models.Index(fields=['filial', 'rating', '-created_at'], name='flampreview_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='flampreview',
+            index=models.Index(fields=['filial', 'has_answer', '-created_at'], name='flampreview_has_answer'),
+        ),
+        migrations.AddIndex(
+            model_name='flampreview',
+            index=models.Index(fields=['filial', 'is_favorite', '-created_at'], name='flampreview_is_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='flampreview',
+            constraint=models.UniqueConstraint(fields=('filial', 'review_id'), name='flampreview_unique'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0011_review_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='last_review_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='last_review_id',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='last_review_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='last_review_id',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
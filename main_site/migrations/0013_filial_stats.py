@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0012_filial_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DgisFilialStats',
+            fields=[
+                ('filial', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='main_site.dgisfilial')),
+                ('one_star', models.PositiveIntegerField(default=0)),
+                ('two_stars', models.PositiveIntegerField(default=0)),
+                ('three_stars', models.PositiveIntegerField(default=0)),
+                ('four_stars', models.PositiveIntegerField(default=0)),
+                ('five_stars', models.PositiveIntegerField(default=0)),
+                ('count_reviews', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlampFilialStats',
+            fields=[
+                ('filial', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='main_site.flampfilial')),
+                ('one_star', models.PositiveIntegerField(default=0)),
+                ('two_stars', models.PositiveIntegerField(default=0)),
+                ('three_stars', models.PositiveIntegerField(default=0)),
+                ('four_stars', models.PositiveIntegerField(default=0)),
+                ('five_stars', models.PositiveIntegerField(default=0)),
+                ('count_reviews', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0013_filial_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DgisDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('one_star', models.PositiveIntegerField(default=0)),
+                ('two_stars', models.PositiveIntegerField(default=0)),
+                ('three_stars', models.PositiveIntegerField(default=0)),
+                ('four_stars', models.PositiveIntegerField(default=0)),
+                ('five_stars', models.PositiveIntegerField(default=0)),
+                ('count_reviews', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('filial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main_site.dgisfilial')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('filial', 'day'), name='dgisdailyrollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FlampDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('one_star', models.PositiveIntegerField(default=0)),
+                ('two_stars', models.PositiveIntegerField(default=0)),
+                ('three_stars', models.PositiveIntegerField(default=0)),
+                ('four_stars', models.PositiveIntegerField(default=0)),
+                ('five_stars', models.PositiveIntegerField(default=0)),
+                ('count_reviews', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('filial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main_site.flampfilial')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('filial', 'day'), name='flampdailyrollup_unique')],
+            },
+        ),
+    ]
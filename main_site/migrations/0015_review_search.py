@@ -0,0 +1,93 @@
+# Generated by Django 5.1.1 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+REVIEW_TABLES = ['main_site_dgisreview', 'main_site_flampreview']
+
+# SQLite: FTS5-таблица с внешним содержимым (сам текст хранится только в таблице отзывов) и триггеры синхронизации.
+# Внимание: SQLite пересоздаёт таблицу при AlterField, и триггеры при этом пропадают —
+# после таких миграций таблиц отзывов триггеры нужно создать заново.
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE {table}_fts USING fts5(
+        search_document, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {table}_fts(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    """CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {table}_fts({table}_fts, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    """CREATE TRIGGER {table}_fts_au AFTER UPDATE OF search_document ON {table} BEGIN
+        INSERT INTO {table}_fts({table}_fts, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {table}_fts(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    "INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS {table}_fts_ai",
+    "DROP TRIGGER IF EXISTS {table}_fts_ad",
+    "DROP TRIGGER IF EXISTS {table}_fts_au",
+    "DROP TABLE IF EXISTS {table}_fts",
+]
+
+# PostgreSQL: GIN по тому же выражению, которое строит SearchVector('search_document', config='russian')
+POSTGRES_CREATE = [
+    "CREATE INDEX {table}_search_gin ON {table} "
+    "USING gin (to_tsvector('russian'::regconfig, COALESCE(search_document, '')))",
+]
+POSTGRES_DROP = ["DROP INDEX IF EXISTS {table}_search_gin"]
+
+SCRIPTS = {
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+    'postgresql': (POSTGRES_CREATE, POSTGRES_DROP),
+}
+
+
+def fill_search_document(apps, schema_editor):
+    for model_name in ('DgisReview', 'FlampReview'):
+        model = apps.get_model('main_site', model_name)
+        reviews = list(model.objects.prefetch_related('replies'))
+        for review in reviews:
+            review.search_document = '\n'.join(
+                filter(None, [review.text] + [reply.text for reply in review.replies.all()])
+            )
+        model.objects.bulk_update(reviews, ['search_document'], batch_size=500)
+
+
+def _execute(schema_editor, statements):
+    for table in REVIEW_TABLES:
+        for statement in statements:
+            schema_editor.execute(statement.format(table=table), params=None)
+
+
+def create_search_index(apps, schema_editor):
+    # Остальные СУБД ищут через icontains без индекса
+    if schema_editor.connection.vendor in SCRIPTS:
+        _execute(schema_editor, SCRIPTS[schema_editor.connection.vendor][0])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SCRIPTS:
+        _execute(schema_editor, SCRIPTS[schema_editor.connection.vendor][1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0014_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dgisreview',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='flampreview',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
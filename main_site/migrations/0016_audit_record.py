@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0015_review_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('platform', models.CharField(max_length=10)),
+                ('entity', models.CharField(max_length=20)),
+                ('action', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['platform', 'entity', 'object_id'], name='auditrecord_object')],
+            },
+        ),
+    ]
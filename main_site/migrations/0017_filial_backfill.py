@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0016_audit_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='backfill_offset',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='history_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='backfill_offset',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='history_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_site', '0017_filial_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dgisprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='dgisfilial',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='flampprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='flampfilial',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
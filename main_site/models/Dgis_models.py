@@ -1,9 +1,7 @@
-import logging
-
 from django.contrib.auth.models import User
 from django.db import models
 
-logger = logging.getLogger(__name__)
+from main_site.services import audit
 
 
 class DgisProfile(models.Model):
@@ -12,6 +10,7 @@ class DgisProfile(models.Model):
     name = models.CharField(max_length=50, blank=True, null=True)
     hashed_password = models.CharField(max_length=100)
     is_active = models.BooleanField(default=False)  # Связан ли аккаунт с сервисом
+    updated_at = models.DateTimeField(auto_now=True)  # Версия дерева профилей и филиалов (services/bootstrap.py)
 
     def __str__(self):
         return f"Профиль для {self.user.username}"
@@ -20,23 +19,11 @@ class DgisProfile(models.Model):
         is_new = self.pk is None  # Проверяем, новый ли объект
         super().save(*args, **kwargs)  # Сохраняем объект, чтобы получить self.pk
 
-        if is_new:
-            logger.info("2GIS Профиль",
-                        extra={'dgis_profile_id': self.pk,
-                               'username': self.username,
-                               'action': 'create'})
-        else:
-            logger.info("2GIS Профиль",
-                        extra={'dgis_profile_id': self.pk,
-                               'username': self.username,
-                               'is_active': self.is_active,
-                               'action': 'update'})
+        audit.record('2gis', 'profile', 'create' if is_new else 'update', object_id=self.pk, user_id=self.user_id,
+                     username=self.username, is_active=self.is_active)
 
     def delete(self, *args, **kwargs):
-        logger.warning("2GIS Профиль",
-                       extra={'dgis_profile_id': self.pk,
-                              'username': self.username,
-                              'action': 'delete'})
+        audit.record('2gis', 'profile', 'delete', object_id=self.pk, user_id=self.user_id, username=self.username)
 
         super().delete(*args, **kwargs)
 
@@ -46,6 +33,17 @@ class DgisFilial(models.Model):
     dgis_filial_id = models.CharField(max_length=50)  # ID филиала
     name = models.CharField(max_length=255)  # Название филиала
     is_active = models.BooleanField(default=False)  # Выбран ли филиал юзером
+    # Меняется при save(); массовые изменения филиалов (filial_selection) выставляют его явно
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Состояние синхронизации отзывов (обновляется движком синхронизации через update(), без save())
+    last_review_at = models.DateTimeField(blank=True, null=True)  # Дата самого нового сохранённого отзыва
+    last_review_id = models.CharField(max_length=50, blank=True, null=True)  # ID этого отзыва
+    last_synced_at = models.DateTimeField(blank=True, null=True)  # Последняя успешная синхронизация
+    next_sync_at = models.DateTimeField(blank=True, null=True, db_index=True)  # Когда синхронизировать снова
+    # offset_date, с которого продолжить догрузку старой истории (проход упёрся в лимит страниц)
+    backfill_offset = models.CharField(max_length=64, blank=True, null=True)
+    history_synced_at = models.DateTimeField(blank=True, null=True)  # Когда вся история отзывов была загружена
 
     def __str__(self):
         return f"{self.name} ({self.dgis_filial_id})"
@@ -54,26 +52,108 @@ class DgisFilial(models.Model):
         is_new = self.pk is None  # Проверяем, новый ли объект
         super().save(*args, **kwargs)  # Сохраняем объект, чтобы получить self.pk
 
-        if is_new:
-            logger.info("2GIS Филиал",
-                        extra={'owner_profile': self.profile.pk,
-                               'filial_id': self.pk,
-                               'dgis_filial_id': self.dgis_filial_id,
-                               '_name': self.name,
-                               'action': 'create'})
-        else:
-            logger.info("2GIS Филиал",
-                        extra={'owner_profile': self.profile.pk,
-                               'filial_id': self.pk,
-                               'dgis_filial_id': self.dgis_filial_id,
-                               '_name': self.name,
-                               'is_active': self.is_active,
-                               'action': 'update'})
+        # profile_id, а не profile.pk: иначе на каждый филиал лишний запрос профиля
+        audit.record('2gis', 'filial', 'create' if is_new else 'update', object_id=self.pk,
+                     profile_id=self.profile_id, dgis_filial_id=self.dgis_filial_id, name=self.name,
+                     is_active=self.is_active)
 
     def delete(self, *args, **kwargs):
-        logger.warning("2GIS Филиал",
-                       extra={'filial_id': self.pk,
-                              '_name': self.name,
-                              'action': 'delete'})
+        audit.record('2gis', 'filial', 'delete', object_id=self.pk, profile_id=self.profile_id, name=self.name)
 
         super().delete(*args, **kwargs)
+
+
+class DgisReview(models.Model):
+    """
+    Отзыв 2GIS, сохранённый локально (заполняется синхронизацией с микросервисом).
+    """
+    filial = models.ForeignKey(DgisFilial, on_delete=models.CASCADE, related_name="reviews")
+    review_id = models.CharField(max_length=50)  # ID отзыва на площадке
+    rating = models.PositiveSmallIntegerField(default=0)
+    text = models.TextField(blank=True, null=True)
+    user_name = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField()  # Дата создания отзыва на площадке
+    comments_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    has_answer = models.BooleanField(default=False)  # Есть ли ответ на отзыв
+    is_favorite = models.BooleanField(default=False)
+    synced_at = models.DateTimeField(auto_now=True)  # Когда запись последний раз обновлялась синхронизацией
+    # Текст отзыва и ответов на него для полнотекстового поиска (индекс создаётся миграцией под СУБД)
+    search_document = models.TextField(blank=True, default='')
+
+    class Meta:
+        # Один филиал площадки могут привязать несколько пользователей, поэтому ID отзыва уникален в пределах филиала
+        constraints = [
+            models.UniqueConstraint(fields=['filial', 'review_id'], name='dgisreview_unique'),
+        ]
+        # Все выборки идут по филиалу с сортировкой по дате, поэтому фильтры индексируются вместе с ним
+        indexes = [
+            models.Index(fields=['filial', '-created_at'], name='dgisreview_filial_created'),
+            models.Index(fields=['filial', 'rating', '-created_at'], name='dgisreview_rating'),
+            models.Index(fields=['filial', 'has_answer', '-created_at'], name='dgisreview_has_answer'),
+            models.Index(fields=['filial', 'is_favorite', '-created_at'], name='dgisreview_is_favorite'),
+        ]
+
+    def __str__(self):
+        return f"Отзыв {self.review_id} ({self.rating}★)"
+
+
+class DgisReviewReply(models.Model):
+    review = models.ForeignKey(DgisReview, on_delete=models.CASCADE, related_name="replies")
+    reply_id = models.CharField(max_length=50, blank=True, null=True)  # ID ответа на площадке (если известен)
+    text = models.TextField()
+    is_official = models.BooleanField(default=False)
+    created_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Ответ на отзыв {self.review_id}"
+
+
+class DgisReviewPhoto(models.Model):
+    review = models.ForeignKey(DgisReview, on_delete=models.CASCADE, related_name="photos")
+    url = models.URLField(max_length=1000)  # Превью фото
+
+    def __str__(self):
+        return self.url
+
+
+class DgisFilialStats(models.Model):
+    """
+    Счётчики оценок филиала 2GIS по локально сохранённым отзывам. Пересчитываются после каждого сохранения отзывов.
+    """
+    filial = models.OneToOneField(DgisFilial, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    one_star = models.PositiveIntegerField(default=0)
+    two_stars = models.PositiveIntegerField(default=0)
+    three_stars = models.PositiveIntegerField(default=0)
+    four_stars = models.PositiveIntegerField(default=0)
+    five_stars = models.PositiveIntegerField(default=0)
+    count_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)  # Сумма оценок — из неё считается средний рейтинг
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Статистика филиала {self.filial_id}"
+
+
+class DgisDailyRollup(models.Model):
+    """
+    Дневной агрегат оценок филиала 2GIS: кол-во, сумма и гистограмма оценок за день (по дате отзыва).
+    Пересчитывается для затронутых дней при сохранении отзывов; по нему строятся графики без чтения отзывов.
+    """
+    filial = models.ForeignKey(DgisFilial, on_delete=models.CASCADE, related_name="daily_rollups")
+    day = models.DateField()
+    one_star = models.PositiveIntegerField(default=0)
+    two_stars = models.PositiveIntegerField(default=0)
+    three_stars = models.PositiveIntegerField(default=0)
+    four_stars = models.PositiveIntegerField(default=0)
+    five_stars = models.PositiveIntegerField(default=0)
+    count_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['filial', 'day'], name='dgisdailyrollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"Оценки филиала {self.filial_id} за {self.day}"
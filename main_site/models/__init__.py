@@ -1,2 +1,5 @@
-from .Dgis_models import DgisProfile, DgisFilial
-from .Flamp_models import FlampFilial, FlampProfile
+from .Dgis_models import DgisProfile, DgisFilial, DgisReview, DgisReviewReply, DgisReviewPhoto, DgisFilialStats, \
+    DgisDailyRollup
+from .Flamp_models import FlampFilial, FlampProfile, FlampReview, FlampReviewReply, FlampReviewPhoto, \
+    FlampFilialStats, FlampDailyRollup
+from .audit_models import AuditRecord
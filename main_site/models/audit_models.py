@@ -0,0 +1,26 @@
+from django.db import models
+from django.utils import timezone
+
+
+class AuditRecord(models.Model):
+    """
+    Запись журнала изменений профилей и филиалов. Пишется пачками (main_site/services/audit.py).
+
+    Без внешних ключей: журнал должен переживать удаление пользователя и объектов.
+    Одна запись может описывать массовую операцию (object_id — профиль, детали в data).
+    """
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    user_id = models.IntegerField(blank=True, null=True)  # Кто изменил (если известно)
+    platform = models.CharField(max_length=10)  # Код площадки: 2gis, flamp
+    entity = models.CharField(max_length=20)  # profile, filial
+    action = models.CharField(max_length=20)  # create, update, delete, select, link
+    object_id = models.BigIntegerField(blank=True, null=True)
+    data = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['platform', 'entity', 'object_id'], name='auditrecord_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.platform} {self.entity} {self.object_id}: {self.action}"
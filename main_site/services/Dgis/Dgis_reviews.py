@@ -0,0 +1,122 @@
+"""
+Быстрый путь для отзывов 2GIS: ответ микросервиса декодируется msgspec сразу в типизированные структуры
+(лишние поля отзыва пропускаются без создания dict), нужные поля проецируются в ответ
+и кодируются в байты без прохода через рендерер DRF.
+"""
+from typing import Any, List, Optional, Union
+
+import msgspec
+
+
+class PreviewUrls(msgspec.Struct):
+    url: Optional[str] = None
+
+
+class Photo(msgspec.Struct):
+    preview_urls: Optional[PreviewUrls] = None
+
+
+class UpstreamReview(msgspec.Struct):
+    id: Any = None
+    rating: Any = 0
+    text: Any = "Без текста"
+    created_at: Any = None
+    user_name: Any = None
+    comments_count: Any = 0
+    likes_count: Any = 0
+    photos: Optional[List[Union[str, Photo]]] = None
+    is_favorite: Any = None
+
+
+class UpstreamReviews(msgspec.Struct):
+    reviews: List[UpstreamReview] = []
+
+
+class Review(msgspec.Struct):
+    """
+    Отзыв в формате ответа фронту (имена полей совпадают с ключами JSON).
+    """
+    id: Any
+    rating: Any
+    text: Any
+    dateCreated: Any
+    name: Any
+    commentsCount: Any
+    likesCount: Any
+    photos: Optional[List[Optional[str]]]
+    is_favorite: Any
+
+
+class ReviewsPage(msgspec.Struct):
+    reviews: List[Review]
+    count: int
+    filial_id: Any
+
+
+_decoder = msgspec.json.Decoder(UpstreamReviews)
+_encoder = msgspec.json.Encoder()
+
+
+def decode_reviews(content: bytes) -> List[UpstreamReview]:
+    """
+    Декодирует тело ответа `/api/get_reviews`.
+
+    :raises ValueError: Если тело не JSON или не совпадает со схемой (msgspec.DecodeError — подкласс ValueError).
+    """
+    return _decoder.decode(content).reviews
+
+
+def to_review(review: UpstreamReview) -> Review:
+    photos = review.photos
+    if photos is not None and not all(isinstance(photo, str) for photo in photos):
+        photos = [
+            photo.preview_urls.url if photo.preview_urls else None
+            for photo in photos if isinstance(photo, Photo)
+        ]
+
+    return Review(
+        id=review.id,
+        rating=review.rating,
+        text=review.text,
+        dateCreated=review.created_at,
+        name=review.user_name,
+        commentsCount=review.comments_count,
+        likesCount=review.likes_count,
+        photos=photos,
+        is_favorite=review.is_favorite,
+    )
+
+
+def encode_reviews_page(reviews: List[UpstreamReview], filial_id) -> bytes:
+    """
+    Собирает тело ответа `fetch_reviews` сразу в байты JSON.
+    """
+    projected = [to_review(review) for review in reviews]
+    return _encoder.encode(ReviewsPage(reviews=projected, count=len(projected), filial_id=filial_id))
+
+
+def filter_review(review: dict) -> dict:
+    """
+    Медленный путь для отзыва в виде dict — на случай ответа, не совпадающего со схемой.
+    """
+    photos = review.get("photos")
+    if isinstance(photos, list) and all(isinstance(photo, str) for photo in photos):
+        filtered_photos = photos
+    elif isinstance(photos, list):
+        filtered_photos = [
+            (photo.get("preview_urls") or {}).get("url") for photo in photos if isinstance(photo, dict)
+        ]
+    else:
+        filtered_photos = None
+
+    return {
+        "id": review.get("id"),
+        "rating": review.get("rating", 0),
+        "text": review.get("text", "Без текста"),
+        "dateCreated": review.get("created_at"),
+        "name": review.get("user_name"),
+        "commentsCount": review.get("comments_count", 0),
+        "likesCount": review.get("likes_count", 0),
+        "photos": filtered_photos,
+        "is_favorite": review.get('is_favorite'),
+    }
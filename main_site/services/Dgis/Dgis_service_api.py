@@ -1,14 +1,15 @@
 import logging
-import os
 import time
 
-import httpx
-from dotenv import load_dotenv
+from django.conf import settings
 
+from FeedbackGenerator.utils.json_codec import response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
 from FeedbackGenerator.utils.mask_data import mask_sensitive_data
+from main_site.services import upstream
+
+httpx = lazy_module('httpx')
 
-load_dotenv()
-DGIS_ADDRESS = os.getenv("DGIS_SERVICE_ADDRESS")
 logger = logging.getLogger(__name__)
 
 
@@ -22,11 +23,13 @@ async def link_profile_to_2gis(*, data: dict):
     }
     """
     masked_data = mask_sensitive_data(data, ['hashed_password'])
-    url = f'{DGIS_ADDRESS}/api/create_or_update_user'
-    async with httpx.AsyncClient(timeout=30) as client:
+    url = f'{settings.DGIS_SERVICE_ADDRESS}/api/create_or_update_user'
+    async with upstream.async_client(timeout=30) as client:
         try:
             start_time = time.monotonic()
-            response = await client.post(url, json=data)
+            # Логин на площадке — долгая фоновая операция, она использует только запас слотов к микросервису
+            async with upstream.slot_async(upstream.BACKGROUND):
+                response = await client.post(url, json=data)
             elapsed_time = time.monotonic() - start_time
         except httpx.RequestError as exc:
             elapsed_time = time.monotonic() - start_time
@@ -49,7 +52,7 @@ async def link_profile_to_2gis(*, data: dict):
                                'status_code': response.status_code,
                                'elapsed_time': elapsed_time,
                                })
-            return response.json()  # Возвращаем результат
+            return response_json(response)  # Возвращаем результат
         else:
             logger.error('Ошибка при вызове микросервиса 2GIS: некорректный ответ',
                          extra={'url': url,
@@ -1,15 +1,16 @@
 import logging
-import os
 import time
 
-import httpx
-from dotenv import load_dotenv
+from django.conf import settings
 from typing import Dict
 
+from FeedbackGenerator.utils.json_codec import response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
 from FeedbackGenerator.utils.mask_data import mask_sensitive_data
+from main_site.services import upstream
+
+httpx = lazy_module('httpx')
 
-load_dotenv()
-FLAMP_ADDRESS = os.getenv("FLAMP_SERVICE_ADDRESS")
 logger = logging.getLogger(__name__)
 
 
@@ -40,17 +41,19 @@ async def link_profile_to_flamp(*, data: dict):
         logger.info("Нет данных для обновления, сразу создаём пользователя")
         return await create_user(data, masked_data)
 
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with upstream.async_client(timeout=30) as client:
         try:
             # 1. Пытаемся обновить пользователя (PATCH)
-            update_url = f"{FLAMP_ADDRESS}/api/users/{owner_id}/update"
+            update_url = f"{settings.FLAMP_SERVICE_ADDRESS}/api/users/{owner_id}/update"
             start_time = time.monotonic()
-            response = await client.patch(update_url, json=update_data)
+            # Логин на площадке — долгая фоновая операция, она использует только запас слотов к микросервису
+            async with upstream.slot_async(upstream.BACKGROUND):
+                response = await client.patch(update_url, json=update_data)
             elapsed_time = time.monotonic() - start_time
 
             if response.status_code == 200:
                 logger.info("Пользователь успешно обновлён")
-                return response.json()
+                return response_json(response)
 
             elif response.status_code == 404:
                 logger.warning("Пользователь не найден, создаём нового...")
@@ -75,17 +78,18 @@ async def link_profile_to_flamp(*, data: dict):
 
 async def create_user(data: dict, masked_data: dict):
     """Создаёт пользователя в Flamp через POST-запрос"""
-    create_url = f"{FLAMP_ADDRESS}/api/users/create"
+    create_url = f"{settings.FLAMP_SERVICE_ADDRESS}/api/users/create"
 
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with upstream.async_client(timeout=30) as client:
         try:
             start_time = time.monotonic()
-            response = await client.post(create_url, json=data)
+            async with upstream.slot_async(upstream.BACKGROUND):
+                response = await client.post(create_url, json=data)
             elapsed_time = time.monotonic() - start_time
 
             if response.status_code == 201:
                 logger.info("Пользователь успешно создан")
-                return response.json()
+                return response_json(response)
             else:
                 logger.error(f"Ошибка при создании пользователя: {response.status_code}, {response.text}")
                 raise Exception(f"Error creating user: {response.status_code}, {response.text}")
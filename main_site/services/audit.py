@@ -0,0 +1,99 @@
+"""
+Журнал изменений профилей и филиалов (AuditRecord).
+
+Запись попадает в буфер процесса только после фиксации транзакции, в которой сделано изменение
+(transaction.on_commit): изменения откаченной транзакции в журнал не попадают, а буфер, общий для потоков,
+содержит только зафиксированные записи. Из буфера записи пишутся одним bulk_create:
+- после отдачи ответа (сигнал request_finished) — запрос не платит INSERT и запись в лог за каждое изменение;
+- вне запросов (команды, синхронизация) — когда с первой записи в буфере прошло AUDIT_FLUSH_INTERVAL секунд
+  или в нём набралось AUDIT_BUFFER_SIZE записей, и при завершении процесса. Долгоживущие команды
+  (sync_reviews --loop) вызывают flush() после каждого прохода.
+
+Массовые операции (update(), bulk_create) не вызывают save(), поэтому их код пишет одну сводную запись сам.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.dispatch import receiver
+
+from main_site.models.audit_models import AuditRecord
+
+logger = logging.getLogger(__name__)
+
+
+class AuditBuffer:
+    """
+    Несохранённые записи журнала, общие для потоков процесса.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started = None  # Когда в пустой буфер попала первая запись (monotonic)
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        """
+        :return: True, если буфер пора сбросить (переполнен или копится дольше AUDIT_FLUSH_INTERVAL).
+        """
+        with self.lock:
+            if not self.records:
+                self.started = time.monotonic()
+            self.records.append(record)
+            return (len(self.records) >= settings.AUDIT_BUFFER_SIZE
+                    or time.monotonic() - self.started >= settings.AUDIT_FLUSH_INTERVAL)
+
+    def take(self):
+        with self.lock:
+            records, self.records = self.records, []
+            return records
+
+
+_buffer = AuditBuffer()
+
+
+def record(platform_code, entity, action, object_id=None, user_id=None, **data):
+    """
+    Добавляет запись в журнал: в буфер — после фиксации текущей транзакции (сразу, если транзакции нет),
+    в БД — при следующем сбросе буфера.
+
+    :param data: Детали изменения (должны сериализоваться в JSON).
+    """
+    audit_record = AuditRecord(platform=platform_code, entity=entity, action=action, object_id=object_id,
+                               user_id=user_id, data=data)
+    transaction.on_commit(lambda: _add(audit_record))
+
+
+def _add(audit_record):
+    if _buffer.add(audit_record):
+        flush()
+
+
+def flush():
+    """
+    Пишет накопленные записи одним INSERT. Ошибка БД не должна ломать запрос, поэтому только логируется.
+
+    :return: Сколько записей сохранено.
+    """
+    records = _buffer.take()
+    if not records:
+        return 0
+    try:
+        AuditRecord.objects.bulk_create(records, batch_size=settings.AUDIT_BUFFER_SIZE)
+    except DatabaseError as exc:
+        logger.error("Не удалось сохранить журнал изменений",
+                     extra={'records_count': len(records), 'error': str(exc)})
+        return 0
+    return len(records)
+
+
+@receiver(request_finished, dispatch_uid='main_site.audit.flush')
+def flush_on_request_finished(sender, **kwargs):
+    flush()
+
+
+atexit.register(flush)
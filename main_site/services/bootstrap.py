@@ -0,0 +1,74 @@
+"""
+Дерево профилей и филиалов пользователя на всех площадках для первой загрузки фронта.
+
+Вместо 2 + N запросов (списки профилей и филиалы каждого профиля) — один, по два SQL-запроса на площадку:
+профили и все их филиалы через prefetch_related.
+
+ETag — версия дерева, которая считается без его построения: по запросу на площадку с числом профилей
+и филиалов и наибольшим updated_at. Любое изменение полей дерева меняет updated_at (save() через auto_now,
+массовые изменения в filial_selection — явно), удаление меняет число записей. Если версия совпала
+с If-None-Match, фронт получает 304, а дерево не строится вовсе.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max, Prefetch
+
+from main_site.services.platforms import PLATFORMS, Platform
+
+PROFILE_FIELDS = ('id', 'username', 'name', 'is_active')
+FILIAL_FIELDS = ('id', 'name', 'is_active')
+
+
+def platform_tree(platform: Platform, user):
+    """
+    Профили площадки с филиалами в формате списков 2gis_profiles/ и 2gis_filials/<id>/ (flamp — аналогично).
+    """
+    filials = platform.filial_model.objects.only('profile_id', platform.filial_id_field, *FILIAL_FIELDS).order_by('pk')
+    profiles = (
+        getattr(user, platform.profiles_related_name)
+        # user_id нужен менеджеру связи: без него Django догружает его отдельным запросом на каждый профиль
+        .only('user_id', *PROFILE_FIELDS)
+        .order_by('pk')
+        .prefetch_related(Prefetch(platform.filials_related_name, queryset=filials))
+    )
+    return [
+        {
+            **{field: getattr(profile, field) for field in PROFILE_FIELDS},
+            'filials': [
+                {
+                    'id': filial.id,
+                    platform.filial_id_field: getattr(filial, platform.filial_id_field),
+                    'name': filial.name,
+                    'is_active': filial.is_active,
+                }
+                for filial in getattr(profile, platform.filials_related_name).all()
+            ],
+        }
+        for profile in profiles
+    ]
+
+
+def user_tree(user):
+    """
+    :return: {код площадки: {"profiles": [...]}}.
+    """
+    return {code: {'profiles': platform_tree(platform, user)} for code, platform in PLATFORMS.items()}
+
+
+def tree_etag(user):
+    """
+    Сильный ETag дерева пользователя: по одному агрегирующему запросу на площадку.
+    В версию входят и списки полей, чтобы после изменения формата дерева закешированные ответы не подошли.
+    """
+    version = [PROFILE_FIELDS, FILIAL_FIELDS]
+    for code, platform in PLATFORMS.items():
+        totals = getattr(user, platform.profiles_related_name).aggregate(
+            profiles=Count('id', distinct=True),
+            profiles_updated_at=Max('updated_at'),
+            filials=Count(platform.filials_related_name),
+            filials_updated_at=Max(f'{platform.filials_related_name}__updated_at'),
+        )
+        version.append([code, *(str(totals[key]) for key in sorted(totals))])
+    payload = json.dumps(version, separators=(',', ':')).encode()
+    return f'"{hashlib.sha256(payload).hexdigest()[:32]}"'
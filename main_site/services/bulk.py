@@ -0,0 +1,223 @@
+"""
+Массовые операции с отзывами: параллельная отправка в микросервис с ограничением параллельности
+и частоты запросов на аккаунт площадки, результаты отдаются потоком по мере готовности (NDJSON).
+Если микросервис умеет пакетные запросы, отзывы отправляются пачками по BULK_BATCH_SIZE.
+
+Отправка — асинхронный генератор aiter_bulk. Под ASGI ответ итерирует его в event loop сервера,
+под WSGI (вью синхронные) iter_bulk поднимает свой event loop на время итерации ответа.
+"""
+import asyncio
+import math
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from FeedbackGenerator.utils.json_codec import dumps, response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
+from main_site.services import upstream
+from main_site.services.rate_limit import RateLimited, acquire_async
+
+httpx = lazy_module('httpx')
+
+BULK_TIMEOUT = 30  # Таймаут одного запроса к микросервису, сек
+
+
+@dataclass
+class BulkSummary:
+    total: int = 0
+    ok: int = 0
+    failed: int = 0
+
+    def add(self, result):
+        self.total += 1
+        if result["status"] == "ok":
+            self.ok += 1
+        else:
+            self.failed += 1
+
+
+async def aiter_bulk(items, send, account, concurrency=None):
+    """
+    Выполняет `send(client, item)` для всех элементов с ограничением параллельности и лимитом аккаунта
+    (общим с одиночными запросами и другими воркерами), отдавая результаты по мере готовности (не в порядке items).
+
+    Очередь аккаунта ждём не дольше BULK_ACCOUNT_MAX_WAIT: если аккаунт занят другими операциями,
+    элемент получает ошибку с retry_after, а не висит без ограничения.
+
+    :param account: (код площадки, ID профиля), от имени которого идут запросы.
+    :param send: async-функция (httpx.AsyncClient, item) -> dict с ключами review_id и status ("ok"/"error")
+        или список таких dict, если item — пачка {"review_ids": [...]}.
+    """
+    concurrency = concurrency or settings.BULK_CONCURRENCY
+    semaphore = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue()
+
+    async with upstream.async_client(timeout=BULK_TIMEOUT) as client:
+        async def run(item):
+            async with semaphore:
+                try:
+                    await acquire_async(*account, max_wait=settings.BULK_ACCOUNT_MAX_WAIT)
+                    async with upstream.slot_async(upstream.BACKGROUND):
+                        result = await send(client, item)
+                except RateLimited as exc:
+                    result = item_errors(item, str(exc), retry_after=math.ceil(exc.retry_after))
+                except httpx.HTTPError as exc:
+                    result = item_errors(item, f"Ошибка подключения к микросервису: {exc}")
+            await queue.put(result)
+
+        tasks = [asyncio.ensure_future(run(item)) for item in items]
+        try:
+            for _ in items:
+                result = await queue.get()
+                for row in result if isinstance(result, list) else [result]:
+                    yield row
+        finally:
+            # Клиент мог отключиться посреди потока — отменяем оставшиеся запросы
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def iter_bulk(items, send, account, concurrency=None):
+    """
+    Синхронный вариант aiter_bulk для WSGI: генератор поднимает свой event loop на время итерации.
+    """
+    loop = asyncio.new_event_loop()
+    results = aiter_bulk(items, send, account, concurrency)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def item_errors(item, error, **extra):
+    """
+    Ошибка для каждого отзыва элемента (одиночного или пачки).
+    """
+    return [{"review_id": review_id, "status": "error", "error": error, **extra}
+            for review_id in item.get("review_ids", [item.get("review_id")])]
+
+
+def error_result(review_id, response):
+    """
+    Результат для неуспешного ответа микросервиса (текст ошибки обрезается, как в одиночных вью).
+    """
+    error_message = response.text.strip() or "Неизвестная ошибка от внешнего сервиса"
+    if len(error_message) > 200:
+        error_message = error_message[:200] + "..."
+    return {"review_id": review_id, "status": "error", "status_code": response.status_code, "error": error_message}
+
+
+def batches(review_ids, size=None):
+    """
+    Делит ID отзывов на пачки для пакетных запросов: [{"review_ids": [...]}, ...].
+    """
+    size = size or settings.BULK_BATCH_SIZE
+    return [{"review_ids": review_ids[start:start + size]} for start in range(0, len(review_ids), size)]
+
+
+def batch_results(review_ids, response):
+    """
+    Результаты по каждому отзыву из ответа пакетного запроса {"results": [{"review_id": ..., ...}]}.
+    Отзывы, которых нет в ответе, считаются неуспешными; ошибка всего запроса — ошибка для каждого отзыва.
+    """
+    if response.status_code != 200:
+        return [error_result(review_id, response) for review_id in review_ids]
+    try:
+        rows = {str(row.get("review_id")): row for row in response_json(response).get("results") or []}
+    except (ValueError, AttributeError):
+        rows = {}
+
+    results = []
+    for review_id in review_ids:
+        row = rows.get(str(review_id))
+        if row is None:
+            results.append({"review_id": review_id, "status": "error", "error": "Нет результата в ответе микросервиса"})
+        elif row.get("error"):
+            results.append({"review_id": review_id, "status": "error", "error": str(row["error"])[:200]})
+        else:
+            extra = {key: value for key, value in row.items() if key not in ("review_id", "status", "error")}
+            results.append({"review_id": review_id, "status": "ok", **extra})
+    return results
+
+
+def is_asgi(request):
+    """
+    Запрос обслуживается ASGI-сервером (uvicorn): там синхронный поток ответа буферизуется целиком.
+    """
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def bulk_response(request, items, send, account, on_result=None, done=()):
+    """
+    Потоковый ответ массовой операции: по строке JSON на каждый отзыв и итоговая строка {"summary": ...}.
+
+    Под ASGI поток — асинхронный генератор в event loop сервера (синхронный StreamingHttpResponse
+    uvicorn отдаёт только целиком, и прогресс не был бы виден), под WSGI — синхронный через iter_bulk.
+
+    :param on_result: Синхронная функция для каждого результата запроса (отражение в БД, логирование).
+    :param done: Готовые результаты, которые отдаются в начале потока без запросов к микросервису.
+    """
+    summary = BulkSummary()
+
+    def line(result):
+        summary.add(result)
+        return dumps(result) + b"\n"
+
+    def summary_line():
+        return dumps({"summary": {"total": summary.total, "ok": summary.ok, "failed": summary.failed}}) + b"\n"
+
+    if is_asgi(request):
+        async def lines():
+            for result in done:
+                yield line(result)
+            async for result in aiter_bulk(items, send, account):
+                if on_result:
+                    await sync_to_async(on_result)(result)
+                yield line(result)
+            yield summary_line()
+    else:
+        def lines():
+            for result in done:
+                yield line(result)
+            for result in iter_bulk(items, send, account):
+                if on_result:
+                    on_result(result)
+                yield line(result)
+            yield summary_line()
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    # Без буферизации на прокси, чтобы фронт видел прогресс
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def validate_items(items, required=('review_id',)):
+    """
+    :param required: Обязательные поля элементов-объектов; пустой — элементы сами являются ID отзывов.
+    :return: Текст ошибки или None, если список корректный.
+    """
+    if not isinstance(items, list) or not items:
+        return "Ожидается непустой список"
+    if len(items) > settings.BULK_MAX_ITEMS:
+        return f"Не больше {settings.BULK_MAX_ITEMS} отзывов за запрос"
+    for index, item in enumerate(items):
+        if not required:
+            if isinstance(item, (dict, list)) or item in (None, ""):
+                return f"Элемент {index}: ожидается ID отзыва"
+            continue
+        if not isinstance(item, dict):
+            return f"Элемент {index}: ожидается объект"
+        missing = [key for key in required if item.get(key) in (None, "")]
+        if missing:
+            return f"Элемент {index}: отсутствуют поля {', '.join(missing)}"
+    return None
@@ -0,0 +1,124 @@
+"""
+Выбор филиалов профиля (is_active) одним запросом фронта.
+
+Фронт передаёт полный список ID филиалов, которые должны быть выбраны. Применяется двумя UPDATE
+без загрузки объектов и без save() на каждый филиал: выбранные включаются, остальные выключаются.
+Принадлежность профиля пользователю проверяется в тех же UPDATE (условие по profile__user),
+в журнал изменений пишется одна сводная запись.
+
+link_filials — обновление списка филиалов после привязки профиля к площадке.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main_site.services import audit
+from main_site.services.platforms import Platform
+
+
+class UnknownFilials(ValueError):
+    """
+    Часть ID не принадлежит профилю пользователя; изменения откатываются.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        super().__init__(f"Филиалы не найдены: {', '.join(map(str, ids))}")
+
+
+@dataclass
+class Selection:
+    active_ids: list
+    activated: int  # Филиалов в выборе (совпало с запросом на включение)
+    deactivated: int  # Снято выбранных ранее филиалов
+
+
+def set_active_filials(platform: Platform, user, profile_id, active_ids):
+    """
+    :param active_ids: Полный набор ID филиалов (pk), которые должны быть выбраны; остальные выключаются.
+    :return: Selection или None, если профиль не найден у пользователя.
+    :raises UnknownFilials: Если часть ID не относится к профилю.
+    """
+    active_ids = sorted(set(active_ids))
+    owned = platform.filial_model.objects.filter(profile_id=profile_id, profile__user=user)
+
+    try:
+        with transaction.atomic():
+            # update() не трогает auto_now, а по updated_at считается версия дерева (ETag bootstrap)
+            now = timezone.now()
+            activated = owned.filter(id__in=active_ids).update(is_active=True, updated_at=now) if active_ids else 0
+            if activated != len(active_ids):
+                raise UnknownFilials([])
+            deactivated = owned.filter(is_active=True).exclude(id__in=active_ids).update(is_active=False,
+                                                                                          updated_at=now)
+    except UnknownFilials:
+        # Редкий путь ошибки: выясняем, каких именно филиалов нет (после отката)
+        found = set(owned.filter(id__in=active_ids).values_list('id', flat=True))
+        if not found and not getattr(user, platform.profiles_related_name).filter(id=profile_id).exists():
+            return None
+        raise UnknownFilials([filial_id for filial_id in active_ids if filial_id not in found])
+
+    if not activated and not deactivated and \
+            not getattr(user, platform.profiles_related_name).filter(id=profile_id).exists():
+        return None
+
+    # Одна сводная запись журнала вместо записи на каждый филиал из save()
+    audit.record(platform.code, 'filial', 'select', object_id=profile_id, user_id=user.pk,
+                 active_ids=active_ids, activated=activated, deactivated=deactivated)
+    return Selection(active_ids=active_ids, activated=activated, deactivated=deactivated)
+
+
+def link_filials(platform: Platform, profile, filials, user_id=None):
+    """
+    Приводит филиалы профиля к списку с площадки: новые добавляются, у существующих (по ID на площадке)
+    обновляется название, удаляются только исчезнувшие с площадки. Отзывы, статистика и метки синхронизации
+    оставшихся филиалов сохраняются (они удаляются каскадно вместе с филиалом).
+
+    :param filials: Список {"id": ID на площадке, "name": название}.
+    :return: {"created": [...], "updated": [...], "deleted": [...]} — ID филиалов на площадке.
+    """
+    model = platform.filial_model
+    id_field = platform.filial_id_field
+    names = {str(int(filial['id'])): filial['name'] for filial in filials}
+
+    with transaction.atomic():
+        existing = {getattr(filial, id_field): filial
+                    for filial in model.objects.filter(profile=profile).only('id', id_field, 'name')}
+
+        renamed = []
+        now = timezone.now()
+        for filial_id, filial in existing.items():
+            if filial_id in names and filial.name != names[filial_id]:
+                filial.name = names[filial_id]
+                filial.updated_at = now
+                renamed.append(filial)
+        model.objects.bulk_update(renamed, ['name', 'updated_at'])
+
+        created = [filial_id for filial_id in names if filial_id not in existing]
+        model.objects.bulk_create(model(profile=profile, name=names[filial_id], **{id_field: filial_id})
+                                  for filial_id in created)
+
+        deleted = [filial_id for filial_id in existing if filial_id not in names]
+        if deleted:
+            model.objects.filter(id__in=[existing[filial_id].pk for filial_id in deleted]).delete()
+
+    changes = {"created": created, "updated": [getattr(filial, id_field) for filial in renamed], "deleted": deleted}
+    # Одна сводная запись журнала вместо записи на каждый филиал
+    audit.record(platform.code, 'filial', 'link', object_id=profile.pk, user_id=user_id, **changes)
+    return changes
+
+
+def parse_active_ids(data):
+    """
+    :return: (список ID, None) или (None, текст ошибки).
+    """
+    active_ids = data.get('active_ids') if isinstance(data, dict) else None
+    if not isinstance(active_ids, list):
+        return None, "Ожидается active_ids — список ID филиалов"
+    if len(active_ids) > settings.BULK_MAX_ITEMS:
+        return None, f"Не больше {settings.BULK_MAX_ITEMS} филиалов за запрос"
+    if not all(isinstance(filial_id, int) and not isinstance(filial_id, bool) for filial_id in active_ids):
+        return None, "ID филиалов должны быть целыми числами"
+    return active_ids, None
@@ -0,0 +1,127 @@
+"""
+Последние успешные ответы микросервисов (last-known-good) для отзывов и статистики.
+
+Каждый успешный ответ fetch_reviews / fetch_stats запоминается по площадке, виду данных, пользователю
+и параметрам запроса. Если микросервис потом отвечает 5xx или не отвечает (перезапуск, таймаут),
+вью отдаёт запомненный ответ с пометками устаревания:
+- в теле — "stale": true и "stale_age" (сек с момента получения);
+- в заголовках — Age и X-Reviews-Source / X-Stats-Source: cache (local — ответ из локальной БД, см. review_store).
+
+Одновременно в фоне запускается обновление: запрос повторяется с паузами (LKG_REFRESH_ATTEMPTS раз)
+и при успехе запомненный ответ заменяется свежим, так что следующий запрос оператора уже получит новые данные,
+даже если микросервис снова недоступен.
+
+Хранилище — кеш Django 'last_known_good' (Redis при заданном REDIS_URL, иначе память процесса).
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from FeedbackGenerator.utils.json_codec import dumps, loads
+from FeedbackGenerator.utils.lazy_import import lazy_module
+from main_site.services import upstream
+
+httpx = lazy_module('httpx')
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'last_known_good'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='lkg-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def cache_key(platform_code, kind, user_id, params):
+    """
+    :param kind: reviews или stats.
+    :param params: Параметры запроса к микросервису (от них зависит ответ).
+    """
+    query = dumps(sorted((str(key), str(value)) for key, value in (params or {}).items()))
+    return f"lkg:{platform_code}:{kind}:{user_id}:{hashlib.sha256(query).hexdigest()[:32]}"
+
+
+def remember(key, body):
+    """
+    Запоминает успешный ответ.
+
+    :param body: Данные ответа (dict) или уже закодированный JSON (bytes).
+    """
+    body = body if isinstance(body, bytes) else dumps(body)
+    caches[CACHE_ALIAS].set(key, (time.time(), body), timeout=settings.LKG_MAX_AGE)
+
+
+def stale_response(key, source_header):
+    """
+    :param source_header: Заголовок источника данных (X-Reviews-Source / X-Stats-Source).
+    :return: DRF Response с запомненным ответом и пометками устаревания или None, если ответа нет.
+    """
+    entry = caches[CACHE_ALIAS].get(key)
+    if entry is None:
+        return None
+    stored_at, body = entry
+    age = max(0, int(time.time() - stored_at))
+    data = loads(body)
+    if isinstance(data, dict):
+        data = {**data, "stale": True, "stale_age": age}
+
+    response = Response(data, status=200)
+    response['Age'] = str(age)
+    response[source_header] = 'cache'
+    return response
+
+
+def refresh_in_background(key, url, params, build):
+    """
+    Обновляет запомненный ответ в фоне, повторяя запрос к микросервису с растущими паузами.
+    Для одного ключа одновременно идёт не больше одного обновления.
+
+    :param build: Функция (тело ответа микросервиса, bytes) -> данные для remember или None,
+        если ответ не стоит запоминать (например, данные ещё собираются).
+    :return: Future или None, если обновление этого ключа уже идёт.
+    """
+    with _refreshing_lock:
+        if key in _refreshing:
+            return None
+        _refreshing.add(key)
+    return _executor.submit(_refresh, key, url, params, build)
+
+
+def _refresh(key, url, params, build):
+    try:
+        for attempt in range(settings.LKG_REFRESH_ATTEMPTS):
+            if attempt:
+                time.sleep(settings.LKG_REFRESH_BACKOFF * 2 ** (attempt - 1))
+            try:
+                with upstream.slot(upstream.BACKGROUND), upstream.client(timeout=upstream.DEFAULT_TIMEOUT) as client:
+                    response = client.get(url, params=params)
+                response.raise_for_status()
+                body = build(response.content)
+            except (httpx.HTTPError, ValueError) as exc:
+                logger.info("Фоновое обновление данных микросервиса не удалось",
+                            extra={'url': url, 'attempt': attempt + 1, 'error': str(exc)})
+                continue
+            if body is not None:
+                remember(key, body)
+            return True
+        return False
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def serve_stale(key, source_header, url, params, build):
+    """
+    Ответ при недоступном микросервисе: запомненные данные (если есть) и фоновое обновление.
+
+    :return: DRF Response или None, если запомненного ответа нет.
+    """
+    response = stale_response(key, source_header)
+    refresh_in_background(key, url, params, build)
+    return response
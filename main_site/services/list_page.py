@@ -0,0 +1,80 @@
+"""
+Постраничная выдача и выбор полей для внутренних списков (профили, филиалы).
+
+- Курсорная (keyset) пагинация по id: страница — WHERE id > <последний id> ORDER BY id LIMIT n,
+  стоимость запроса не зависит от номера страницы (в отличие от OFFSET).
+- fields= — список нужных полей через запятую; в SQL попадают только они (values()), объекты моделей
+  не создаются.
+
+Без limit отдаётся страница из MAX_PAGE_SIZE строк с next_cursor: целиком таблица за один запрос не читается.
+Списки пользователя обычно меньше этого предела, поэтому фронт, не знающий о курсоре, получает их полностью.
+"""
+import base64
+import json
+
+MAX_PAGE_SIZE = 500
+
+
+def parse_fields(value, allowed):
+    """
+    :param value: Значение параметра fields (например, "id,name") или None — все поля.
+    :param allowed: Допустимые поля в порядке вывода.
+    :return: Кортеж полей; id входит всегда (по нему строится курсор).
+    :raises ValueError: Если запрошено неизвестное поле.
+    """
+    if not value:
+        return tuple(allowed)
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"неизвестные поля: {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field == 'id' or field in requested)
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :raises ValueError: Если курсор повреждён.
+    """
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['after']
+    except (TypeError, KeyError) as exc:
+        raise ValueError(f"Некорректный курсор: {exc}")
+    if not isinstance(after, int):
+        raise ValueError("Некорректный курсор")
+    return after
+
+
+def parse_page_size(value):
+    """
+    :return: Размер страницы (без limit — MAX_PAGE_SIZE).
+    :raises ValueError: Если limit не целое число.
+    """
+    if not value:
+        return MAX_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def list_page(queryset, fields, query_params):
+    """
+    Страница списка по параметрам запроса limit и cursor.
+
+    :param queryset: Строки списка (без сортировки — сортируется по id).
+    :param fields: Поля из parse_fields.
+    :return: (список словарей, курсор следующей страницы или None).
+    :raises ValueError: Если limit или cursor некорректны.
+    """
+    limit = parse_page_size(query_params.get('limit'))
+    cursor = query_params.get('cursor')
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+
+    # Одна лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+    rows = list(queryset.order_by('id').values(*fields)[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]['id'])
+    return rows, None
@@ -0,0 +1,280 @@
+"""
+Прокси фото отзывов с кешем миниатюр на диске.
+
+Фото отзывов лежат на CDN площадок в полном размере. Прокси скачивает фото один раз, уменьшает
+до ширины из PHOTO_THUMBNAIL_SIZES, сохраняет в WebP в PHOTO_CACHE_DIR и дальше отдаёт файл с диска
+с долгим кешированием в браузере.
+
+- Уменьшение идёт в пуле процессов (Pillow, CPU-bound), а не в потоке запроса под GIL.
+- Кеш ограничен PHOTO_CACHE_MAX_BYTES: при переполнении удаляются давно не читанные файлы
+  (время последнего чтения — mtime файла, обновляется при каждом попадании).
+- Скачиваются только фото с хостов PHOTO_PROXY_ALLOWED_HOSTS, без редиректов и не больше PHOTO_PROXY_MAX_BYTES,
+  чтобы прокси нельзя было использовать для запросов во внутреннюю сеть.
+- Картинки больше PHOTO_PROXY_MAX_PIXELS не декодируются: маленький файл может распаковаться
+  в гигабайты пикселей и занять процесс пула надолго.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from FeedbackGenerator.utils.lazy_import import lazy_module
+
+httpx = lazy_module('httpx')
+
+FETCH_TIMEOUT = 10  # Сек на скачивание оригинала с CDN
+RESIZE_TIMEOUT = 30  # Сек на уменьшение в пуле процессов
+EVICT_TO = 0.9  # После очистки кеш занимает не больше этой доли лимита
+
+
+class PhotoProxyError(Exception):
+    """
+    Фото нельзя отдать через прокси (хост не разрешён, CDN вернул ошибку, файл не картинка или слишком большой).
+    """
+
+    def __init__(self, message, status_code=400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def make_thumbnail(content: bytes, width: int, max_pixels: int) -> bytes:
+    """
+    Уменьшает картинку до ширины width (меньшие не увеличиваются) и кодирует в WebP.
+    Выполняется в процессе пула, поэтому Pillow импортируется здесь, а не в процессе Django.
+
+    :param max_pixels: Максимум пикселей (ширина × высота) оригинала; проверяется по заголовку до декодирования.
+    :raises ImportError: Если Pillow не установлен.
+    :raises ValueError: Если картинка больше max_pixels.
+    """
+    from PIL import Image, ImageOps
+
+    # Свой предел вместо умолчания Pillow (~89 Мп); сам Pillow отказывает только после двойного превышения
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(io.BytesIO(content)) as image:
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"Слишком много пикселей: {image.width}x{image.height}")
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        output = io.BytesIO()
+        image.save(output, format='WEBP', quality=80, method=4)
+        return output.getvalue()
+
+
+class DiskLRU:
+    """
+    Файлы миниатюр в каталоге с ограничением общего размера.
+
+    Размер кеша считается сканированием каталога при первом обращении, дальше — по записям этого процесса.
+    Другие воркеры пишут в тот же каталог, поэтому при переполнении каталог сканируется заново.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.total = None
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.webp")
+
+    def get(self, key):
+        """
+        :return: Путь к файлу или None, если его нет в кеше.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)  # Отметка последнего чтения для LRU
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, content):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и переименование: другой воркер никогда не прочитает файл наполовину
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, _, size in self._scan())
+            else:
+                self.total += len(content)
+            if self.total > self.max_bytes:
+                self._evict()
+        return path
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.webp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # Удалён другим воркером
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
+
+
+_cache = None
+_pool = None
+_state_lock = threading.Lock()
+_key_locks = {}  # Ключ миниатюры -> [блокировка, сколько запросов её держат или ждут]
+
+
+def get_cache():
+    global _cache
+    with _state_lock:
+        if _cache is None:
+            _cache = DiskLRU(settings.PHOTO_CACHE_DIR, settings.PHOTO_CACHE_MAX_BYTES)
+        return _cache
+
+
+def _get_pool():
+    global _pool
+    with _state_lock:
+        if _pool is None:
+            # spawn, а не fork: процесс Django многопоточный, fork копирует захваченные блокировки
+            _pool = ProcessPoolExecutor(max_workers=settings.PHOTO_PROXY_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def thumbnail_width(value):
+    """
+    Ближайшая ширина из PHOTO_THUMBNAIL_SIZES не меньше запрошенной (число вариантов в кеше ограничено).
+
+    :raises ValueError: Если width не целое число.
+    """
+    sizes = sorted(settings.PHOTO_THUMBNAIL_SIZES)
+    if not value:
+        return sizes[len(sizes) // 2]
+    width = int(value)
+    return next((size for size in sizes if size >= width), sizes[-1])
+
+
+def check_url(url):
+    """
+    :raises PhotoProxyError: Если URL не http(s) или хост не из PHOTO_PROXY_ALLOWED_HOSTS.
+    """
+    parts = urlsplit(url or '')
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise PhotoProxyError("Ожидается http(s) URL фото")
+    if not any(host == allowed or host.endswith('.' + allowed) for allowed in settings.PHOTO_PROXY_ALLOWED_HOSTS):
+        raise PhotoProxyError(f"Хост {host} не разрешён для прокси фото")
+
+
+def _download(url):
+    limit = settings.PHOTO_PROXY_MAX_BYTES
+    try:
+        with httpx.Client(timeout=FETCH_TIMEOUT, follow_redirects=False) as client:
+            with client.stream('GET', url) as response:
+                if response.status_code != 200:
+                    raise PhotoProxyError(f"CDN вернул {response.status_code}", status_code=502)
+                if not response.headers.get('Content-Type', '').startswith('image/'):
+                    raise PhotoProxyError("По URL не картинка", status_code=502)
+                content = bytearray()
+                for chunk in response.iter_bytes():
+                    content += chunk
+                    if len(content) > limit:
+                        raise PhotoProxyError("Фото слишком большое", status_code=502)
+                return bytes(content)
+    except httpx.HTTPError as exc:
+        raise PhotoProxyError(f"Ошибка загрузки фото: {exc}", status_code=502)
+
+
+@contextmanager
+def _key_lock(key):
+    """
+    Блокировка запросов одной миниатюры. Запись удаляется, только когда блокировку никто не держит и не ждёт:
+    иначе следующий запрос создал бы новую блокировку и обрабатывал фото параллельно с ожидающими.
+    """
+    with _state_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _state_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def thumbnail_path(url, width):
+    """
+    Путь к миниатюре на диске: из кеша или после скачивания и уменьшения.
+    Параллельные запросы одного фото ждут первый, поэтому оригинал скачивается один раз.
+
+    :raises PhotoProxyError: Если фото нельзя получить.
+    :raises ImportError: Если Pillow не установлен.
+    """
+    check_url(url)
+    key = hashlib.sha256(f"{width}:{url}".encode()).hexdigest()
+    cache = get_cache()
+    path = cache.get(key)
+    if path:
+        return path
+
+    with _key_lock(key):
+        path = cache.get(key)
+        if path:
+            return path
+        content = _download(url)
+        future = _get_pool().submit(make_thumbnail, content, width, settings.PHOTO_PROXY_MAX_PIXELS)
+        try:
+            thumbnail = future.result(timeout=RESIZE_TIMEOUT)
+        except ImportError:
+            raise
+        except FutureTimeout:
+            # До Python 3.11 это не встроенный TimeoutError. Задача, которая ещё ждёт в очереди пула,
+            # снимается; уже запущенную не прервать, её время ограничено PHOTO_PROXY_MAX_PIXELS
+            future.cancel()
+            raise PhotoProxyError("Фото обрабатывается слишком долго", status_code=504)
+        except Exception as exc:  # Pillow не смог открыть файл или процесс пула упал
+            raise PhotoProxyError(f"Не удалось обработать фото: {exc}", status_code=502)
+        return cache.put(key, thumbnail)
+
+
+def open_thumbnail(url, width):
+    """
+    Открытая на чтение миниатюра. Между thumbnail_path и открытием файл может удалить очистка кеша
+    другого воркера — тогда миниатюра делается заново (открытый файл очистка уже не помешает дочитать).
+
+    :raises FileNotFoundError: Если файл удалили и после повторного создания.
+    :raises PhotoProxyError, ImportError: Как у thumbnail_path.
+    """
+    try:
+        return open(thumbnail_path(url, width), 'rb')
+    except FileNotFoundError:
+        return open(thumbnail_path(url, width), 'rb')
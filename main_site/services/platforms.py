@@ -0,0 +1,67 @@
+"""
+Описание площадок (2GIS, Flamp) для кода, общего для обеих: модели и имена полей.
+"""
+from dataclasses import dataclass
+
+from main_site.models import DgisFilial, DgisReview, DgisReviewReply, DgisReviewPhoto, DgisFilialStats, DgisDailyRollup, \
+    FlampFilial, FlampReview, FlampReviewReply, FlampReviewPhoto, FlampFilialStats, FlampDailyRollup
+
+
+@dataclass(frozen=True)
+class Platform:
+    code: str  # Код площадки в URL и параметрах: '2gis' / 'flamp'
+    name: str  # Название для логов
+    filial_model: type
+    review_model: type
+    reply_model: type
+    photo_model: type
+    stats_model: type
+    rollup_model: type
+    filial_id_field: str  # Поле филиала с ID на площадке
+    profiles_related_name: str  # related_name профилей у User
+    filials_related_name: str  # related_name филиалов у профиля
+
+
+DGIS = Platform(
+    code='2gis',
+    name='2GIS',
+    filial_model=DgisFilial,
+    review_model=DgisReview,
+    reply_model=DgisReviewReply,
+    photo_model=DgisReviewPhoto,
+    stats_model=DgisFilialStats,
+    rollup_model=DgisDailyRollup,
+    filial_id_field='dgis_filial_id',
+    profiles_related_name='dgis_profiles',
+    filials_related_name='dgis_filials',
+)
+
+FLAMP = Platform(
+    code='flamp',
+    name='Flamp',
+    filial_model=FlampFilial,
+    review_model=FlampReview,
+    reply_model=FlampReviewReply,
+    photo_model=FlampReviewPhoto,
+    stats_model=FlampFilialStats,
+    rollup_model=FlampDailyRollup,
+    filial_id_field='flamp_filial_id',
+    profiles_related_name='flamp_profiles',
+    filials_related_name='flamp_filials',
+)
+
+PLATFORMS = {platform.code: platform for platform in (DGIS, FLAMP)}
+
+
+def get_platform(code) -> Platform:
+    """
+    :raises KeyError: Если площадка неизвестна.
+    """
+    return PLATFORMS[code]
+
+
+def user_filials(platform: Platform, user):
+    """
+    Филиалы площадки, принадлежащие пользователю (через его профили).
+    """
+    return platform.filial_model.objects.filter(profile__user=user)
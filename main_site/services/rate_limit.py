@@ -0,0 +1,151 @@
+"""
+Лимит запросов к площадкам от имени аккаунта пользователя (DgisProfile/FlampProfile).
+
+Микросервисы действуют от имени настоящих аккаунтов 2GIS/Flamp, и слишком частые ответы или жалобы
+ведут к антибот-блокировке аккаунта. Поэтому на каждую пару (площадка, профиль) заведён token bucket:
+до ACCOUNT_RATE_LIMIT_BURST запросов сразу, дальше — не чаще ACCOUNT_RATE_LIMIT_PER_SECOND.
+
+Бакет работает по резервированию: запрос сразу получает своё место в очереди и время, которое нужно
+подождать. Ожидающие не опрашивают бакет повторно, поэтому запросы идут с максимальной безопасной
+скоростью без всплесков и отказов.
+
+Если задан REDIS_URL, бакеты хранятся в Redis (один Lua-скрипт на резервирование) и общие для всех
+воркеров gunicorn. Без Redis (или если он недоступен) бакеты живут в памяти процесса.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from FeedbackGenerator.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'account_rate'
+
+# KEYS[1] — ключ бакета; ARGV: скорость в секунду, размер всплеска, максимальное ожидание в мс (-1 — без ограничения).
+# Хранится время (мс), когда бакет снова будет полным; резервирование сдвигает его на 1/rate.
+# Возвращает ожидание в мс: >= 0 — место зарезервировано, < 0 — отказ, -значение — через сколько повторить.
+RESERVE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local interval = 1000 / tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+
+local full_at = tonumber(redis.call('GET', KEYS[1]) or now)
+if full_at < now then
+    full_at = now
+end
+local wait = full_at + interval - burst * interval - now
+if wait < 0 then
+    wait = 0
+end
+if max_wait >= 0 and wait > max_wait then
+    return -math.ceil(wait - max_wait)
+end
+full_at = full_at + interval
+redis.call('SET', KEYS[1], full_at, 'PX', math.ceil(full_at - now) + 1000)
+return math.ceil(wait)
+"""
+
+
+class RateLimited(Exception):
+    """
+    Аккаунт исчерпал лимит, а ждать дольше разрешённого нельзя.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Превышен лимит запросов аккаунта, повторите через {retry_after:.1f} с")
+        self.retry_after = retry_after
+
+
+class LocalBuckets:
+    """
+    Бакеты в памяти процесса: та же логика, что в RESERVE_SCRIPT.
+    """
+
+    def __init__(self):
+        self.full_at = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, key, rate, burst, max_wait):
+        interval = 1 / rate
+        with self.lock:
+            now = time.monotonic()
+            full_at = max(self.full_at.get(key, now), now)
+            wait = max(0.0, full_at + interval - burst * interval - now)
+            if max_wait is not None and wait > max_wait:
+                return -(wait - max_wait)
+            self.full_at[key] = full_at + interval
+            return wait
+
+
+class RedisBuckets:
+    """
+    Бакеты в Redis, общие для всех воркеров.
+    """
+
+    def __init__(self, client):
+        self.script = client.register_script(RESERVE_SCRIPT)
+
+    def reserve(self, key, rate, burst, max_wait):
+        max_wait_ms = -1 if max_wait is None else int(max_wait * 1000)
+        return int(self.script(keys=[key], args=[rate, burst, max_wait_ms])) / 1000
+
+
+_local = LocalBuckets()
+
+
+def _buckets():
+    client = get_redis()
+    return RedisBuckets(client) if client is not None else _local
+
+
+def reserve(platform_code, profile_id, max_wait=None):
+    """
+    Резервирует запрос от имени аккаунта.
+
+    :param max_wait: Сколько секунд можно ждать своей очереди (None — сколько потребуется).
+    :return: Сколько секунд подождать перед запросом.
+    :raises RateLimited: Если ждать пришлось бы дольше max_wait (место при этом не резервируется).
+    """
+    key = f"{KEY_PREFIX}:{platform_code}:{profile_id}"
+    rate, burst = settings.ACCOUNT_RATE_LIMIT_PER_SECOND, settings.ACCOUNT_RATE_LIMIT_BURST
+    try:
+        wait = _buckets().reserve(key, rate, burst, max_wait)
+    except Exception as exc:
+        # Redis недоступен — лучше ограничивать в пределах процесса, чем не ограничивать совсем
+        logger.warning("Лимит аккаунтов: Redis недоступен, используется лимит в памяти процесса",
+                       extra={'error': str(exc)})
+        wait = _local.reserve(key, rate, burst, max_wait)
+
+    if wait < 0:
+        raise RateLimited(-wait)
+    return wait
+
+
+def acquire(platform_code, profile_id, max_wait=None):
+    """
+    Ждёт своей очереди на запрос от имени аккаунта (синхронно).
+
+    :raises RateLimited: Если ждать пришлось бы дольше max_wait.
+    """
+    wait = reserve(platform_code, profile_id, max_wait)
+    if wait:
+        time.sleep(wait)
+
+
+async def acquire_async(platform_code, profile_id, max_wait=None):
+    """
+    То же, что acquire, для асинхронного кода. Скрипт в Redis — синхронный вызов (до REDIS_TIMEOUT),
+    поэтому резервирование выполняется в потоке executor'а и не блокирует event loop.
+    """
+    if get_redis() is None:
+        wait = reserve(platform_code, profile_id, max_wait)
+    else:
+        wait = await asyncio.get_running_loop().run_in_executor(None, reserve, platform_code, profile_id, max_wait)
+    if wait:
+        await asyncio.sleep(wait)
@@ -0,0 +1,218 @@
+"""
+Балансировка запросов между репликами микросервиса площадки на стороне клиента.
+
+DGIS_SERVICE_ADDRESS / FLAMP_SERVICE_ADDRESS могут содержать несколько адресов через запятую
+(DGIS_SERVICE_REPLICAS / FLAMP_SERVICE_REPLICAS в settings). URL запросов по-прежнему строятся от первого адреса,
+а транспорт httpx (upstream.client / upstream.async_client) подменяет адрес на выбранную реплику:
+
+- по умолчанию — «выбор из двух» (power of two choices): из двух случайных здоровых реплик берётся та,
+  у которой меньше незавершённых запросов этого процесса;
+- с UPSTREAM_STICKY_PARAM (по умолчанию main_user_id) запросы одного аккаунта идут на одну реплику
+  (rendezvous hashing), чтобы сессия площадки на ней оставалась тёплой. При исключении реплики
+  на другие реплики переезжают только её аккаунты;
+- пассивная проверка здоровья: после UPSTREAM_EJECT_AFTER подряд сетевых ошибок или ответов 502/503/504
+  реплика исключается на UPSTREAM_EJECT_SECONDS. Вернувшейся реплике хватает одной ошибки, чтобы снова
+  выпасть, а первый успешный ответ обнуляет счётчик. Ответ 500 ошибкой реплики не считается — это ошибка
+  обработки конкретного запроса. Если исключены все реплики, запросы идут по всем.
+
+Счётчики и исключения у каждого процесса свои.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+from FeedbackGenerator.utils.json_codec import loads
+
+logger = logging.getLogger(__name__)
+
+# Ответы, означающие, что реплика (или прокси перед ней) не может обслуживать запросы
+UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+class Replica:
+    def __init__(self, address):
+        self.address = address.rstrip('/')
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def weight(self, key):
+        """
+        Вес реплики для ключа закрепления: ключ достаётся реплике с наибольшим весом.
+        """
+        digest = hashlib.blake2b(f"{self.address}|{key}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def __repr__(self):
+        return f"Replica({self.address!r})"
+
+
+class ReplicaPool:
+    """
+    Реплики одного микросервиса со счётчиками незавершённых запросов и подряд идущих ошибок.
+    """
+
+    def __init__(self, addresses, eject_after, eject_seconds):
+        self.replicas = [Replica(address) for address in addresses]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.lock = threading.Lock()
+
+    def match(self, url):
+        """
+        :return: Реплика, адрес которой — начало url, или None.
+        """
+        for replica in self.replicas:
+            if url == replica.address or url.startswith(replica.address + '/'):
+                return replica
+        return None
+
+    def healthy(self, now=None):
+        now = time.monotonic() if now is None else now
+        return [replica for replica in self.replicas if replica.ejected_until <= now] or self.replicas
+
+    def choose(self, key=None):
+        """
+        :param key: Ключ закрепления (например, main_user_id) или None для выбора по нагрузке.
+        """
+        with self.lock:
+            healthy = self.healthy()
+            if key is not None:
+                return max(healthy, key=lambda replica: replica.weight(key))
+            if len(healthy) == 1:
+                return healthy[0]
+            first, second = random.sample(healthy, 2)
+            return first if first.outstanding <= second.outstanding else second
+
+    def begin(self, replica):
+        with self.lock:
+            replica.outstanding += 1
+
+    def end(self, replica, ok=None):
+        """
+        :param ok: True — реплика ответила, False — недоступна, None — исход не говорит о здоровье реплики.
+        """
+        with self.lock:
+            replica.outstanding -= 1
+            if ok:
+                replica.failures = 0
+            elif ok is False:
+                replica.failures += 1
+                if replica.failures >= self.eject_after:
+                    replica.ejected_until = time.monotonic() + self.eject_seconds
+                    logger.warning("Реплика микросервиса исключена из балансировки",
+                                   extra={'replica': replica.address, 'failures': replica.failures,
+                                          'eject_seconds': self.eject_seconds})
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url):
+    """
+    Пул реплик микросервиса, к которому относится url, или None, если у микросервиса одна реплика.
+    """
+    for addresses in (settings.DGIS_SERVICE_REPLICAS, settings.FLAMP_SERVICE_REPLICAS):
+        if not addresses or len(addresses) < 2:
+            continue
+        key = (tuple(addresses), settings.UPSTREAM_EJECT_AFTER, settings.UPSTREAM_EJECT_SECONDS)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ReplicaPool(*key)
+        if pool.match(url):
+            return pool
+    return None
+
+
+def sticky_key(request: httpx.Request):
+    """
+    Значение UPSTREAM_STICKY_PARAM из query-параметров или JSON-тела запроса.
+    """
+    param = settings.UPSTREAM_STICKY_PARAM
+    if not param:
+        return None
+    value = request.url.params.get(param)
+    if value is None and request.headers.get('Content-Type', '').startswith('application/json'):
+        try:
+            body = loads(request.content)
+        except (ValueError, httpx.RequestNotRead):
+            body = None
+        if isinstance(body, dict):
+            value = body.get(param)
+    return None if value is None else str(value)
+
+
+@contextmanager
+def route(request: httpx.Request):
+    """
+    Направляет запрос на реплику (меняет URL и Host) и учитывает его исход.
+    Отдаёт функцию, которой передаётся статус ответа.
+    """
+    url = str(request.url)
+    pool = get_pool(url)
+    if pool is None:
+        yield lambda status_code: None
+        return
+
+    current = pool.match(url)
+    replica = pool.choose(sticky_key(request))
+    if replica is not current:
+        request.url = httpx.URL(replica.address + url[len(current.address):])
+        request.headers['Host'] = request.url.netloc.decode('ascii')
+
+    outcome = []
+    pool.begin(replica)
+    try:
+        yield outcome.append
+    except httpx.TransportError:
+        pool.end(replica, ok=False)
+        raise
+    except BaseException:
+        pool.end(replica)
+        raise
+    else:
+        pool.end(replica, ok=outcome[-1] not in UNAVAILABLE_STATUSES if outcome else None)
+
+
+class BalancedTransport(httpx.BaseTransport):
+    """
+    Синхронный транспорт httpx с выбором реплики. Незавершённым запрос считается до получения заголовков ответа.
+    """
+
+    def __init__(self, **kwargs):
+        self.transport = httpx.HTTPTransport(**kwargs)
+
+    def handle_request(self, request):
+        with route(request) as observe:
+            response = self.transport.handle_request(request)
+            observe(response.status_code)
+            return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncBalancedTransport(httpx.AsyncBaseTransport):
+    """
+    Асинхронный вариант BalancedTransport.
+    """
+
+    def __init__(self, **kwargs):
+        self.transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        with route(request) as observe:
+            response = await self.transport.handle_async_request(request)
+            observe(response.status_code)
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
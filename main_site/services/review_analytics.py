@@ -0,0 +1,93 @@
+"""
+Динамика оценок по периодам (день/неделя/месяц) по дневным агрегатам отзывов.
+
+DailyRollup хранит по каждому филиалу и дню кол-во отзывов, сумму и гистограмму оценок.
+Агрегаты пересчитываются только для дней, затронутых сохранением отзывов, а графики строятся
+одним GROUP BY по агрегатам — таблица отзывов при этом не читается.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from main_site.services.platforms import Platform
+from main_site.services.review_stats import COUNTER_FIELDS, STAR_FIELDS, counters_result
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+DEFAULT_RANGE = timedelta(days=365)
+
+
+def refresh_daily_rollups(platform: Platform, filial, days):
+    """
+    Пересчитывает дневные агрегаты филиала за указанные дни одним агрегирующим запросом.
+    Дни без отзывов удаляются.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+
+    # Диапазон вместо created_at__date__in, чтобы запрос шёл по индексу (filial, created_at)
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(days[0], time.min, tzinfo=tz)
+    end = datetime.combine(days[-1] + timedelta(days=1), time.min, tzinfo=tz)
+    rows = (
+        platform.review_model.objects.filter(filial=filial, created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(
+            count_reviews=Count('pk'),
+            rating_sum=Sum('rating'),
+            **{field: Count('pk', filter=Q(rating=stars)) for stars, field in STAR_FIELDS},
+        )
+    )
+    counters = {row.pop('day'): row for row in rows}
+
+    platform.rollup_model.objects.bulk_create(
+        [platform.rollup_model(filial=filial, day=day, **row) for day, row in counters.items()],
+        update_conflicts=True,
+        unique_fields=['filial', 'day'],
+        update_fields=COUNTER_FIELDS,
+    )
+    empty_days = [day for day in days if day not in counters]
+    if empty_days:
+        platform.rollup_model.objects.filter(filial=filial, day__in=empty_days).delete()
+
+
+def rating_series(platform: Platform, user, period='week', date_from=None, date_to=None, filial_id=None,
+                  profile_id=None):
+    """
+    Ряд статистики оценок по периодам для филиалов пользователя на площадке.
+
+    :param period: 'day', 'week' или 'month'.
+    :param date_from: Первый день диапазона (по умолчанию — год назад от date_to).
+    :param date_to: Последний день диапазона включительно (по умолчанию — сегодня).
+    :param filial_id: ID филиала на площадке — ряд только по нему.
+    :param profile_id: ID профиля — ряд по всем его филиалам.
+    :raises ValueError: Если период неизвестен.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Неизвестный период: {period}")
+
+    date_to = date_to or timezone.localdate()
+    date_from = date_from or date_to - DEFAULT_RANGE
+
+    queryset = platform.rollup_model.objects.filter(
+        filial__profile__user=user, day__gte=date_from, day__lte=date_to,
+    )
+    if filial_id:
+        queryset = queryset.filter(**{f'filial__{platform.filial_id_field}': filial_id})
+    if profile_id:
+        queryset = queryset.filter(filial__profile_id=profile_id)
+
+    rows = (
+        queryset.annotate(period=PERIODS[period]('day'))
+        .values('period')
+        .annotate(**{field: Sum(field) for field in COUNTER_FIELDS})
+        .order_by('period')
+    )
+    return [{"period": row["period"].isoformat(), **counters_result(row)} for row in rows]
@@ -0,0 +1,288 @@
+"""
+Общая лента отзывов по всем выбранным филиалам пользователя на обеих площадках.
+
+Каждый филиал — отдельный поток отзывов от новых к старым (микросервис площадки, offset_date).
+Первые страницы потоков запрашиваются параллельно, затем потоки сливаются по created_at через кучу
+(k-way merge). Потоку, который кончился раньше, чем набралась страница, догружается ровно столько,
+сколько ещё может понадобиться, поэтому из микросервисов забирается не больше нужного.
+
+Порядок ленты — (created_at, площадка, ID отзыва) от новых к старым, ID сравниваются как числа.
+Курсор составной: для каждого потока — дата и ID последнего отданного из него отзыва. Страницы потока
+запрашиваются включительно по дате последнего отзыва и фильтруются строго по (дата, ID), поэтому отзывы
+с одинаковой датой не теряются на границе страниц.
+
+Запросов к микросервисам одновременно не больше INBOX_CONCURRENCY. Если микросервис недоступен
+(в том числе нет свободного слота планировщика), поток читается из локального хранилища отзывов,
+а его отзывы помечаются "source": "local".
+"""
+import asyncio
+import base64
+import heapq
+import json
+import logging
+import math
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from FeedbackGenerator.utils.json_codec import response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
+from main_site.services import upstream
+from main_site.services.platforms import PLATFORMS, Platform
+from main_site.services.review_store import parse_review_date, photo_urls, query_reviews
+from main_site.services.review_sync import page_request
+
+httpx = lazy_module('httpx')
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK = 5  # Минимум отзывов в первом запросе к потоку
+MAX_CHUNK = 100  # Максимум отзывов в одном запросе к потоку
+
+
+@dataclass
+class Stream:
+    platform: Platform
+    filial: object
+    position: Optional[tuple] = None  # (created_at, review_id) последнего отданного отзыва
+    buffer: list = field(default_factory=list)  # [(created_at, review_id, отзыв)] от новых к старым
+    exhausted: bool = False
+    source: str = 'service'
+    # Следующую страницу запросить строго старше даты последнего отзыва: включительный запрос
+    # вернул только уже полученные отзывы с той же датой
+    strict: bool = False
+
+    @property
+    def key(self):
+        return f"{self.platform.code}:{self.filial.pk}"
+
+
+def review_key(created_at, review_id):
+    """
+    Ключ порядка отзывов потока: дата, затем ID. Числовые ID сравниваются как числа ('9' < '10').
+    """
+    review_id = str(review_id)
+    return created_at, ((0, int(review_id), '') if review_id.isdigit() else (1, 0, review_id))
+
+
+def encode_cursor(streams):
+    positions = {stream.key: [stream.position[0].isoformat(), stream.position[1]]
+                 for stream in streams if stream.position}
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :return: {ключ потока: (created_at, review_id)}.
+    :raises ValueError: Если курсор повреждён.
+    """
+    if not cursor:
+        return {}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return {key: (parse_review_date(created_at), str(review_id))
+                for key, (created_at, review_id) in positions.items()}
+    except (TypeError, AttributeError) as exc:
+        raise ValueError(f"Некорректный курсор: {exc}")
+
+
+def inbox_item(stream, review):
+    """
+    Отзыв ленты: поля отзыва в формате микросервисов (одинаковом для 2GIS и Flamp) плюс площадка и филиал.
+    """
+    return {
+        "platform": stream.platform.code,
+        "filial_id": getattr(stream.filial, stream.platform.filial_id_field),
+        "id": review.get("id"),
+        "rating": review.get("rating"),
+        "text": review.get("text"),
+        "created_at": review.get("created_at"),
+        "user_name": review.get("user_name"),
+        "comments_count": review.get("comments_count") or 0,
+        "likes_count": review.get("likes_count") or 0,
+        "photos": photo_urls(review.get("photos")),
+        "is_favorite": bool(review.get("is_favorite")),
+        "source": stream.source,
+    }
+
+
+def _last(stream):
+    """
+    (created_at, review_id) самого старого полученного из потока отзыва или None.
+    """
+    return stream.buffer[-1][:2] if stream.buffer else stream.position
+
+
+def _accept(stream, reviews, requested, cut=True):
+    """
+    Кладёт полученные отзывы в буфер потока: только строго старше (по дате и ID) его последнего отзыва.
+
+    Порядок отзывов с одинаковой датой у источника не задан, и граница страницы может пройти между ними,
+    поэтому (при cut) отзывы с самой старой датой полной страницы откладываются — они придут снова
+    со следующей, включительной по дате страницей.
+
+    :return: False, если целая страница не дала ни одного отзыва и её нужно запросить больше.
+    """
+    if len(reviews) < requested:
+        stream.exhausted = True
+    entries = [(parse_review_date(review["created_at"]), str(review["id"]), review)
+               for review in reviews if review.get("id") is not None and review.get("created_at")]
+    if cut and entries and not stream.exhausted:
+        oldest = min(entry[0] for entry in entries)
+        entries = [entry for entry in entries if entry[0] > oldest]
+
+    last = _last(stream)
+    last_key = review_key(*last) if last else None
+    entries = [entry for entry in entries if last_key is None or review_key(*entry[:2]) < last_key]
+    if cut and not entries and not stream.exhausted:
+        return False
+
+    stream.buffer.extend(entries)
+    stream.buffer.sort(key=lambda entry: review_key(*entry[:2]), reverse=True)
+    # Даже страница MAX_CHUNK — только уже полученные отзывы с одной датой: дальше строго старше неё
+    stream.strict = not entries and not stream.exhausted
+    return True
+
+
+async def _fetch_page(stream, limit, offset_date):
+    url, params, key = page_request(stream.platform, stream.filial, limit, offset_date)
+    response = await upstream.request('GET', url, params=params)
+    response.raise_for_status()
+    data = response_json(response)
+    if not isinstance(data, dict):
+        raise ValueError(f"Неожиданный формат ответа микросервиса {stream.platform.name}")
+    return data.get(key) or []
+
+
+async def _fetch_pages(requests):
+    """
+    Запросы страниц потоков, не больше INBOX_CONCURRENCY одновременно. Ошибка одного потока не прерывает остальные.
+    """
+    semaphore = asyncio.Semaphore(settings.INBOX_CONCURRENCY)
+
+    async def fetch(stream, limit, offset_date):
+        async with semaphore:
+            return await _fetch_page(stream, limit, offset_date)
+
+    return await asyncio.gather(*(fetch(*request) for request in requests), return_exceptions=True)
+
+
+def _offset(stream):
+    """
+    offset_date следующей страницы потока. Микросервисы и локальная БД отдают отзывы строго старше offset_date,
+    поэтому он сдвигается на микросекунду: отзывы с датой последнего полученного приходят снова и
+    отсеиваются в _accept по (дата, ID).
+    """
+    last = _last(stream)
+    if last is None:
+        return None
+    return last[0] if stream.strict else last[0] + timedelta(microseconds=1)
+
+
+def _fill(streams, limit):
+    """
+    Догружает потоки по limit отзывов; при ошибке микросервиса поток переходит на локальную БД.
+    """
+    service = [stream for stream in streams if stream.source == 'service']
+    requests = []
+    for stream in service:
+        offset = _offset(stream)
+        requests.append((stream, limit, offset.isoformat() if offset else None))
+    results = async_to_sync(_fetch_pages)(requests) if service else []
+    wider = []
+    for stream, result in zip(service, results):
+        if isinstance(result, (httpx.HTTPError, ValueError)):
+            logger.warning("Лента отзывов: микросервис недоступен, поток читается из локальной БД",
+                           extra={'stream': stream.key, 'error': repr(result)})
+            stream.source = 'local'
+        elif isinstance(result, BaseException):
+            raise result
+        elif not _accept(stream, result, limit, cut=limit < MAX_CHUNK):
+            wider.append(stream)
+
+    for stream in streams:
+        if stream.source == 'local':
+            reviews = query_reviews(stream.platform, stream.filial, limit=limit, offset_date=_offset(stream))
+            if not _accept(stream, [_local_review(review) for review in reviews], limit, cut=limit < MAX_CHUNK):
+                wider.append(stream)
+
+    # Страница целиком из отзывов с одной датой — запрашиваем больше, пока не появятся более старые
+    if wider:
+        _fill(wider, min(2 * limit, MAX_CHUNK))
+
+
+def _local_review(review):
+    return {
+        "id": int(review.review_id) if review.review_id.isdigit() else review.review_id,
+        "rating": review.rating,
+        "text": review.text,
+        "created_at": review.created_at.isoformat(),
+        "user_name": review.user_name,
+        "comments_count": review.comments_count,
+        "likes_count": review.likes_count,
+        "photos": [photo.url for photo in review.photos.all()],
+        "is_favorite": review.is_favorite,
+    }
+
+
+def inbox_streams(user, platforms=None, cursor=None):
+    """
+    Потоки по выбранным филиалам привязанных профилей пользователя.
+
+    :raises ValueError: Если курсор повреждён.
+    """
+    positions = decode_cursor(cursor)
+    streams = []
+    for code in platforms or PLATFORMS:
+        platform = PLATFORMS[code]
+        filials = platform.filial_model.objects.filter(
+            profile__user=user, profile__is_active=True, is_active=True,
+        ).order_by('pk')
+        for filial in filials:
+            stream = Stream(platform=platform, filial=filial)
+            stream.position = positions.get(stream.key)
+            streams.append(stream)
+    return streams
+
+
+def inbox_page(streams, limit):
+    """
+    Страница ленты: limit самых новых отзывов из всех потоков (после позиций курсора).
+
+    :return: (отзывы ленты, курсор следующей страницы или None, ключи потоков, прочитанных из локальной БД).
+    """
+    if not streams:
+        return [], None, []
+
+    # Страницу может целиком дать один поток, но обычно отзывы распределены между ними
+    _fill(streams, min(limit, max(MIN_CHUNK, math.ceil(2 * limit / len(streams)))))
+
+    heap = []
+
+    def push(index):
+        stream = streams[index]
+        while not stream.buffer and not stream.exhausted:
+            _fill([stream], max(MIN_CHUNK, limit - len(items)))
+        if stream.buffer:
+            created_at = stream.buffer[0][0]
+            # Новые раньше; при равных датах — стабильный порядок по площадке и филиалу (внутри потока — по ID)
+            heapq.heappush(heap, (-created_at.timestamp(), stream.platform.code, stream.filial.pk, index))
+
+    items = []
+    for index in range(len(streams)):
+        push(index)
+    while heap and len(items) < limit:
+        *_, index = heapq.heappop(heap)
+        stream = streams[index]
+        created_at, review_id, review = stream.buffer.pop(0)
+        stream.position = (created_at, review_id)
+        items.append(inbox_item(stream, review))
+        if len(items) < limit:
+            push(index)
+
+    has_more = any(stream.buffer or not stream.exhausted for stream in streams)
+    next_cursor = encode_cursor(streams) if items and has_more else None
+    return items, next_cursor, [stream.key for stream in streams if stream.source == 'local']
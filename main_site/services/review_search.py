@@ -0,0 +1,127 @@
+"""
+Полнотекстовый поиск по тексту отзывов и ответов на них (поле search_document).
+
+- PostgreSQL: to_tsvector('russian') со стеммингом и GIN-индексом, ранжирование ts_rank, подсветка ts_headline.
+- SQLite: FTS5-таблица {таблица отзывов}_fts, ранжирование bm25, подсветка snippet. Русского стемминга в FTS5 нет,
+  поэтому каждое слово ищется по префиксу ("официант" найдёт "официанта", "официантом").
+- Остальные СУБД: icontains без индекса и ранжирования.
+
+Индексы и триггеры создаются миграцией 0015_review_search.
+
+Текст отзывов пишут посетители площадок, поэтому фрагмент с подсветкой экранируется как HTML: СУБД отмечает
+совпадения символами из области частного использования Unicode, а <mark> подставляется после экранирования.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from main_site.services.platforms import Platform, user_filials
+
+# Маркеры совпадений в выдаче СУБД (не встречаются в обычном тексте и не меняются при экранировании)
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+SNIPPET_TOKENS = 32  # Слов во фрагменте с подсветкой (SQLite)
+
+
+def fts5_query(query):
+    """
+    Запрос пользователя в синтаксис FTS5: все слова обязательны, каждое — по префиксу.
+    Слова берутся в кавычки, чтобы операторы FTS5 (OR, NEAR, *, ^) в запросе не интерпретировались.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def highlight_html(fragment):
+    """
+    Фрагмент с маркерами совпадений в безопасный HTML: текст экранируется, совпадения — в <mark></mark>.
+    """
+    if fragment is None:
+        return None
+    return escape(fragment).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+
+def _filtered_reviews(platform: Platform, user, filial_id=None, rating=None, without_answer=False,
+                      is_favorite=False):
+    queryset = platform.review_model.objects.filter(filial__in=user_filials(platform, user))
+    if filial_id:
+        queryset = queryset.filter(**{f'filial__{platform.filial_id_field}': filial_id})
+    if rating:
+        queryset = queryset.filter(rating=rating)
+    if without_answer:
+        queryset = queryset.filter(has_answer=False)
+    if is_favorite:
+        queryset = queryset.filter(is_favorite=True)
+    return queryset
+
+
+def _search_postgresql(queryset, query, limit):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    # Выражение совпадает с GIN-индексом из миграции, поэтому фильтр идёт по индексу
+    vector = SearchVector('search_document', config='russian')
+    search_query = SearchQuery(query, config='russian', search_type='websearch')
+    rows = (
+        queryset.annotate(document=vector)
+        .filter(document=search_query)
+        .annotate(
+            rank=SearchRank(vector, search_query),
+            highlight=SearchHeadline('search_document', search_query, config='russian',
+                                     start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP),
+        )
+        .order_by('-rank', '-created_at')
+        .select_related('filial')
+        .prefetch_related('photos')[:limit]
+    )
+    return [(review, review.rank, review.highlight) for review in rows]
+
+
+def _search_sqlite(queryset, query, limit):
+    match = fts5_query(query)
+    if not match:
+        return []
+
+    fts_table = f'{queryset.model._meta.db_table}_fts'
+    allowed_sql, allowed_params = queryset.values('pk').query.sql_with_params()
+    # bm25 тем меньше, чем лучше совпадение, наружу отдаём со знаком минус (больше — лучше)
+    sql = (
+        f"SELECT rowid, -bm25({fts_table}) AS rank, "
+        f"snippet({fts_table}, 0, %s, %s, '…', %s) "
+        f"FROM {fts_table} WHERE {fts_table} MATCH %s AND rowid IN ({allowed_sql}) "
+        f"ORDER BY bm25({fts_table}) LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [HIGHLIGHT_START, HIGHLIGHT_STOP, SNIPPET_TOKENS, match, *allowed_params, limit])
+        hits = cursor.fetchall()
+
+    reviews = queryset.model.objects.select_related('filial').prefetch_related('photos').in_bulk(
+        [pk for pk, _, _ in hits]
+    )
+    return [(reviews[pk], rank, highlight) for pk, rank, highlight in hits if pk in reviews]
+
+
+def _search_fallback(queryset, query, limit):
+    rows = (
+        queryset.filter(search_document__icontains=query)
+        .order_by('-created_at')
+        .select_related('filial')
+        .prefetch_related('photos')[:limit]
+    )
+    return [(review, 0.0, None) for review in rows]
+
+
+def search_reviews(platform: Platform, user, query, limit=20, **filters):
+    """
+    Ищет отзывы филиалов пользователя по тексту отзыва и ответов.
+
+    :param filters: filial_id, rating, without_answer, is_favorite — как в fetch_reviews.
+    :return: Список (отзыв, ранг, фрагмент с подсветкой — экранированный HTML), от лучших совпадений к худшим.
+    """
+    queryset = _filtered_reviews(platform, user, **filters)
+    if connection.vendor == 'postgresql':
+        hits = _search_postgresql(queryset, query, limit)
+    elif connection.vendor == 'sqlite':
+        hits = _search_sqlite(queryset, query, limit)
+    else:
+        hits = _search_fallback(queryset, query, limit)
+    return [(review, rank, highlight_html(highlight)) for review, rank, highlight in hits]
@@ -0,0 +1,141 @@
+"""
+Статистика оценок по локально сохранённым отзывам.
+
+Счётчики по звёздам хранятся в таблице статистики филиала (FilialStats) и пересчитываются
+одним агрегирующим запросом для филиалов, отзывы которых только что сохранились.
+Сводка по профилям и пользователю суммирует эти счётчики, не трогая таблицу отзывов.
+"""
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from FeedbackGenerator.utils.json_codec import loads
+from main_site.services.platforms import PLATFORMS, Platform
+
+# (оценка, поле счётчика) — имена полей совпадают с ответом микросервисов статистики
+STAR_FIELDS = [
+    (1, 'one_star'),
+    (2, 'two_stars'),
+    (3, 'three_stars'),
+    (4, 'four_stars'),
+    (5, 'five_stars'),
+]
+COUNTER_FIELDS = [field for _, field in STAR_FIELDS] + ['count_reviews', 'rating_sum']
+
+
+def stats_result(data, rating=None):
+    """
+    Ответ fetch_stats: кол-во и процент оценок по звёздам, средний рейтинг и кол-во отзывов.
+
+    :param data: Словарь со счётчиками one_star ... five_stars и count_reviews.
+    :param rating: Средний рейтинг; по умолчанию берётся из data["rating"].
+    """
+    count_reviews = data.get("count_reviews") or 1  # На случай деления на 0
+    result = {}
+    for _, field in STAR_FIELDS:
+        result[f"{field}_count"] = data[field]
+        result[f"{field}_percent"] = round((data[field] / count_reviews) * 100)
+    result["rating"] = data["rating"] if rating is None else rating
+    result["count_reviews"] = data["count_reviews"]
+    return result
+
+
+def collected_stats_body(content):
+    """
+    Тело ответа fetch_stats по сырому ответу микросервиса статистики (для фонового обновления last_known_good).
+
+    :return: {"status": "Данные собраны", "result": ...} или None, если статистика ещё собирается.
+    :raises ValueError: Если ответ — не JSON или в нём нет счётчиков.
+    """
+    data = loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается объект статистики")
+    if data.get("status") in ("pending", "in_progress"):
+        return None
+    try:
+        return {"status": "Данные собраны", "result": stats_result(data)}
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"Неполная статистика: {exc}") from exc
+
+
+def counters_result(counters):
+    """
+    stats_result для локальных счётчиков: средний рейтинг считается из суммы оценок.
+    """
+    count_reviews = counters["count_reviews"] or 0
+    rating = round(counters["rating_sum"] / count_reviews, 2) if count_reviews else 0
+    return stats_result(counters, rating=rating)
+
+
+def refresh_filial_stats(platform: Platform, filials):
+    """
+    Пересчитывает счётчики филиалов одним агрегирующим запросом по отзывам и сохраняет их одним upsert.
+    """
+    filial_ids = [filial.pk for filial in filials]
+    if not filial_ids:
+        return
+
+    rows = platform.review_model.objects.filter(filial_id__in=filial_ids).values('filial_id').annotate(
+        count_reviews=Count('pk'),
+        rating_sum=Sum('rating'),
+        **{field: Count('pk', filter=Q(rating=stars)) for stars, field in STAR_FIELDS},
+    )
+    counters = {row.pop('filial_id'): row for row in rows}
+
+    now = timezone.now()
+    platform.stats_model.objects.bulk_create(
+        [
+            platform.stats_model(filial_id=filial_id, updated_at=now, **counters.get(filial_id, {}))
+            for filial_id in filial_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['filial'],
+        update_fields=COUNTER_FIELDS + ['updated_at'],
+    )
+
+
+def get_filial_stats(platform: Platform, filial):
+    """
+    Счётчики филиала или None, если отзывы филиала ещё не сохранялись локально.
+    """
+    return platform.stats_model.objects.filter(filial=filial).first()
+
+
+def _sum_counters(rows):
+    total = dict.fromkeys(COUNTER_FIELDS, 0)
+    for row in rows:
+        for field in COUNTER_FIELDS:
+            total[field] += row[field] or 0
+    return total
+
+
+def user_stats(user):
+    """
+    Сводная статистика пользователя: по каждой площадке — по профилям и итог, плюс общий итог.
+    Один агрегирующий запрос на площадку.
+    """
+    platforms = {}
+    for code, platform in PLATFORMS.items():
+        rows = list(
+            platform.stats_model.objects.filter(filial__profile__user=user)
+            .values('filial__profile', 'filial__profile__username')
+            .annotate(filials_count=Count('pk'), **{field: Sum(field) for field in COUNTER_FIELDS})
+            .order_by('filial__profile')
+        )
+        platforms[code] = {
+            "profiles": [
+                {
+                    "profile_id": row['filial__profile'],
+                    "username": row['filial__profile__username'],
+                    "filials_count": row['filials_count'],
+                    "result": counters_result(row),
+                }
+                for row in rows
+            ],
+            "total": _sum_counters(rows),
+        }
+
+    total = _sum_counters(platform_stats["total"] for platform_stats in platforms.values())
+    for platform_stats in platforms.values():
+        platform_stats["total"] = counters_result(platform_stats["total"])
+
+    return {"platforms": platforms, "total": counters_result(total)}
@@ -0,0 +1,368 @@
+"""
+Локальное хранилище отзывов.
+
+Синхронизация с микросервисами складывает отзывы в БД (upsert_reviews), а fetch_reviews
+может отдавать их индексированными выборками (query_reviews) — быстро и без обращения к площадке,
+в том числе когда микросервис недоступен.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from main_site.services.platforms import DGIS, Platform, user_filials
+from main_site.services.review_analytics import refresh_daily_rollups
+from main_site.services.review_stats import refresh_filial_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Поля отзыва, которые обновляются при повторной синхронизации
+UPDATE_FIELDS = ['rating', 'text', 'user_name', 'created_at', 'comments_count', 'likes_count', 'has_answer',
+                 'is_favorite', 'synced_at', 'search_document']
+
+
+def parse_review_date(value):
+    """
+    Разбирает дату отзыва/offset_date: ISO datetime или дату (тогда начало дня).
+
+    :raises ValueError: Если значение не похоже на дату.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"Некорректная дата: {value}")
+            parsed = datetime.combine(day, time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_limit(value):
+    """
+    :raises ValueError: Если limit не целое число.
+    """
+    if not value:
+        return DEFAULT_LIMIT
+    return max(1, min(int(value), MAX_LIMIT))
+
+
+def parse_flag(value):
+    """
+    Флаг из query-параметра: только "true" (в любом регистре) — истина, "false", "0" и пустое значение — ложь.
+    """
+    return str(value).lower() == 'true' if value is not None else False
+
+
+def photo_urls(photos):
+    """
+    Фото приходят либо списком URL, либо объектами с preview_urls (как в ответе 2GIS).
+    """
+    urls = []
+    for photo in photos or []:
+        if isinstance(photo, str):
+            urls.append(photo)
+        elif isinstance(photo, dict):
+            url = (photo.get("preview_urls") or {}).get("url")
+            if url:
+                urls.append(url)
+    return urls
+
+
+def search_document(text, reply_texts=()):
+    """
+    Текст для полнотекстового поиска: отзыв и ответы на него.
+    """
+    return '\n'.join(filter(None, [text, *reply_texts]))
+
+
+def _has_answer(review, replies):
+    """
+    :return: Есть ли ответ на отзыв или None, если микросервис этого не сообщил. Кол-во комментариев
+        признаком не считается: комментарии оставляют и пользователи площадки.
+    """
+    if review.get("has_answer") is not None:
+        return bool(review["has_answer"])
+    if replies is not None:
+        return bool(replies)
+    return None
+
+
+def upsert_reviews(platform: Platform, filial, reviews, refresh_stats=True):
+    """
+    Сохраняет отзывы филиала в формате микросервиса: новые создаются, существующие обновляются.
+    Фото перезаписываются, ответы — только если микросервис их прислал.
+
+    Если отзыв встречается на странице несколько раз, сохраняется последняя версия: один INSERT ... ON CONFLICT
+    не может обновить строку дважды.
+
+    :param refresh_stats: Пересчитать счётчики филиала. Синхронизация отключает это и пересчитывает
+        их один раз в конце прохода.
+    :return: Кол-во сохранённых отзывов (без пропущенных — без ID или даты и повторов).
+    """
+    now = timezone.now()
+    objects = {}
+    unknown_answer = set()  # ID отзывов, про ответ на которые микросервис ничего не сообщил
+    photos = {}
+    replies = {}
+
+    for review in reviews:
+        review_id = review.get("id")
+        created_at = review.get("created_at")
+        if review_id is None or not created_at:
+            logger.warning("Отзыв пропущен при сохранении",
+                           extra={'platform': platform.name, 'review_id': review_id, 'filial_id': filial.pk})
+            continue
+
+        review_id = str(review_id)
+        review_replies = review.get("replies")
+        if not isinstance(review_replies, list):
+            review_replies = None
+        has_answer = _has_answer(review, review_replies)
+        unknown_answer.discard(review_id)
+        replies.pop(review_id, None)
+        if has_answer is None:
+            unknown_answer.add(review_id)
+
+        objects[review_id] = platform.review_model(
+            filial=filial,
+            review_id=review_id,
+            rating=review.get("rating") or 0,
+            text=review.get("text"),
+            user_name=review.get("user_name"),
+            created_at=parse_review_date(created_at),
+            comments_count=review.get("comments_count") or 0,
+            likes_count=review.get("likes_count") or 0,
+            has_answer=bool(has_answer),
+            is_favorite=bool(review.get("is_favorite")),
+            synced_at=now,
+            search_document=search_document(
+                review.get("text"),
+                [reply.get("text") for reply in review_replies or [] if isinstance(reply, dict)],
+            ),
+        )
+        photos[review_id] = photo_urls(review.get("photos"))
+        if review_replies is not None:
+            replies[review_id] = review_replies
+
+    if not objects:
+        return 0
+
+    objects = list(objects.values())
+    with transaction.atomic():
+        # Дни, агрегаты которых нужно пересчитать: новые даты отзывов и прежние (если дата отзыва изменилась)
+        days = {timezone.localdate(review.created_at) for review in objects}
+        days.update(
+            timezone.localdate(created_at) for created_at in
+            platform.review_model.objects.filter(filial=filial, review_id__in=photos)
+            .values_list('created_at', flat=True)
+        )
+
+        # Если про ответ ничего не известно, новый отзыв сохраняется без ответа, а у сохранённого раньше
+        # has_answer не меняется (например, после ответа через add_reply)
+        for batch, fields in (
+                ([review for review in objects if review.review_id not in unknown_answer], UPDATE_FIELDS),
+                ([review for review in objects if review.review_id in unknown_answer],
+                 [field for field in UPDATE_FIELDS if field != 'has_answer']),
+        ):
+            if batch:
+                platform.review_model.objects.bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=['filial', 'review_id'],
+                    update_fields=fields,
+                )
+        # bulk_create с update_conflicts не везде возвращает pk, поэтому берём их одним запросом
+        pks = dict(
+            platform.review_model.objects.filter(filial=filial, review_id__in=photos)
+            .values_list('review_id', 'pk')
+        )
+
+        platform.photo_model.objects.filter(review_id__in=pks.values()).delete()
+        platform.photo_model.objects.bulk_create(
+            platform.photo_model(review_id=pks[review_id], url=url)
+            for review_id, urls in photos.items() for url in urls
+        )
+
+        if replies:
+            platform.reply_model.objects.filter(review_id__in=[pks[review_id] for review_id in replies]).delete()
+            platform.reply_model.objects.bulk_create(
+                platform.reply_model(
+                    review_id=pks[review_id],
+                    reply_id=reply.get("id"),
+                    text=reply.get("text") or "",
+                    is_official=bool(reply.get("is_official")),
+                    created_at=parse_review_date(reply["created_at"]) if reply.get("created_at") else None,
+                )
+                for review_id, review_replies in replies.items() for reply in review_replies
+                if isinstance(reply, dict)
+            )
+
+        # Ответы, сохранённые раньше (микросервис их в этот раз не прислал), тоже должны искаться
+        stored_replies = defaultdict(list)
+        for review_pk, text in platform.reply_model.objects.filter(
+                review_id__in=[pk for review_id, pk in pks.items() if review_id not in replies]
+        ).values_list('review_id', 'text'):
+            stored_replies[review_pk].append(text)
+        if stored_replies:
+            with_replies = [review for review in objects if pks.get(review.review_id) in stored_replies]
+            for review in with_replies:
+                review.pk = pks[review.review_id]
+                review.search_document = search_document(review.text, stored_replies[review.pk])
+            platform.review_model.objects.bulk_update(with_replies, ['search_document'])
+
+        if refresh_stats:
+            refresh_filial_stats(platform, [filial])
+        refresh_daily_rollups(platform, filial, days)
+
+    return len(objects)
+
+
+def query_reviews(platform: Platform, filial, limit=DEFAULT_LIMIT, offset_date=None, rating=None,
+                  without_answer=False, is_favorite=False):
+    """
+    Отзывы филиала из локальной БД, от новых к старым. Каждому фильтру соответствует индекс (filial, фильтр, дата).
+
+    :param offset_date: Отдаются отзывы строго старше этой даты (пагинация как у микросервисов).
+    """
+    queryset = platform.review_model.objects.filter(filial=filial)
+    if offset_date:
+        queryset = queryset.filter(created_at__lt=offset_date)
+    if rating:
+        queryset = queryset.filter(rating=rating)
+    if without_answer:
+        queryset = queryset.filter(has_answer=False)
+    if is_favorite:
+        queryset = queryset.filter(is_favorite=True)
+
+    return list(queryset.order_by('-created_at').select_related('filial').prefetch_related('photos')[:limit])
+
+
+def get_user_filial(platform: Platform, user, filial_id):
+    """
+    Филиал площадки по его ID на площадке, если он привязан к одному из профилей пользователя.
+    """
+    return user_filials(platform, user).filter(**{platform.filial_id_field: filial_id}).first()
+
+
+def _review_id(review):
+    # ID отзывов на площадках числовые, наружу отдаём их так же, как микросервис
+    return int(review.review_id) if review.review_id.isdigit() else review.review_id
+
+
+def serialize_review(platform: Platform, review):
+    """
+    Отзыв из БД в формате ответа fetch_reviews соответствующей площадки.
+    """
+    photos = [photo.url for photo in review.photos.all()]
+    if platform is DGIS:
+        return {
+            "id": _review_id(review),
+            "rating": review.rating,
+            "text": review.text,
+            "dateCreated": review.created_at.isoformat(),
+            "name": review.user_name,
+            "commentsCount": review.comments_count,
+            "likesCount": review.likes_count,
+            "photos": photos,
+            "is_favorite": review.is_favorite,
+        }
+    return {
+        "id": _review_id(review),
+        "filial_id": review.filial.flamp_filial_id,
+        "rating": review.rating,
+        "text": review.text,
+        "created_at": review.created_at.isoformat(),
+        "user_name": review.user_name,
+        "comments_count": review.comments_count,
+        "likes_count": review.likes_count,
+        "photos": photos,
+        "is_favorite": review.is_favorite,
+    }
+
+
+def set_favorite(platform: Platform, user, review_id, is_favorite):
+    """
+    Отражает в локальной БД успешное переключение избранного на площадке.
+    """
+    return platform.review_model.objects.filter(
+        review_id=str(review_id), filial__in=user_filials(platform, user),
+    ).update(is_favorite=bool(is_favorite))
+
+
+def review_profile_id(platform: Platform, user, review_id):
+    """
+    ID профиля, к филиалу которого относится отзыв в локальной БД (None, если отзыв не сохранён).
+    """
+    return platform.review_model.objects.filter(
+        review_id=str(review_id), filial__in=user_filials(platform, user),
+    ).values_list('filial__profile_id', flat=True).first()
+
+
+def favorite_review_ids(platform: Platform, user, review_ids, is_favorite):
+    """
+    ID отзывов из списка, которые по локальной БД уже в состоянии is_favorite.
+    """
+    return set(platform.review_model.objects.filter(
+        review_id__in=[str(review_id) for review_id in review_ids],
+        filial__in=user_filials(platform, user),
+        is_favorite=bool(is_favorite),
+    ).values_list('review_id', flat=True))
+
+
+def add_reply(platform: Platform, user, review_id, text, is_official=False):
+    """
+    Отражает в локальной БД успешно отправленный ответ на отзыв.
+    """
+    reviews = list(platform.review_model.objects.filter(
+        review_id=str(review_id), filial__in=user_filials(platform, user),
+    ))
+    if not reviews:
+        return 0
+
+    with transaction.atomic():
+        platform.reply_model.objects.bulk_create(
+            platform.reply_model(review=review, text=text or "", is_official=bool(is_official),
+                                 created_at=timezone.now())
+            for review in reviews
+        )
+        platform.review_model.objects.filter(pk__in=[review.pk for review in reviews]).update(
+            has_answer=True,
+            search_document=Concat('search_document', Value('\n'), Value(text or "")),
+        )
+    return len(reviews)
+
+
+def find_local_reviews(platform: Platform, user, filial_id, params, rating=None):
+    """
+    Отзывы для fetch_reviews из локальной БД по параметрам запроса (limit, offset_date, without_answer, is_favorite).
+
+    :param rating: Рейтинг передаётся отдельно — площадки называют этот параметр по-разному.
+    :return: Список отзывов или None, если филиал не привязан к пользователю.
+    :raises ValueError: Если limit, offset_date или rating некорректны.
+    """
+    filial = get_user_filial(platform, user, filial_id)
+    if filial is None:
+        return None
+
+    offset_date = params.get('offset_date')
+    return query_reviews(
+        platform, filial,
+        limit=parse_limit(params.get('limit')),
+        offset_date=parse_review_date(offset_date) if offset_date else None,
+        rating=int(rating) if rating else None,
+        without_answer=parse_flag(params.get('without_answer')),
+        is_favorite=parse_flag(params.get('is_favorite')),
+    )
@@ -0,0 +1,248 @@
+"""
+Инкрементальная синхронизация отзывов с микросервисами 2GIS/Flamp в локальное хранилище.
+
+У каждого филиала хранится high-water mark — дата и ID самого нового сохранённого отзыва.
+Синхронизация идёт от новых отзывов к старым страницами через offset_date и останавливается,
+как только дошла до high-water mark, поэтому за один проход забираются только новые отзывы.
+История, не поместившаяся в лимит страниц прохода, догружается следующими проходами с сохранённого курсора
+(backfill_offset); history_synced_at филиала отмечает, что история загружена целиком.
+Частота синхронизации зависит от активности филиала: чем больше свежих отзывов, тем чаще.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from FeedbackGenerator.utils.json_codec import response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
+from main_site.services import upstream
+from main_site.services.platforms import DGIS, PLATFORMS, Platform
+from main_site.services.review_stats import refresh_filial_stats
+from main_site.services.review_store import parse_review_date, upsert_reviews
+
+httpx = lazy_module('httpx')
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # Отзывов на страницу (и на один batch upsert)
+MAX_PAGES = 50  # Ограничение страниц за проход: более старая история догружается следующими проходами
+SYNC_TIMEOUT = 30  # Таймаут запроса к микросервису, сек
+
+# Активность = кол-во отзывов за ACTIVITY_WINDOW; (порог, интервал) от самых активных к менее активным
+ACTIVITY_WINDOW = timedelta(days=7)
+SYNC_INTERVALS = [
+    (20, timedelta(minutes=15)),
+    (5, timedelta(hours=1)),
+    (1, timedelta(hours=6)),
+]
+DORMANT_INTERVAL = timedelta(hours=24)  # Филиал без свежих отзывов
+RETRY_INTERVAL = timedelta(minutes=10)  # Повтор после ошибки микросервиса
+BACKFILL_INTERVAL = timedelta(minutes=15)  # Максимальный интервал, пока история догружается
+
+
+@dataclass
+class SyncResult:
+    platform: str
+    filial_id: int  # pk филиала в БД
+    pages: int = 0
+    fetched: int = 0
+    saved: int = 0
+    error: Optional[str] = None
+    next_sync_at: Optional[datetime] = None
+    backfill_offset: Optional[str] = None  # Курсор догрузки истории, если она ещё не закончена
+
+
+def page_request(platform: Platform, filial, limit, offset_date):
+    """
+    URL, параметры и ключ со списком отзывов в ответе для запроса страницы отзывов филиала.
+    """
+    if platform is DGIS:
+        url = f"{settings.DGIS_SERVICE_ADDRESS}/api/get_reviews"
+        params = {"main_user_id": filial.profile_id, "filial_id": filial.dgis_filial_id, "limit": limit}
+        key = "reviews"
+    else:
+        url = f"{settings.FLAMP_SERVICE_ADDRESS}/api/reviews/{filial.flamp_filial_id}"
+        params = {"limit": limit}
+        key = "data"
+
+    if offset_date:
+        params["offset_date"] = offset_date
+    return url, params, key
+
+
+def fetch_page(client, platform: Platform, filial, limit=PAGE_SIZE, offset_date=None):
+    """
+    Запрос идёт с фоновым приоритетом (main_site.services.upstream).
+
+    :raises httpx.HTTPError: Если микросервис недоступен, ответил ошибкой или нет свободного слота.
+    :raises ValueError: Если ответ не JSON или неожиданного формата.
+    """
+    url, params, key = page_request(platform, filial, limit, offset_date)
+    with upstream.slot(upstream.BACKGROUND):
+        response = client.get(url, params=params)
+    response.raise_for_status()
+
+    data = response_json(response)
+    if not isinstance(data, dict):
+        raise ValueError(f"Неожиданный формат ответа микросервиса {platform.name}")
+    return data.get(key) or []
+
+
+def activity_interval(platform: Platform, filial, now):
+    """
+    Интервал до следующей синхронизации по числу отзывов филиала за последние ACTIVITY_WINDOW.
+    """
+    recent = platform.review_model.objects.filter(filial=filial, created_at__gte=now - ACTIVITY_WINDOW).count()
+    for threshold, interval in SYNC_INTERVALS:
+        if recent >= threshold:
+            return interval
+    return DORMANT_INTERVAL
+
+
+def _walk(client, platform: Platform, filial, result, page_size, max_pages, offset_date=None, high_water=None):
+    """
+    Листает отзывы от offset_date (None — с самых новых) к старым и сохраняет их, пока не кончится история,
+    не встретится отзыв старше high_water или не исчерпается лимит страниц прохода (result.pages).
+
+    :return: (newest, offset_date, end): самый новый сохранённый отзыв (created_at, review_id), курсор
+        для продолжения и причина остановки — 'history', 'high_water', 'stuck' (курсор не сдвигается)
+        или None (лимит страниц).
+    """
+    newest = None
+    cursor = parse_review_date(offset_date) if offset_date else None
+
+    while result.pages < max_pages:
+        page = fetch_page(client, platform, filial, page_size, offset_date)
+        result.pages += 1
+        result.fetched += len(page)
+
+        fresh = []
+        oldest = None  # (created_at, исходная строка даты) для курсора
+        reached_high_water = False
+        for review in page:
+            if not review.get("created_at"):
+                continue
+            created_at = parse_review_date(review["created_at"])
+            if oldest is None or created_at < oldest[0]:
+                oldest = (created_at, review["created_at"])
+            if high_water and created_at < high_water:
+                reached_high_water = True
+                continue
+            fresh.append(review)
+            if newest is None or created_at > newest[0]:
+                newest = (created_at, str(review.get("id")))
+
+        result.saved += upsert_reviews(platform, filial, fresh, refresh_stats=False)
+
+        if reached_high_water:
+            return newest, offset_date, 'high_water'
+        if len(page) < page_size or oldest is None:
+            return newest, offset_date, 'history'
+        # Курсор не сдвинулся — микросервис игнорирует offset_date, дальше листать бессмысленно,
+        # но и считать историю загруженной целиком нельзя
+        if cursor is not None and oldest[0] >= cursor:
+            return newest, offset_date, 'stuck'
+        cursor, offset_date = oldest
+
+    return newest, offset_date, None
+
+
+def sync_filial(platform: Platform, filial, client, page_size=PAGE_SIZE, max_pages=MAX_PAGES):
+    """
+    Забирает отзывы филиала новее high-water mark и сохраняет их постранично, а оставшиеся страницы прохода
+    тратит на догрузку старой истории с backfill_offset.
+
+    Если проход упёрся в лимит страниц, курсор самого старого места сохраняется в backfill_offset и следующие
+    проходы продолжают с него (история до high-water mark, пропущенная из-за лимита, тоже попадает в догрузку).
+    Когда догрузка дошла до конца истории, у филиала ставится history_synced_at.
+
+    Состояние сдвигается только после прохода без ошибок: если упала страница в середине,
+    следующий проход повторит её (upsert идемпотентен).
+
+    Счётчики филиала пересчитываются один раз в конце прохода — и после прохода без отзывов, чтобы у
+    синхронизированного филиала без отзывов тоже была статистика (нули, а не «нет данных»).
+    """
+    result = SyncResult(platform=platform.code, filial_id=filial.pk)
+    high_water = filial.last_review_at
+    backfill = filial.backfill_offset
+    history_complete = False
+
+    try:
+        newest, offset_date, end = _walk(client, platform, filial, result, page_size, max_pages,
+                                         high_water=high_water)
+        if end is None:
+            backfill = offset_date
+        elif end != 'high_water':
+            backfill, history_complete = None, end == 'history'
+        elif backfill:
+            _, offset_date, end = _walk(client, platform, filial, result, page_size, max_pages,
+                                        offset_date=backfill)
+            if end is None:
+                backfill = offset_date
+            else:
+                backfill, history_complete = None, end == 'history'
+    except (httpx.HTTPError, ValueError) as exc:
+        result.error = str(exc)
+
+    now = timezone.now()
+    updates = {}
+    if result.error:
+        updates['next_sync_at'] = now + RETRY_INTERVAL
+        logger.warning("Ошибка синхронизации отзывов",
+                       extra={'platform': platform.name, 'filial_id': filial.pk, 'pages': result.pages,
+                              'error': result.error})
+    else:
+        updates['last_synced_at'] = now
+        interval = activity_interval(platform, filial, now)
+        # Пока старая история не догружена, следующий проход не откладывается надолго
+        updates['next_sync_at'] = now + (min(interval, BACKFILL_INTERVAL) if backfill else interval)
+        if newest and (high_water is None or newest[0] >= high_water):
+            updates['last_review_at'], updates['last_review_id'] = newest
+        updates['backfill_offset'] = backfill
+        if history_complete:
+            updates['history_synced_at'] = now
+        elif backfill:
+            updates['history_synced_at'] = None
+        result.backfill_offset = backfill
+        logger.info("Синхронизация отзывов",
+                    extra={'platform': platform.name, 'filial_id': filial.pk, 'pages': result.pages,
+                           'fetched': result.fetched, 'saved': result.saved, 'backfill_offset': backfill})
+
+    if not result.error or result.saved:
+        refresh_filial_stats(platform, [filial])
+    platform.filial_model.objects.filter(pk=filial.pk).update(**updates)
+    result.next_sync_at = updates['next_sync_at']
+    return result
+
+
+def due_filials(platform: Platform, now=None, limit=None, force=False):
+    """
+    Выбранные пользователями филиалы привязанных профилей, у которых подошло время синхронизации.
+    Сначала ни разу не синхронизированные, затем самые просроченные.
+    """
+    queryset = platform.filial_model.objects.filter(is_active=True, profile__is_active=True)
+    if not force:
+        queryset = queryset.filter(Q(next_sync_at__isnull=True) | Q(next_sync_at__lte=now or timezone.now()))
+    queryset = queryset.order_by(F('next_sync_at').asc(nulls_first=True), 'pk')
+    return list(queryset[:limit] if limit else queryset)
+
+
+def sync_due(platforms=None, limit=None, force=False, **kwargs):
+    """
+    Синхронизирует все филиалы, которым пора. Одно HTTP-соединение на проход.
+
+    :param platforms: Коды площадок ('2gis', 'flamp'), по умолчанию все.
+    :param limit: Максимум филиалов на площадку за проход.
+    :param force: Синхронизировать все выбранные филиалы, не глядя на расписание.
+    """
+    results = []
+    with upstream.client(timeout=SYNC_TIMEOUT) as client:
+        for code in platforms or PLATFORMS:
+            platform = PLATFORMS[code]
+            for filial in due_filials(platform, limit=limit, force=force):
+                results.append(sync_filial(platform, filial, client, **kwargs))
+    return results
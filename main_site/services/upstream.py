@@ -0,0 +1,334 @@
+"""
+Общий слой запросов к микросервисам 2GIS/Flamp с приоритетами.
+
+Пользовательские чтения (fetch_reviews, fetch_stats, действия с отзывом) и тяжёлые фоновые операции
+(привязка профиля с логином на площадке, запуск сбора статистики, синхронизация, массовые действия)
+делят одно и то же число одновременных запросов к микросервисам (UPSTREAM_MAX_CONCURRENCY).
+Этот планировщик — в памяти процесса, т.е. лимит действует на каждый воркер gunicorn отдельно:
+
+- INTERACTIVE может занять любой свободный слот и обслуживается раньше ожидающих фоновых запросов;
+- BACKGROUND занимает слот, только если после него останется UPSTREAM_INTERACTIVE_RESERVED свободных
+  и нет ожидающих интерактивных запросов, т.е. использует только запас.
+
+Слоты общие для потоков процесса: вью синхронные и вызывают асинхронные запросы через async_to_sync,
+у каждого вызова свой event loop, поэтому планировщик построен на threading, а не на asyncio.
+Общий для всех воркеров предел фоновых запросов — UPSTREAM_BACKGROUND_LIMIT: при заданном REDIS_URL фоновый
+запрос, получив слот процесса, берёт ещё и аренду в Redis (сортированное множество с временем истечения,
+аренда упавшего воркера истекает через UPSTREAM_BACKGROUND_LEASE). Без Redis общего предела нет
+и фоновые запросы ограничены только слотами своего процесса. Если Redis недоступен, запрос не блокируется.
+
+Если слот не освободился за UPSTREAM_QUEUE_TIMEOUT, запрос завершается httpx.PoolTimeout —
+вызывающий код обрабатывает его как обычный таймаут микросервиса.
+
+Клиенты httpx для микросервисов создаются через client() / async_client(): их транспорт распределяет
+запросы между репликами микросервиса (main_site/services/replicas.py). request() берёт общий клиент
+своего event loop, чтобы соединения переиспользовались между запросами: под ASGI это один loop воркера,
+под WSGI — loop вызова async_to_sync (общий для запросов одного вызова, например ленты отзывов).
+Пул клиента рассчитан на UPSTREAM_MAX_CONCURRENCY соединений — больше одновременных запросов слоты не пропустят.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from FeedbackGenerator.utils.lazy_import import lazy_module
+from FeedbackGenerator.utils.redis_client import get_redis
+
+httpx = lazy_module('httpx')
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+DEFAULT_TIMEOUT = 5  # Как у httpx.AsyncClient() по умолчанию, сек
+
+BACKGROUND_KEY = 'upstream:background'
+LEASE_POLL_INTERVAL = 0.05  # Пауза между попытками взять аренду в Redis, сек
+
+# KEYS[1] — множество аренд (токен -> время истечения, мс); ARGV: токен, лимит, длительность аренды в мс.
+# Возвращает 1, если аренда взята, иначе 0.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+
+class UpstreamScheduler:
+    """
+    Слоты одновременных запросов к микросервисам с резервом для интерактивных запросов.
+    """
+
+    def __init__(self, limit, reserved):
+        self.limit = limit
+        self.reserved = min(reserved, limit - 1)
+        self.active = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.waiting_interactive = 0
+        self.condition = threading.Condition()
+
+    def _can_start(self, priority):
+        active = sum(self.active.values())
+        if priority == INTERACTIVE:
+            return active < self.limit
+        return active < self.limit - self.reserved and not self.waiting_interactive
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        :return: True, если слот получен, False — если не дождались за timeout секунд.
+        """
+        with self.condition:
+            if priority == INTERACTIVE:
+                self.waiting_interactive += 1
+            try:
+                acquired = self.condition.wait_for(lambda: self._can_start(priority), timeout)
+                if acquired:
+                    self.active[priority] += 1
+                return acquired
+            finally:
+                if priority == INTERACTIVE:
+                    self.waiting_interactive -= 1
+                    # Фоновые запросы ждали, пока очередь интерактивных не опустеет
+                    self.condition.notify_all()
+
+    def release(self, priority=INTERACTIVE):
+        with self.condition:
+            self.active[priority] -= 1
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return {**self.active, 'waiting_interactive': self.waiting_interactive}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Планировщик процесса (создаётся при первом запросе по текущим настройкам).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpstreamScheduler(settings.UPSTREAM_MAX_CONCURRENCY, settings.UPSTREAM_INTERACTIVE_RESERVED)
+        return _scheduler
+
+
+def _busy(priority):
+    return httpx.PoolTimeout(f"Нет свободных слотов для запроса к микросервису ({priority})")
+
+
+class BackgroundLeases:
+    """
+    Аренды фоновых запросов в Redis, общие для всех воркеров.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(ACQUIRE_SCRIPT)
+
+    def try_acquire(self, token):
+        lease_ms = int(settings.UPSTREAM_BACKGROUND_LEASE * 1000)
+        return bool(self.script(keys=[BACKGROUND_KEY], args=[token, settings.UPSTREAM_BACKGROUND_LIMIT, lease_ms]))
+
+    def release(self, token):
+        self.client.zrem(BACKGROUND_KEY, token)
+
+
+def _leases():
+    client = get_redis()
+    return BackgroundLeases(client) if client is not None else None
+
+
+def _try_lease(leases, token):
+    """
+    :return: True, если аренда взята или Redis недоступен (тогда действует только лимит процесса).
+    """
+    try:
+        return leases.try_acquire(token)
+    except Exception as exc:
+        logger.warning("Лимит фоновых запросов: Redis недоступен, действует только лимит процесса",
+                       extra={'error': str(exc)})
+        return True
+
+
+def _release_lease(leases, token):
+    try:
+        leases.release(token)
+    except Exception as exc:
+        # Аренда истечёт сама через UPSTREAM_BACKGROUND_LEASE
+        logger.warning("Лимит фоновых запросов: не удалось вернуть аренду", extra={'error': str(exc)})
+
+
+@contextmanager
+def _background_lease(deadline):
+    """
+    Аренда общего для воркеров слота фонового запроса (без Redis — ничего не делает).
+
+    :raises httpx.PoolTimeout: Если аренда не освободилась до deadline (time.monotonic()).
+    """
+    leases = _leases()
+    if leases is None:
+        yield
+        return
+    token = uuid.uuid4().hex
+    while not _try_lease(leases, token):
+        if time.monotonic() >= deadline:
+            raise _busy(BACKGROUND)
+        time.sleep(LEASE_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        _release_lease(leases, token)
+
+
+@asynccontextmanager
+async def _background_lease_async(deadline):
+    """
+    То же, что _background_lease, для асинхронного кода. Команды Redis синхронные (до REDIS_TIMEOUT каждая),
+    поэтому выполняются в потоке executor'а, чтобы не блокировать event loop.
+    """
+    leases = _leases()
+    if leases is None:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    token = uuid.uuid4().hex
+    while not await loop.run_in_executor(None, _try_lease, leases, token):
+        if time.monotonic() >= deadline:
+            raise _busy(BACKGROUND)
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        await loop.run_in_executor(None, _release_lease, leases, token)
+
+
+@contextmanager
+def slot(priority=INTERACTIVE):
+    """
+    Слот для синхронного запроса к микросервису.
+
+    :raises httpx.PoolTimeout: Если слот не освободился за UPSTREAM_QUEUE_TIMEOUT.
+    """
+    scheduler = get_scheduler()
+    deadline = time.monotonic() + settings.UPSTREAM_QUEUE_TIMEOUT
+    if not scheduler.acquire(priority, settings.UPSTREAM_QUEUE_TIMEOUT):
+        raise _busy(priority)
+    try:
+        if priority == BACKGROUND:
+            with _background_lease(deadline):
+                yield
+        else:
+            yield
+    finally:
+        scheduler.release(priority)
+
+
+@asynccontextmanager
+async def slot_async(priority=INTERACTIVE):
+    """
+    Слот для асинхронного запроса. Ожидание идёт в потоке executor'а, чтобы не блокировать event loop
+    (в массовых операциях в одном loop ждут несколько задач).
+
+    :raises httpx.PoolTimeout: Если слот не освободился за UPSTREAM_QUEUE_TIMEOUT.
+    """
+    scheduler = get_scheduler()
+    deadline = time.monotonic() + settings.UPSTREAM_QUEUE_TIMEOUT
+    if not scheduler.acquire(priority, timeout=0):
+        waiter = asyncio.get_running_loop().run_in_executor(
+            None, scheduler.acquire, priority, settings.UPSTREAM_QUEUE_TIMEOUT,
+        )
+        try:
+            acquired = await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # Задачу отменили, а поток всё ещё ждёт слот — если дождётся, слот надо вернуть
+            waiter.add_done_callback(lambda future: future.result() and scheduler.release(priority))
+            raise
+        if not acquired:
+            raise _busy(priority)
+    try:
+        if priority == BACKGROUND:
+            async with _background_lease_async(deadline):
+                yield
+        else:
+            yield
+    finally:
+        scheduler.release(priority)
+
+
+def client(**kwargs):
+    """
+    httpx.Client для запросов к микросервисам с балансировкой между репликами.
+    """
+    # Транспорты наследуют классы httpx, поэтому модуль реплик импортируется вместе с httpx — при первом запросе
+    from main_site.services.replicas import BalancedTransport
+
+    return httpx.Client(transport=BalancedTransport(), **kwargs)
+
+
+def async_client(**kwargs):
+    """
+    httpx.AsyncClient для запросов к микросервисам с балансировкой между репликами.
+    """
+    from main_site.services.replicas import AsyncBalancedTransport
+
+    return httpx.AsyncClient(transport=AsyncBalancedTransport(), **kwargs)
+
+
+_loop_clients = weakref.WeakKeyDictionary()  # event loop -> (клиент, генератор, закрывающий его)
+
+
+async def _client_lifetime(http):
+    """
+    Закрывает клиент вместе с loop: asyncio.run() перед остановкой завершает асинхронные генераторы
+    (loop.shutdown_asyncgens), и соединения закрываются в том loop, в котором открыты.
+    """
+    try:
+        yield
+    finally:
+        await http.aclose()
+
+
+async def loop_client():
+    """
+    Общий httpx.AsyncClient текущего event loop (клиент привязан к loop, поэтому у каждого loop свой).
+    """
+    loop = asyncio.get_running_loop()
+    entry = _loop_clients.get(loop)
+    if entry is None:
+        from main_site.services.replicas import AsyncBalancedTransport
+
+        limits = httpx.Limits(max_connections=settings.UPSTREAM_MAX_CONCURRENCY,
+                              max_keepalive_connections=settings.UPSTREAM_MAX_CONCURRENCY)
+        http = httpx.AsyncClient(transport=AsyncBalancedTransport(limits=limits))
+        lifetime = _client_lifetime(http)
+        await lifetime.__anext__()
+        entry = _loop_clients[loop] = (http, lifetime)
+    return entry[0]
+
+
+async def request(method, url, priority=INTERACTIVE, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    Запрос к микросервису в слоте нужного приоритета.
+
+    :param kwargs: Параметры httpx (params, json, ...).
+    :return: httpx.Response (статус не проверяется).
+    :raises httpx.RequestError: Сетевые ошибки, таймауты и httpx.PoolTimeout при отсутствии свободного слота.
+    """
+    async with slot_async(priority):
+        http = await loop_client()
+        return await http.request(method, url, timeout=timeout, **kwargs)
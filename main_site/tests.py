@@ -1,3 +1,1517 @@
-from django.test import TestCase
+import asyncio
+import concurrent.futures
+import gzip
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from FeedbackGenerator.utils import throttling
+from FeedbackGenerator.utils.compression import CompressionMiddleware, negotiate
+from FeedbackGenerator.utils.json_codec import MsgspecJSONParser, MsgspecJSONRenderer, response_json
+from FeedbackGenerator.utils.query_budget import QueryCountMiddleware
+
+from main_site.benchmarks.reviews import fast_path, make_payload, standard_path
+from main_site.benchmarks.runner import DEFAULT_SCENARIOS, DjangoClientTransport, discover_ids, percentile, \
+    run_scenario
+from main_site.benchmarks.stub_service import NEWEST_REVIEW_AT, STATS, StubConfig, StubService, build_reviews
+from main_site.management.commands.bench_endpoints import Command
+from main_site.models import AuditRecord, DgisProfile, DgisFilial, DgisFilialStats, DgisReview, DgisDailyRollup, \
+    FlampProfile, FlampFilial
+from main_site.services import audit, last_known_good, photo_proxy, rate_limit, replicas, review_inbox, review_sync, \
+    upstream
+from main_site.services.filial_selection import link_filials
+from main_site.services.platforms import DGIS, FLAMP
+from main_site.services.review_stats import collected_stats_body, stats_result
+from main_site.services.review_store import add_reply, upsert_reviews
+from main_site.services.review_sync import DORMANT_INTERVAL, RETRY_INTERVAL, due_filials, sync_due
+
+# Скрипт холодного старта воркера: django.setup() + загрузка URLConf (как при первом запросе)
+STARTUP_SCRIPT = """
+import json, os, sys, time
+
+import dotenv
+
+calls = []
+_load_dotenv = dotenv.load_dotenv
+
+
+def counting_load_dotenv(*args, **kwargs):
+    calls.append(1)
+    return _load_dotenv(*args, **kwargs)
+
+
+dotenv.load_dotenv = counting_load_dotenv
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FeedbackGenerator.settings')
+
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+
+print(json.dumps({
+    'elapsed': elapsed,
+    'load_dotenv_calls': len(calls),
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+class StartupTests(SimpleTestCase):
+    """
+    Защита от регрессий холодного старта воркера gunicorn/daphne.
+    """
+    # Бюджет на django.setup() + загрузку URLConf, секунды
+    STARTUP_BUDGET_SECONDS = 3.0
+    # Тяжёлые модули, которые должны импортироваться только при реальном использовании
+    LAZY_MODULES = ('httpx', 'httpcore', 'cryptography', 'drf_spectacular.views', 'main_site.services.replicas')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        cls.startup = json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_cold_start_within_budget(self):
+        self.assertLess(self.startup['elapsed'], self.STARTUP_BUDGET_SECONDS)
+
+    def test_dotenv_loaded_once(self):
+        self.assertEqual(self.startup['load_dotenv_calls'], 1)
+
+    def test_heavy_modules_are_lazy(self):
+        for module in self.LAZY_MODULES:
+            self.assertNotIn(module, self.startup['modules'])
+
+
+class BenchmarkHarnessTests(TestCase):
+    """
+    Дымовой прогон нагрузочного стенда: каждый сценарий отрабатывает против заглушки без ошибок.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=3)
+
+    def test_scenarios_run_against_stub(self):
+        with StubService(StubConfig(latency_ms=0, reviews=5)) as stub, \
+                override_settings(DGIS_SERVICE_ADDRESS=stub.url, FLAMP_SERVICE_ADDRESS=stub.url):
+            transport = DjangoClientTransport(self.user)
+            ids = discover_ids(transport)
+            for scenario in DEFAULT_SCENARIOS:
+                with self.subTest(scenario=scenario.name):
+                    report = run_scenario(transport, scenario, ids, requests=2, concurrency=1)
+                    self.assertEqual(report.errors, 0)
+                    self.assertEqual(len(report.queries), 2)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class ReviewsFastPathTests(SimpleTestCase):
+    """
+    Быстрый путь отзывов 2GIS обязан отдавать тот же JSON, что и стандартный.
+    """
+
+    def test_matches_standard_path(self):
+        content = make_payload(reviews=50)
+        self.assertEqual(json.loads(fast_path(content)), json.loads(standard_path(content)))
+
+    def test_photo_variants(self):
+        content = json.dumps({"reviews": [
+            {"id": 1, "photos": ["https://a/1.jpg", "https://a/2.jpg"]},
+            {"id": 2, "photos": [{"preview_urls": {"url": "https://a/3.jpg"}}, "https://a/4.jpg"]},
+            {"id": 3, "photos": [{"preview_urls": None}]},
+            {"id": 4, "text": None},
+        ]}).encode()
+        self.assertEqual(json.loads(fast_path(content)), json.loads(standard_path(content)))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Бюджеты SQL-запросов для горячих списковых эндпоинтов.
+    Кол-во запросов не должно зависеть от числа профилей и филиалов (нет N+1).
+    """
+    # Общие для всех запросов: сессия, пользователь, SAVEPOINT + UPDATE сессии + RELEASE
+    # (SESSION_SAVE_EVERY_REQUEST) — 5 запросов, остальное приходится на сам эндпоинт
+    BUDGETS = {
+        '/api/internal/2gis_profiles/': 6,
+        '/api/internal/2gis_filials/{dgis_profile_id}/': 7,
+        '/api/internal/flamp_profiles/': 6,
+        '/api/internal/flamp_filials/{flamp_profile_id}/': 7,
+        '/api/internal/stats/': 7,
+        '/api/internal/analytics/?platform=2gis&period=month': 6,
+        '/api/internal/bootstrap/': 11,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=3)
+        cls.ids = {
+            'dgis_profile_id': DgisProfile.objects.get(user=cls.user).id,
+            'flamp_profile_id': FlampProfile.objects.get(user=cls.user).id,
+        }
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assert_budgets(self):
+        # Журнал изменений от создания тестовых данных пишется до замера, а не в первом запросе
+        audit.flush()
+        for path, budget in self.BUDGETS.items():
+            with self.subTest(path=path), self.assertNumQueries(budget):
+                response = self.client.get(path.format(**self.ids))
+                self.assertEqual(response.status_code, 200)
+
+    def test_budgets(self):
+        self.assert_budgets()
+
+    def test_budgets_do_not_grow_with_rows(self):
+        dgis_profile = DgisProfile.objects.get(id=self.ids['dgis_profile_id'])
+        flamp_profile = FlampProfile.objects.get(id=self.ids['flamp_profile_id'])
+        for i in range(3):
+            DgisProfile.objects.create(user=self.user, username=f'extra_2gis_{i}', hashed_password='-')
+            FlampProfile.objects.create(user=self.user, username=f'extra_flamp_{i}', hashed_password='-')
+        DgisFilial.objects.bulk_create(
+            DgisFilial(profile=dgis_profile, dgis_filial_id=str(i), name=str(i)) for i in range(100)
+        )
+        FlampFilial.objects.bulk_create(
+            FlampFilial(profile=flamp_profile, flamp_filial_id=str(i), name=str(i)) for i in range(100)
+        )
+        self.assert_budgets()
+
+    def test_middleware_warns_on_repeated_queries(self):
+        def n_plus_one_view(request):
+            for profile_id in range(QueryCountMiddleware(None).repeat_threshold):
+                DgisProfile.objects.filter(id=profile_id).first()
+            return HttpResponse()
+
+        middleware = QueryCountMiddleware(n_plus_one_view)
+        with self.assertLogs('FeedbackGenerator.utils.query_budget', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('N+1', logs.output[0])
+
+
+class ReviewStoreTests(TestCase):
+    """
+    Локальное хранилище отзывов: идемпотентный upsert и fetch_reviews из БД.
+    """
+    # Порт discard: соединение гарантированно отклоняется — микросервис "лежит"
+    DOWN_SERVICE = 'http://127.0.0.1:9'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=2)
+        cls.filial = DgisFilial.objects.get(profile__user=cls.user, dgis_filial_id='70000001')
+        cls.flamp_filial = FlampFilial.objects.get(profile__user=cls.user, flamp_filial_id='80000001')
+        cls.reviews = build_reviews(StubConfig(reviews=10), filial_id='70000001')
+        upsert_reviews(DGIS, cls.filial, cls.reviews)
+        upsert_reviews(FLAMP, cls.flamp_filial, cls.reviews)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_local(self, **params):
+        params = {'main_user_id': 1, 'filial_id': '70000001', 'source': 'local', **params}
+        return self.client.get('/api/external/api_2gis_profiles/reviews/', params)
+
+    def test_upsert_is_idempotent(self):
+        changed = dict(self.reviews[0], rating=1, photos=[])
+        upsert_reviews(DGIS, self.filial, [changed] + self.reviews[1:])
+
+        self.assertEqual(DgisReview.objects.filter(filial=self.filial).count(), 10)
+        review = DgisReview.objects.get(filial=self.filial, review_id=str(changed['id']))
+        self.assertEqual(review.rating, 1)
+        self.assertFalse(review.photos.exists())
+
+    def test_upsert_keeps_last_duplicate(self):
+        review = dict(self.reviews[0], rating=2)
+        saved = upsert_reviews(DGIS, self.filial, [self.reviews[0], review])
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(DgisReview.objects.get(filial=self.filial, review_id=str(review['id'])).rating, 2)
+
+    def test_upstream_flags_are_parsed_like_local(self):
+        from main_site.views.DGis.dgis_api.dgis_api_profiles import APIDGISProfiles
+
+        get = mock.AsyncMock(return_value=Response({'error': 'Нет данных'}, status=400))
+        with mock.patch.object(APIDGISProfiles, '_async_get', get):
+            self.client.get('/api/external/api_2gis_profiles/reviews/',
+                            {'main_user_id': 1, 'filial_id': '70000001', 'without_answer': 'false',
+                             'is_favorite': 'true'})
+        params = get.call_args.args[1]
+        self.assertNotIn('without_answer', params)
+        self.assertTrue(params['is_favorite'])
+
+    def test_local_matches_upstream_format(self):
+        with StubService(StubConfig(latency_ms=0, reviews=10)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            upstream = self.client.get('/api/external/api_2gis_profiles/reviews/',
+                                       {'main_user_id': 1, 'filial_id': '70000001', 'limit': 10}).json()
+        local = self.get_local(limit=10)
+
+        self.assertEqual(local['X-Reviews-Source'], 'local')
+        self.assertEqual(
+            [(review['id'], review['rating'], review['photos']) for review in local.json()['reviews']],
+            [(review['id'], review['rating'], review['photos']) for review in upstream['reviews']],
+        )
+
+    def test_local_filters(self):
+        reviews = self.get_local(rating=5).json()['reviews']
+        self.assertTrue(reviews)
+        self.assertTrue(all(review['rating'] == 5 for review in reviews))
+
+        reviews = self.get_local(is_favorite=True).json()['reviews']
+        self.assertTrue(reviews)
+        self.assertTrue(all(review['is_favorite'] for review in reviews))
+
+        # Комментарии пользователей не делают отзыв отвеченным; "false" фильтр не включает
+        reviews = self.get_local(without_answer=True, limit=100).json()['reviews']
+        self.assertEqual(len(reviews), 10)
+        self.assertTrue(any(review['commentsCount'] for review in reviews))
+        self.assertEqual(len(self.get_local(is_favorite='false', limit=100).json()['reviews']), 10)
+
+        # Ответ, сохранённый через add_reply, не сбрасывается синхронизацией без данных об ответах
+        DgisReview.objects.filter(filial=self.filial, review_id=str(self.reviews[0]['id'])).update(has_answer=True)
+        upsert_reviews(DGIS, self.filial, self.reviews)
+        self.assertEqual(len(self.get_local(without_answer=True, limit=100).json()['reviews']), 9)
+
+        first_page = self.get_local(limit=4).json()['reviews']
+        second_page = self.get_local(limit=4, offset_date=first_page[-1]['dateCreated']).json()['reviews']
+        self.assertEqual(len(second_page), 4)
+        self.assertLess(second_page[0]['dateCreated'], first_page[-1]['dateCreated'])
+
+    def test_local_rejects_foreign_filial_and_bad_params(self):
+        self.assertEqual(self.get_local(filial_id='123').status_code, 404)
+        self.assertEqual(self.get_local(offset_date='вчера').status_code, 400)
+
+    @override_settings(DGIS_SERVICE_ADDRESS=DOWN_SERVICE, FLAMP_SERVICE_ADDRESS=DOWN_SERVICE)
+    def test_fallback_when_upstream_is_down(self):
+        response = self.client.get('/api/external/api_2gis_profiles/reviews/',
+                                   {'main_user_id': 1, 'filial_id': '70000001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Reviews-Source'], 'local')
+        self.assertEqual(response.json()['count'], 10)
+
+        response = self.client.get('/api/external/api_flamp_profiles/reviews/', {'filial_id': '80000001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result']['reviews_count'], 10)
+
+        # Отзывов по филиалу нет — отдаётся исходная ошибка микросервиса
+        response = self.client.get('/api/external/api_2gis_profiles/reviews/',
+                                   {'main_user_id': 1, 'filial_id': '70000002'})
+        self.assertEqual(response.status_code, 500)
+
+    def test_toggles_update_local_store(self):
+        review_id = self.reviews[1]['id']
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            self.client.post(f'/api/external/api_2gis_reviews/toggle_favorite/{review_id}/')
+            self.client.post(f'/api/external/api_2gis_reviews/toggle_reply/{review_id}/',
+                             {'main_user_id': 1, 'text': 'Спасибо!'}, content_type='application/json')
+
+        review = DgisReview.objects.get(filial=self.filial, review_id=str(review_id))
+        self.assertTrue(review.is_favorite)
+        self.assertTrue(review.has_answer)
+        self.assertEqual(review.replies.get().text, 'Спасибо!')
+
+
+class ReviewSyncTests(TestCase):
+    """
+    Инкрементальная синхронизация: первичная загрузка, дозагрузка только новых отзывов и расписание.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+        DgisFilial.objects.update(is_active=True)
+        cls.filial = DgisFilial.objects.get()
+
+    def sync(self, history=250, **kwargs):
+        with StubService(StubConfig(latency_ms=0, reviews=100, photos=0, history=history)) as stub, \
+                override_settings(DGIS_SERVICE_ADDRESS=stub.url, FLAMP_SERVICE_ADDRESS=stub.url):
+            return sync_due(['2gis'], **kwargs)
+
+    def test_initial_then_incremental(self):
+        [result] = self.sync()
+        self.assertEqual((result.pages, result.saved, result.error), (3, 250, None))
+        self.filial.refresh_from_db()
+        self.assertEqual(self.filial.last_review_at, NEWEST_REVIEW_AT)
+        self.assertEqual(self.filial.last_review_id, '1000000')
+
+        # Ничего нового: одна страница, сохраняется только сам high-water mark
+        [result] = self.sync(force=True)
+        self.assertEqual((result.pages, result.saved), (1, 1))
+
+        # High-water mark отстал на 150 отзывов: дозагружаются только они
+        DgisFilial.objects.update(last_review_at=NEWEST_REVIEW_AT - timedelta(hours=150))
+        [result] = self.sync(force=True)
+        self.assertEqual((result.pages, result.saved), (2, 151))
+        self.assertEqual(DgisReview.objects.count(), 250)
+
+    def test_backfill_continues_past_page_limit(self):
+        [result] = self.sync(max_pages=2)
+        self.filial.refresh_from_db()
+        self.assertEqual((result.pages, result.saved), (2, 200))
+        self.assertIsNotNone(self.filial.backfill_offset)
+        self.assertIsNone(self.filial.history_synced_at)
+        self.assertEqual(self.filial.last_review_at, NEWEST_REVIEW_AT)
+
+        # Новых отзывов нет: одна страница сверху, остаток лимита — догрузка с сохранённого курсора
+        [result] = self.sync(max_pages=2, force=True)
+        self.filial.refresh_from_db()
+        self.assertEqual(result.pages, 2)
+        self.assertEqual(DgisReview.objects.count(), 250)
+        self.assertIsNone(self.filial.backfill_offset)
+        self.assertIsNotNone(self.filial.history_synced_at)
+
+    def test_schedule(self):
+        self.assertEqual(due_filials(DGIS), [self.filial])
+        [result] = self.sync()
+        # Отзывы заглушки старше окна активности — филиал спящий
+        self.assertAlmostEqual(result.next_sync_at, timezone.now() + DORMANT_INTERVAL, delta=timedelta(minutes=1))
+        self.assertEqual(due_filials(DGIS), [])
+        self.assertEqual(due_filials(DGIS, now=result.next_sync_at), [self.filial])
+
+    def test_stats_refreshed_once_per_sync(self):
+        with mock.patch('main_site.services.review_sync.refresh_filial_stats',
+                        wraps=review_sync.refresh_filial_stats) as refresh:
+            self.sync()
+        refresh.assert_called_once()
+        self.assertEqual(DgisFilialStats.objects.get(filial=self.filial).count_reviews, 250)
+
+        # Филиал без отзывов после синхронизации получает нулевую статистику
+        DgisReview.objects.all().delete()
+        DgisFilialStats.objects.all().delete()
+        self.sync(history=0, force=True)
+        self.assertEqual(DgisFilialStats.objects.get(filial=self.filial).count_reviews, 0)
+
+    @override_settings(DGIS_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE)
+    def test_error_keeps_high_water_mark(self):
+        [result] = sync_due(['2gis'])
+        self.assertIsNotNone(result.error)
+        self.filial.refresh_from_db()
+        self.assertIsNone(self.filial.last_review_at)
+        self.assertIsNone(self.filial.last_synced_at)
+        self.assertAlmostEqual(self.filial.next_sync_at, timezone.now() + RETRY_INTERVAL, delta=timedelta(minutes=1))
+
+
+class ReviewStatsTests(TestCase):
+    """
+    Статистика по локально сохранённым отзывам и сводка по профилям/пользователю.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=2)
+        # Оценки заглушки идут по кругу 1..5: по 2 отзыва на каждую звезду
+        for filial in DgisFilial.objects.all():
+            upsert_reviews(DGIS, filial, build_reviews(StubConfig(reviews=10)))
+        upsert_reviews(FLAMP, FlampFilial.objects.first(), build_reviews(StubConfig(reviews=5)))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_stats_result(self):
+        result = stats_result(STATS)
+        self.assertEqual(result['one_star_count'], 10)
+        self.assertEqual(result['four_stars_percent'], 30)
+        self.assertEqual((result['rating'], result['count_reviews']), (3.85, 100))
+
+    def test_fetch_stats_is_local(self):
+        # История не загружена целиком: по умолчанию — микросервис, локально — только по запросу и с пометкой
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            response = self.client.get('/api/external/api_2gis_profiles/stats/', {'filial_id': '70000001'})
+        self.assertNotIn('X-Stats-Source', response)
+        response = self.client.get('/api/external/api_2gis_profiles/stats/', {'filial_id': '70000001', 'source': 'local'})
+        self.assertEqual((response['X-Stats-Source'], response.json()['partial']), ('local', True))
+
+        DgisFilial.objects.filter(dgis_filial_id='70000001').update(history_synced_at=timezone.now())
+        response = self.client.get('/api/external/api_2gis_profiles/stats/', {'filial_id': '70000001'})
+        self.assertEqual(response['X-Stats-Source'], 'local')
+        self.assertNotIn('partial', response.json())
+        result = response.json()['result']
+        self.assertEqual([result[f'{field}_percent'] for field in ('one_star', 'three_stars', 'five_stars')],
+                         [20, 20, 20])
+        self.assertEqual((result['rating'], result['count_reviews']), (3.0, 10))
+
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            response = self.client.get('/api/external/api_2gis_profiles/stats/',
+                                       {'filial_id': '70000001', 'source': 'service'})
+        self.assertNotIn('X-Stats-Source', response)
+        self.assertEqual(response.json()['result']['count_reviews'], STATS['count_reviews'])
+
+    def test_stats_refresh_on_upsert(self):
+        filial = DgisFilial.objects.get(dgis_filial_id='70000001')
+        upsert_reviews(DGIS, filial, [dict(build_reviews(StubConfig(reviews=1))[0], id=1, rating=5)])
+        self.assertEqual((filial.stats.five_stars, filial.stats.count_reviews), (3, 11))
+
+    def test_user_rollup(self):
+        stats = self.client.get('/api/internal/stats/').json()
+        self.assertEqual(stats['total']['count_reviews'], 25)
+        self.assertEqual(stats['platforms']['2gis']['total']['count_reviews'], 20)
+        [profile] = stats['platforms']['2gis']['profiles']
+        self.assertEqual((profile['filials_count'], profile['result']['one_star_count']), (2, 4))
+        self.assertEqual(stats['platforms']['flamp']['total']['rating'], 3.0)
+
+
+class AnalyticsTests(TestCase):
+    """
+    Дневные агрегаты и ряды по неделям/месяцам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+        cls.filial = DgisFilial.objects.get()
+        # 100 отзывов с шагом в час назад от 2025-01-01 00:00: 1 отзыв 1 января, 99 — с 27 по 31 декабря
+        cls.reviews = build_reviews(StubConfig(reviews=100))
+        upsert_reviews(DGIS, cls.filial, cls.reviews)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def series(self, **params):
+        params = {'platform': '2gis', 'date_from': '2024-12-01', 'date_to': '2025-01-31', **params}
+        return self.client.get('/api/internal/analytics/', params)
+
+    def test_daily_rollups(self):
+        self.assertEqual(DgisDailyRollup.objects.count(), 6)
+        self.assertEqual(sum(DgisDailyRollup.objects.values_list('count_reviews', flat=True)), 100)
+
+    def test_series(self):
+        weeks = self.series(period='week').json()['series']
+        self.assertEqual([(week['period'], week['count_reviews']) for week in weeks],
+                         [('2024-12-23', 51), ('2024-12-30', 49)])
+
+        months = self.series(period='month', filial_id='70000001').json()['series']
+        self.assertEqual([month['count_reviews'] for month in months], [99, 1])
+        self.assertEqual(months[1]['rating'], 1.0)
+
+        self.assertEqual(self.series(filial_id='1').json()['series'], [])
+        self.assertEqual(self.series(period='year').status_code, 400)
+        self.assertEqual(self.series(date_to='31.01.2025').status_code, 400)
+
+    def test_moved_review_clears_old_day(self):
+        moved = dict(self.reviews[0], created_at='2024-12-31T12:30:00+00:00')
+        upsert_reviews(DGIS, self.filial, [moved])
+        self.assertFalse(DgisDailyRollup.objects.filter(day='2025-01-01').exists())
+        self.assertEqual(DgisDailyRollup.objects.get(day='2024-12-31').count_reviews, 25)
+
+
+class ReviewSearchTests(TestCase):
+    """
+    Полнотекстовый поиск по тексту отзывов и ответов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+        cls.filial = DgisFilial.objects.get()
+        cls.reviews = [
+            {"id": 1, "rating": 5, "created_at": "2025-01-03T10:00:00+00:00", "text": "Официант Иван был очень вежлив"},
+            {"id": 2, "rating": 2, "created_at": "2025-01-02T10:00:00+00:00",
+             "text": "Долго ждали заказ, официанта не дозваться"},
+            {"id": 3, "rating": 4, "created_at": "2025-01-01T10:00:00+00:00", "text": "Всё отлично",
+             "replies": [{"text": "Спасибо, передадим Ивану", "is_official": True}]},
+        ]
+        upsert_reviews(DGIS, cls.filial, cls.reviews)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, q, **params):
+        response = self.client.get('/api/internal/reviews/search/', {'platform': '2gis', 'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['reviews']
+
+    def test_ranked_results_with_highlight(self):
+        reviews = self.search('официант')
+        self.assertEqual(sorted(review['id'] for review in reviews), [1, 2])
+        self.assertIn('<mark>', reviews[0]['highlight'])
+        self.assertEqual(reviews[0]['filial_id'], '70000001')
+
+    def test_reply_text_and_filters(self):
+        self.assertEqual(sorted(review['id'] for review in self.search('иван')), [1, 3])
+        self.assertEqual([review['id'] for review in self.search('официант', rating=2)], [2])
+        self.assertEqual(self.search('официант', filial_id='other'), [])
+
+    def test_replies_stay_searchable(self):
+        # Повторная синхронизация без ответов не должна терять их текст
+        upsert_reviews(DGIS, self.filial, [dict(self.reviews[2], replies=None)])
+        self.assertEqual([review['id'] for review in self.search('передадим')], [3])
+
+        add_reply(DGIS, self.user, 2, 'Дарим промокод на следующий заказ')
+        self.assertEqual([review['id'] for review in self.search('промокод')], [2])
+
+    def test_highlight_escapes_review_html(self):
+        upsert_reviews(DGIS, self.filial, [{"id": 4, "rating": 1, "created_at": "2025-01-04T10:00:00+00:00",
+                                            "text": 'Кальян <img src=x onerror="alert(1)"> <script>x</script>'}])
+        [review] = self.search('кальян')
+        self.assertEqual(review['highlight'],
+                         '<mark>Кальян</mark> &lt;img src=x onerror=&quot;alert(1)&quot;&gt; &lt;script&gt;x&lt;/script&gt;')
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('OR "официант* NEAR'), [])
+        response = self.client.get('/api/internal/reviews/search/', {'platform': '2gis', 'q': 'а'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ACCOUNT_RATE_LIMIT_PER_SECOND=1000, ACCOUNT_RATE_LIMIT_BURST=1000, BULK_CONCURRENCY=4)
+class BulkReplyTests(TestCase):
+    """
+    Массовые ответы: параллельная отправка, потоковый результат по каждому отзыву, частичные ошибки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+        cls.profile = DgisProfile.objects.get(user=cls.user)
+        upsert_reviews(DGIS, DgisFilial.objects.get(), build_reviews(StubConfig(reviews=10)))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def bulk_reply(self, replies, main_user_id=None):
+        return self.client.post('/api/external/api_2gis_reviews/bulk_reply/',
+                                {'main_user_id': main_user_id or self.profile.id, 'replies': replies},
+                                content_type='application/json')
+
+    def test_streams_result_per_review(self):
+        replies = [{'review_id': 1_000_000 + i, 'text': f'Спасибо {i}'} for i in range(10)]
+        # Stub-маршрут ответа принимает только числовые ID — этот отзыв вернёт ошибку
+        replies.append({'review_id': 'bad', 'text': 'Спасибо'})
+        with StubService(StubConfig(latency_ms=20)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            response = self.bulk_reply(replies)
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lines[-1], {'summary': {'total': 11, 'ok': 10, 'failed': 1}})
+        [failed] = [line for line in lines[:-1] if line['status'] == 'error']
+        self.assertEqual((failed['review_id'], failed['status_code']), ('bad', 404))
+        self.assertEqual(DgisReview.objects.filter(has_answer=True, replies__text__startswith='Спасибо').count(), 10)
+
+    def test_validation(self):
+        self.assertEqual(self.bulk_reply([]).status_code, 400)
+        self.assertEqual(self.bulk_reply([{'review_id': 1}]).status_code, 400)
+        self.assertEqual(self.bulk_reply([{'review_id': 1, 'text': 'a'}], main_user_id=999).status_code, 404)
+        self.assertEqual(self.bulk_reply([{'review_id': 1, 'text': 'a'}, {'review_id': '1', 'text': 'b'}]).status_code,
+                         400)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        replies = [{'review_id': 1_000_000 + i, 'text': f'Спасибо {i}'} for i in range(3)]
+        await self.async_client.aforce_login(self.user)
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            response = await self.async_client.post('/api/external/api_2gis_reviews/bulk_reply/',
+                                                    {'main_user_id': self.profile.id, 'replies': replies},
+                                                    content_type='application/json')
+            self.assertTrue(response.is_async)
+            lines = [json.loads(chunk) async for chunk in response.streaming_content]
+
+        self.assertEqual(lines[-1], {'summary': {'total': 3, 'ok': 3, 'failed': 0}})
+
+    @override_settings(ACCOUNT_RATE_LIMIT_PER_SECOND=1, ACCOUNT_RATE_LIMIT_BURST=1, BULK_ACCOUNT_MAX_WAIT=0.5,
+                       REDIS_URL=None)
+    def test_account_wait_is_bounded(self):
+        replies = [{'review_id': 1_000_000 + i, 'text': f'Спасибо {i}'} for i in range(3)]
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            lines = [json.loads(line) for line in b''.join(self.bulk_reply(replies).streaming_content).splitlines()]
+
+        self.assertEqual(lines[-1]['summary']['ok'], 1)
+        limited = [line for line in lines[:-1] if line['status'] == 'error']
+        self.assertEqual(len(limited), 2)
+        self.assertTrue(all(line['retry_after'] >= 1 for line in limited))
+
+
+@override_settings(ACCOUNT_RATE_LIMIT_PER_SECOND=1000, ACCOUNT_RATE_LIMIT_BURST=1000)
+class BulkFavoriteComplaintTests(TestCase):
+    """
+    Массовое избранное и жалобы: пачками, если микросервис умеет, иначе по одному; пропуск уже выполненного.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+        cls.profile = DgisProfile.objects.get(user=cls.user)
+        # В заглушке в избранном каждый 4-й отзыв: 1_000_000, 1_000_004, 1_000_008
+        upsert_reviews(DGIS, DgisFilial.objects.get(), build_reviews(StubConfig(reviews=10)))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def bulk(self, action, body, **settings):
+        with StubService(StubConfig(latency_ms=0)) as stub, override_settings(DGIS_SERVICE_ADDRESS=stub.url, **settings):
+            response = self.client.post(f'/api/external/api_2gis_reviews/{action}/',
+                                        {'main_user_id': self.profile.id, **body}, content_type='application/json')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines, stub.requests
+
+    def test_favorite_skips_reviews_already_in_state(self):
+        review_ids = [1_000_000 + i for i in range(10)]
+        lines, requests = self.bulk('bulk_favorite', {'review_ids': review_ids + [1_000_001]})
+
+        self.assertEqual(lines[-1], {'summary': {'total': 10, 'ok': 10, 'failed': 0}})
+        self.assertEqual(len([line for line in lines[:-1] if line.get('skipped')]), 3)
+        self.assertEqual(len(requests), 7)
+        self.assertEqual(DgisReview.objects.filter(is_favorite=True).count(), 10)
+
+    def test_favorite_reaches_state_when_local_store_lacks_review(self):
+        # Отзыва 1_000_012 нет в локальной БД, а на площадке он уже в избранном: переключение его снимает
+        for batch in (False, True):
+            with self.subTest(batch=batch):
+                lines, requests = self.bulk('bulk_favorite', {'review_ids': [1_000_012, 1_000_013]},
+                                            DGIS_BATCH_ACTIONS=batch)
+
+                self.assertEqual(lines[-1], {'summary': {'total': 2, 'ok': 2, 'failed': 0}})
+                self.assertTrue(all(line['is_favorite'] for line in lines[:-1]))
+                self.assertEqual(len(requests), 2 if batch else 3)
+
+    def test_batched_complaints(self):
+        review_ids = [1_000_000 + i for i in range(10)] + ['missing']
+        lines, requests = self.bulk('bulk_complaint', {'review_ids': review_ids, 'complaint_text': 'Спам'},
+                                    DGIS_BATCH_ACTIONS=True, BULK_BATCH_SIZE=4)
+
+        self.assertEqual(requests, ['/api/complaints/batch'] * 3)
+        self.assertEqual(lines[-1], {'summary': {'total': 11, 'ok': 11, 'failed': 0}})
+
+    def test_partial_failure_without_batch(self):
+        lines, _ = self.bulk('bulk_complaint', {'review_ids': [1_000_001, 'bad']})
+
+        results = {line['review_id']: line['status'] for line in lines[:-1]}
+        self.assertEqual(results, {1_000_001: 'ok', 'bad': 'error'})
+
+    def test_validation(self):
+        response = self.client.post('/api/external/api_2gis_reviews/bulk_favorite/',
+                                    {'main_user_id': self.profile.id, 'review_ids': [{'id': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ACCOUNT_RATE_LIMIT_PER_SECOND=50, ACCOUNT_RATE_LIMIT_BURST=2, ACCOUNT_RATE_LIMIT_MAX_WAIT=0.05,
+                   REDIS_URL=None)
+class AccountRateLimitTests(TestCase):
+    """
+    Лимит запросов от имени аккаунта площадки: всплеск, резервирование очереди, отказ с Retry-After.
+    """
+
+    def setUp(self):
+        rate_limit._local.full_at.clear()
+
+    def test_reserve(self):
+        waits = [rate_limit.reserve('2gis', 1) for _ in range(4)]
+        # Два запроса сразу, дальше по очереди с шагом 1/50 с
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 0.02, delta=0.005)
+        self.assertAlmostEqual(waits[3], 0.04, delta=0.005)
+        # Другой аккаунт — свой бакет
+        self.assertEqual(rate_limit.reserve('2gis', 2), 0)
+
+        with self.assertRaises(rate_limit.RateLimited) as error:
+            rate_limit.reserve('2gis', 1, max_wait=0.01)
+        self.assertGreater(error.exception.retry_after, 0.04)
+
+    def test_view_returns_429(self):
+        user = Command._seed(filials_count=1)
+        profile = DgisProfile.objects.get(user=user)
+        self.client.force_login(user)
+        for _ in range(5):
+            rate_limit.reserve('2gis', profile.id)
+
+        response = self.client.post('/api/external/api_2gis_reviews/toggle_complaint/1000001/',
+                                    {'main_user_id': profile.id, 'complaint_text': 'Спам'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+    'user': '5/min', 'endpoint': '3/min', 'search': '3/min'}}, REDIS_URL=None)
+class ThrottlingTests(TestCase):
+    """
+    Лимиты входящих запросов: квота на эндпоинт, общая квота пользователя, одновременные запросы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+
+    def setUp(self):
+        throttling.local_store.clear()
+        self.client.force_login(self.user)
+
+    def test_endpoint_and_user_quotas(self):
+        statuses = [self.client.get('/api/internal/stats/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+        # Другой эндпоинт — своя квота, но общая квота пользователя (5) кончается
+        statuses = [self.client.get('/api/internal/analytics/?platform=2gis').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 429, 429])
+        response = self.client.get('/api/internal/analytics/?platform=2gis')
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(MAX_IN_FLIGHT_PER_USER=1)
+    def test_in_flight_limit_holds_slot_until_stream_closed(self):
+        request = RequestFactory().get('/api/external/api_2gis_reviews/bulk_reply/')
+        request.user = self.user
+        streaming = throttling.InFlightLimitMiddleware(lambda r: StreamingHttpResponse(iter([b'{}'])))
+        plain = throttling.InFlightLimitMiddleware(lambda r: HttpResponse())
+
+        response = streaming(request)
+        self.assertEqual(plain(request).status_code, 429)
+        response.close()
+        self.assertEqual(plain(request).status_code, 200)
+        self.assertEqual(plain(request).status_code, 200)
+
+        # Поток, отданный целиком, освобождает слот и без close()
+        response = streaming(request)
+        self.assertEqual(b''.join(response.streaming_content), b'{}')
+        self.assertEqual(plain(request).status_code, 200)
+        response.close()
+
+    @override_settings(MAX_IN_FLIGHT_PER_USER=1, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_anonymous_clients_behind_proxy_are_separate(self):
+        factory = RequestFactory(REMOTE_ADDR='10.0.0.1')
+        first = factory.get('/api/internal/stats/', HTTP_X_FORWARDED_FOR='203.0.113.1')
+        second = factory.get('/api/internal/stats/', HTTP_X_FORWARDED_FOR='203.0.113.2')
+        first.user = second.user = AnonymousUser()
+        streaming = throttling.InFlightLimitMiddleware(lambda r: StreamingHttpResponse(iter([b'{}'])))
+
+        response = streaming(first)
+        self.assertEqual(streaming(second).status_code, 200)
+        self.assertEqual(streaming(first).status_code, 429)
+        response.close()
+
+
+class UpstreamSchedulerTests(SimpleTestCase):
+    """
+    Приоритеты запросов к микросервисам: резерв слотов и очередь для интерактивных запросов.
+    """
+
+    def test_background_uses_only_spare_capacity(self):
+        scheduler = upstream.UpstreamScheduler(limit=3, reserved=1)
+        self.assertTrue(scheduler.acquire(upstream.BACKGROUND, timeout=0))
+        self.assertTrue(scheduler.acquire(upstream.BACKGROUND, timeout=0))
+        # Последний слот зарезервирован под интерактивные запросы
+        self.assertFalse(scheduler.acquire(upstream.BACKGROUND, timeout=0))
+        self.assertTrue(scheduler.acquire(upstream.INTERACTIVE, timeout=0))
+        self.assertFalse(scheduler.acquire(upstream.INTERACTIVE, timeout=0))
+
+    def test_interactive_jumps_the_queue(self):
+        scheduler = upstream.UpstreamScheduler(limit=2, reserved=0)
+        scheduler.acquire(upstream.BACKGROUND)
+        scheduler.acquire(upstream.BACKGROUND)
+
+        started = []
+
+        def wait(priority):
+            thread = threading.Thread(target=lambda: started.append((priority, scheduler.acquire(priority, timeout=5))))
+            thread.start()
+            return thread
+
+        background = wait(upstream.BACKGROUND)
+        time.sleep(0.02)
+        interactive = wait(upstream.INTERACTIVE)
+        while not scheduler.snapshot()['waiting_interactive']:
+            time.sleep(0.001)
+
+        # Фоновый запрос ждал дольше, но освободившийся слот достаётся интерактивному
+        scheduler.release(upstream.BACKGROUND)
+        interactive.join()
+        self.assertEqual(started, [(upstream.INTERACTIVE, True)])
+
+        scheduler.release(upstream.BACKGROUND)
+        background.join()
+        self.assertEqual(scheduler.snapshot(), {upstream.INTERACTIVE: 1, upstream.BACKGROUND: 1,
+                                                'waiting_interactive': 0})
+
+    def test_async_slot_times_out_with_pool_timeout(self):
+        scheduler = upstream.UpstreamScheduler(limit=1, reserved=0)
+        scheduler.acquire(upstream.INTERACTIVE)
+
+        async def call():
+            async with upstream.slot_async(upstream.INTERACTIVE):
+                pass
+
+        with mock.patch.object(upstream, '_scheduler', scheduler), override_settings(UPSTREAM_QUEUE_TIMEOUT=0.05):
+            with self.assertRaises(httpx.PoolTimeout):
+                asyncio.run(call())
+
+    def test_background_lease_is_shared_through_redis(self):
+        scheduler = upstream.UpstreamScheduler(limit=4, reserved=0)
+        granted = mock.Mock(return_value=0)  # Все общие слоты заняты другими воркерами
+        redis = mock.Mock(register_script=mock.Mock(return_value=granted))
+
+        with mock.patch.object(upstream, '_scheduler', scheduler), \
+                mock.patch.object(upstream, 'get_redis', return_value=redis), \
+                override_settings(UPSTREAM_QUEUE_TIMEOUT=0.1):
+            with self.assertRaises(httpx.PoolTimeout):
+                with upstream.slot(upstream.BACKGROUND):
+                    pass
+            # Слот процесса возвращён, интерактивные запросы аренду не берут
+            self.assertEqual(scheduler.snapshot()[upstream.BACKGROUND], 0)
+            with upstream.slot(upstream.INTERACTIVE):
+                pass
+
+            granted.return_value = 1
+            with upstream.slot(upstream.BACKGROUND):
+                token = granted.call_args.kwargs['args'][0]
+            redis.zrem.assert_called_once_with(upstream.BACKGROUND_KEY, token)
+
+    def test_requests_share_client_of_their_loop(self):
+        async def call(url):
+            first = await upstream.loop_client()
+            await asyncio.gather(*(upstream.request('GET', f'{url}/api/stats/1') for _ in range(3)))
+            self.assertIs(await upstream.loop_client(), first)
+            return first
+
+        with StubService(StubConfig(latency_ms=0)) as stub:
+            first = asyncio.run(call(stub.url))
+            second = asyncio.run(call(stub.url))
+        self.assertEqual(len(stub.requests), 6)
+        # У нового loop свой клиент, клиент завершившегося loop закрыт вместе с ним
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+
+    def test_async_redis_calls_run_off_the_event_loop(self):
+        scheduler = upstream.UpstreamScheduler(limit=4, reserved=0)
+        threads = []
+
+        def script(**kwargs):
+            threads.append(threading.get_ident())
+            return 1
+
+        redis = mock.Mock(register_script=mock.Mock(return_value=script))
+        redis.zrem.side_effect = lambda *args: threads.append(threading.get_ident())
+
+        async def call():
+            await rate_limit.acquire_async('2gis', 1)
+            async with upstream.slot_async(upstream.BACKGROUND):
+                pass
+            return threading.get_ident()
+
+        with mock.patch.object(upstream, '_scheduler', scheduler), \
+                mock.patch.object(upstream, 'get_redis', return_value=redis), \
+                mock.patch.object(rate_limit, 'get_redis', return_value=redis):
+            loop_thread = asyncio.run(call())
+        # Резервирование в бакете, взятие и возврат аренды
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(loop_thread, threads)
+
+
+class InboxTests(TestCase):
+    """
+    Общая лента отзывов: слияние потоков всех филиалов обеих площадок, составной курсор, локальная БД при сбое.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=2)
+        DgisFilial.objects.update(is_active=True)
+        FlampFilial.objects.update(is_active=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_merge_all_streams_in_order(self):
+        pages = []
+        cursor = ''
+        with StubService(StubConfig(latency_ms=0, reviews=100, history=5)) as stub, \
+                override_settings(DGIS_SERVICE_ADDRESS=stub.url, FLAMP_SERVICE_ADDRESS=stub.url):
+            while cursor is not None:
+                response = self.client.get('/api/internal/reviews/inbox/', {'limit': 6, 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                pages.append(response.json()['reviews'])
+                cursor = response.json()['next_cursor']
+                if len(pages) == 1:
+                    # Первая страница — по одному параллельному запросу на поток, без догрузки
+                    first_page_requests = len(stub.requests)
+
+        self.assertEqual([len(page) for page in pages], [6, 6, 6, 2])
+        self.assertEqual(first_page_requests, 4)
+        reviews = [review for page in pages for review in page]
+        dates = [review['created_at'] for review in reviews]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual(len({(r['platform'], r['filial_id'], r['id']) for r in reviews}), 20)
+        self.assertEqual({r['platform'] for r in reviews}, {'2gis', 'flamp'})
+
+    def test_local_fallback_and_bad_cursor(self):
+        upsert_reviews(DGIS, DgisFilial.objects.order_by('pk').first(), build_reviews(StubConfig(reviews=3)))
+        with override_settings(DGIS_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE,
+                               FLAMP_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE):
+            response = self.client.get('/api/internal/reviews/inbox/', {'platform': '2gis'})
+
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['local_fallback']), 2)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get('/api/internal/reviews/inbox/', {'cursor': 'bad'}).status_code, 400)
+
+    def test_equal_dates_and_numeric_ids_across_pages(self):
+        reviews = build_reviews(StubConfig(reviews=7))
+        for review, review_id in zip(reviews, [8, 9, 10, 11, 12, 2, 1]):
+            review['id'] = review_id
+        for review in reviews[:5]:
+            review['created_at'] = NEWEST_REVIEW_AT.isoformat()
+        upsert_reviews(DGIS, DgisFilial.objects.order_by('pk').first(), reviews)
+
+        ids, cursor = [], ''
+        with override_settings(DGIS_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE):
+            while cursor is not None:
+                data = self.client.get('/api/internal/reviews/inbox/',
+                                       {'platform': '2gis', 'limit': 2, 'cursor': cursor}).json()
+                self.assertEqual({review['source'] for review in data['reviews']}, {'local'})
+                ids.extend(review['id'] for review in data['reviews'])
+                cursor = data['next_cursor']
+
+        self.assertEqual(ids, [12, 11, 10, 9, 8, 2, 1])
+
+    @override_settings(INBOX_CONCURRENCY=2)
+    def test_fan_out_is_bounded(self):
+        active, peak = 0, 0
+
+        async def fetch_page(stream, limit, offset_date):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return []
+
+        with mock.patch.object(review_inbox, '_fetch_page', fetch_page):
+            results = asyncio.run(review_inbox._fetch_pages([(None, 5, None)] * 10))
+
+        self.assertEqual(results, [[]] * 10)
+        self.assertEqual(peak, 2)
+
+
+class BootstrapTests(TestCase):
+    """
+    Дерево профилей и филиалов одним запросом с повторной проверкой по ETag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_tree_and_revalidation(self):
+        response = self.client.get('/api/internal/bootstrap/')
+        tree = response.json()
+        self.assertEqual([profile['username'] for profile in tree['2gis']['profiles']], ['bench_2gis'])
+        self.assertEqual([filial['flamp_filial_id'] for filial in tree['flamp']['profiles'][0]['filials']],
+                         ['80000001', '80000002'])
+
+        etag = response['ETag']
+        audit.flush()
+        # Сессия, пользователь и сохранение сессии (5) + версия дерева по запросу на площадку, без самого дерева
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/internal/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        filial = DgisFilial.objects.get(dgis_filial_id='70000001')
+        self.client.put(f'/api/internal/2gis_filials/{filial.profile_id}/', data={'active_ids': [filial.id]},
+                        content_type='application/json')
+        response = self.client.get('/api/internal/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        filial.delete()
+        response = self.client.get('/api/internal/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['2gis']['profiles'][0]['filials']), 1)
+
+
+class FilialSelectionTests(TestCase):
+    """
+    Выбор филиалов профиля одним PUT: два UPDATE, проверка владельца, откат при чужих ID.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=3)
+        cls.profile = DgisProfile.objects.get(user=cls.user)
+        cls.filial_ids = list(DgisFilial.objects.filter(profile=cls.profile).order_by('pk').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def put(self, active_ids, profile_id=None):
+        return self.client.put(f'/api/internal/2gis_filials/{profile_id or self.profile.id}/',
+                               data={'active_ids': active_ids}, content_type='application/json')
+
+    def foreign_profile(self):
+        other = User.objects.create_user(username='other', password='other')
+        profile = DgisProfile.objects.create(user=other, username='other_2gis', hashed_password='-')
+        filial = DgisFilial.objects.create(profile=profile, dgis_filial_id='1', name='Чужой филиал')
+        return profile, filial
+
+    def active_ids(self):
+        return list(DgisFilial.objects.filter(is_active=True).order_by('pk').values_list('id', flat=True))
+
+    def test_selection_in_two_updates(self):
+        DgisFilial.objects.filter(id=self.filial_ids[0]).update(is_active=True)
+        # Сессия, пользователь, два UPDATE в транзакции (SAVEPOINT + RELEASE) и сохранение сессии;
+        # запись журнала попадает в буфер после фиксации и пишется одним INSERT
+        audit.flush()
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(9):
+            response = self.put(self.filial_ids[1:])
+        with self.assertNumQueries(1):
+            self.assertEqual(audit.flush(), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deactivated'], 1)
+        self.assertEqual(self.active_ids(), self.filial_ids[1:])
+
+    def test_foreign_filial_rolls_back(self):
+        _, foreign = self.foreign_profile()
+        foreign_id = foreign.id
+        response = self.put([self.filial_ids[0], foreign_id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unknown_ids'], [foreign_id])
+        self.assertEqual(self.active_ids(), [])
+
+    def test_foreign_profile(self):
+        profile, _ = self.foreign_profile()
+        response = self.put([], profile_id=profile.id)
+        self.assertEqual(response.status_code, 404)
+
+
+class ListPaginationTests(TestCase):
+    """
+    Курсорная пагинация и выбор полей в списках профилей и филиалов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=5)
+        cls.profile = FlampProfile.objects.get(user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_cover_list_once(self):
+        path = f'/api/internal/flamp_filials/{self.profile.id}/'
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, 'fields': 'flamp_filial_id', **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(path, params).json()
+            self.assertLessEqual(len(data['filials']), 2)
+            self.assertEqual({key for filial in data['filials'] for key in filial}, {'id', 'flamp_filial_id'})
+            seen += [filial['flamp_filial_id'] for filial in data['filials']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [str(80000001 + i) for i in range(5)])
+
+    def test_default_page_is_capped(self):
+        with mock.patch('main_site.services.list_page.MAX_PAGE_SIZE', 3):
+            data = self.client.get(f'/api/internal/flamp_filials/{self.profile.id}/').json()
+            self.assertEqual(len(data['filials']), 3)
+            data = self.client.get(f'/api/internal/flamp_filials/{self.profile.id}/',
+                                   {'cursor': data['next_cursor']}).json()
+        self.assertEqual([filial['flamp_filial_id'] for filial in data['filials']], ['80000004', '80000005'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_full_list_without_limit(self):
+        data = self.client.get('/api/internal/2gis_profiles/').json()
+        self.assertEqual(data['profiles'], [{'id': DgisProfile.objects.get(user=self.user).id, 'username': 'bench_2gis',
+                                             'name': None, 'is_active': True}])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_bad_parameters(self):
+        for params in ({'fields': 'hashed_password'}, {'cursor': 'garbage'}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/internal/flamp_profiles/', params)
+                self.assertEqual(response.status_code, 400)
+
+
+class AuditTests(TestCase):
+    """
+    Журнал изменений пишется пачкой после ответа, массовые операции дают одну сводную запись.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=3)
+        cls.profile = DgisProfile.objects.get(user=cls.user)
+        audit.flush()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_saves_are_buffered_and_flushed_in_one_insert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for filial in DgisFilial.objects.filter(profile=self.profile):
+                filial.is_active = True
+                filial.save()
+        self.assertFalse(AuditRecord.objects.filter(entity='filial').exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(audit.flush(), 3)
+        self.assertEqual(AuditRecord.objects.filter(platform='2gis', entity='filial', action='update').count(), 3)
+
+    def test_bulk_selection_is_one_record(self):
+        filial_ids = list(DgisFilial.objects.filter(profile=self.profile).values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/internal/2gis_filials/{self.profile.id}/', data={'active_ids': filial_ids},
+                            content_type='application/json')
+        audit.flush()
+        record = AuditRecord.objects.get(entity='filial')
+        self.assertEqual((record.action, record.object_id, record.user_id), ('select', self.profile.id, self.user.id))
+        self.assertEqual(record.data['activated'], 3)
+
+    def test_relink_keeps_reviews_of_remaining_filials(self):
+        kept = DgisFilial.objects.get(profile=self.profile, dgis_filial_id='70000001')
+        upsert_reviews(DGIS, kept, build_reviews(StubConfig(reviews=3), filial_id='70000001'))
+        kept.refresh_from_db()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            changes = link_filials(DGIS, self.profile,
+                                   [{'id': 70000001, 'name': 'Новое имя'}, {'id': 1, 'name': 'Новый'}],
+                                   user_id=self.user.pk)
+
+        self.assertEqual(changes, {'created': ['1'], 'updated': ['70000001'], 'deleted': ['70000002', '70000003']})
+        filial = DgisFilial.objects.get(pk=kept.pk)
+        self.assertEqual((filial.name, filial.last_review_at), ('Новое имя', kept.last_review_at))
+        self.assertEqual(DgisReview.objects.filter(filial=filial).count(), 3)
+        audit.flush()
+        self.assertEqual(AuditRecord.objects.get(action='link').data['deleted'], ['70000002', '70000003'])
+
+    @override_settings(AUDIT_BUFFER_SIZE=2)
+    def test_flush_when_buffer_is_full(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record('flamp', 'filial', 'update', object_id=1)
+        self.assertEqual(AuditRecord.objects.filter(entity='filial').count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record('flamp', 'filial', 'update', object_id=2)
+        self.assertEqual(AuditRecord.objects.filter(entity='filial').count(), 2)
+
+    def test_rolled_back_changes_are_not_recorded(self):
+        filial = DgisFilial.objects.filter(profile=self.profile).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    filial.name = 'Откачено'
+                    filial.save()
+                    raise DatabaseError("откат")
+            filial.name = 'Сохранено'
+            filial.save()
+
+        self.assertEqual(audit.flush(), 1)
+        self.assertEqual(AuditRecord.objects.get(entity='filial').data['name'], 'Сохранено')
+
+
+class CompressionTests(SimpleTestCase):
+    """
+    Сжатие ответов по Accept-Encoding с порогом размера и потоковым сжатием NDJSON.
+    """
+
+    def request(self, accept_encoding='gzip'):
+        return RequestFactory().get('/api/internal/reviews/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_large_json_is_gzipped(self):
+        body = json.dumps([{'text': 'Отличный сервис, всем рекомендую'}] * 100).encode()
+        response = CompressionMiddleware(lambda request: HttpResponse(body, content_type='application/json'))(
+            self.request('gzip;q=0.5, unknown'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(body) // 5)
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_small_or_refused_is_not_compressed(self):
+        small = CompressionMiddleware(lambda request: HttpResponse(b'{}', content_type='application/json'))
+        self.assertFalse(small(self.request()).has_header('Content-Encoding'))
+        self.assertIsNone(negotiate('gzip;q=0, identity'))
+
+    def test_stream_is_flushed_per_chunk(self):
+        lines = [json.dumps({'review_id': i, 'ok': True}).encode() + b'\n' for i in range(3)]
+        middleware = CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(lines), content_type='application/x-ndjson'))
+        chunks = list(middleware(self.request()).streaming_content)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Каждая строка читается сразу, не дожидаясь конца потока
+        self.assertEqual([decompressor.decompress(chunk) for chunk in chunks[:3]], lines)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), b''.join(lines))
+
+    def test_gzip_length_is_padded(self):
+        body = json.dumps([{'text': 'Отличный сервис, всем рекомендую'}] * 100).encode()
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type='application/json'))
+        responses = [middleware(self.request()).content for _ in range(10)]
+        # Случайное имя файла в заголовке gzip (BREACH): длина одного и того же ответа меняется
+        self.assertGreater(len({len(content) for content in responses}), 1)
+        self.assertTrue(all(gzip.decompress(content) == body for content in responses))
+
+
+class JSONCodecTests(SimpleTestCase):
+    """
+    msgspec-рендерер совместим с JSONRenderer DRF, тело ответа микросервиса декодируется один раз.
+    """
+
+    def test_renderer_matches_drf(self):
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+
+        data = {'text': 'Отзыв', 1: [4.5, gettext_lazy('Ошибка')], 'empty': None}
+        self.assertEqual(json.loads(MsgspecJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(MsgspecJSONRenderer().render(None), b'')
+
+    def test_upstream_body_decoded_once(self):
+        response = httpx.Response(200, content=b'{"is_favorite": true}')
+        with mock.patch('FeedbackGenerator.utils.json_codec._decoder') as decoder:
+            decoder.decode.return_value = {'is_favorite': True}
+            response_json(response)
+            response_json(response)
+        decoder.decode.assert_called_once()
+
+    def test_malformed_request_body(self):
+        from rest_framework.exceptions import ParseError
+
+        with self.assertRaises(ParseError):
+            MsgspecJSONParser().parse(io.BytesIO('{"text": "Отзыв"'.encode()))
+        self.assertEqual(MsgspecJSONParser().parse(io.BytesIO('{"text": "Отзыв"}'.encode())), {'text': 'Отзыв'})
+
+
+class PhotoProxyTests(TestCase):
+    """
+    Прокси фото: только разрешённые хосты, отдача из кеша без загрузки, вытеснение давно не читанных миниатюр.
+    """
+    PHOTO_URL = 'https://i1.photo.2gis.com/images/review/1.jpg'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        patcher = override_settings(PHOTO_CACHE_DIR=self.cache_dir.name, PHOTO_CACHE_MAX_BYTES=100)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        photo_proxy._cache = None
+        self.addCleanup(setattr, photo_proxy, '_cache', None)
+
+    def test_rejects_foreign_hosts(self):
+        for url in ('http://127.0.0.1:8000/admin/', 'file:///etc/passwd', 'https://2gis.com.evil.example/1.jpg'):
+            with self.subTest(url=url):
+                response = self.client.get('/api/internal/reviews/photo/', {'url': url})
+                self.assertEqual(response.status_code, 400)
+
+    def test_served_from_cache(self):
+        key = hashlib.sha256(f"320:{self.PHOTO_URL}".encode()).hexdigest()
+        photo_proxy.get_cache().put(key, b'RIFF-webp')
+        response = self.client.get('/api/internal/reviews/photo/', {'url': self.PHOTO_URL, 'width': 300})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'RIFF-webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_least_recently_read_is_evicted(self):
+        cache = photo_proxy.get_cache()
+        cache.put('aa01', b'x' * 40)
+        cache.put('bb02', b'x' * 40)
+        os.utime(cache.path('aa01'), (1, 1))
+        os.utime(cache.path('bb02'), (2, 2))
+        cache.get('aa01')  # Прочитана последней — остаётся
+        cache.put('cc03', b'x' * 40)
+        self.assertIsNotNone(cache.get('aa01'))
+        self.assertIsNone(cache.get('bb02'))
+
+    def test_resize_timeout_cancels_task(self):
+        future = concurrent.futures.Future()  # Задача так и не дождалась свободного процесса пула
+        pool = mock.Mock(submit=mock.Mock(return_value=future))
+        with mock.patch.object(photo_proxy, '_download', return_value=b'jpeg'), \
+                mock.patch.object(photo_proxy, '_get_pool', return_value=pool), \
+                mock.patch.object(photo_proxy, 'RESIZE_TIMEOUT', 0.01):
+            with self.assertRaises(photo_proxy.PhotoProxyError) as error:
+                photo_proxy.thumbnail_path(self.PHOTO_URL, 320)
+
+        self.assertEqual(error.exception.status_code, 504)
+        self.assertTrue(future.cancelled())
+        self.assertEqual(pool.submit.call_args.args[3], settings.PHOTO_PROXY_MAX_PIXELS)
+
+    def test_thumbnail_regenerated_when_evicted_before_open(self):
+        cache = photo_proxy.get_cache()
+        evicted = os.path.join(self.cache_dir.name, 'evicted.webp')
+        kept = cache.put('aa01', b'RIFF-webp')
+        with mock.patch.object(photo_proxy, 'thumbnail_path', side_effect=[evicted, kept]):
+            response = self.client.get('/api/internal/reviews/photo/', {'url': self.PHOTO_URL})
+        self.assertEqual(b''.join(response.streaming_content), b'RIFF-webp')
+
+        with mock.patch.object(photo_proxy, 'thumbnail_path', return_value=evicted):
+            response = self.client.get('/api/internal/reviews/photo/', {'url': self.PHOTO_URL})
+        self.assertEqual((response.status_code, response['Location']), (302, self.PHOTO_URL))
+
+    def test_key_lock_kept_while_requests_wait(self):
+        entered = threading.Event()
+        releases = [threading.Event(), threading.Event()]
+
+        def hold(release):
+            with photo_proxy._key_lock('aa01'):
+                entered.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold, args=(releases[0],))
+        holder.start()
+        entered.wait(5)
+        waiter = threading.Thread(target=hold, args=(releases[1],))
+        waiter.start()
+        while photo_proxy._key_locks['aa01'][1] < 2:
+            time.sleep(0.001)
+
+        releases[0].set()
+        holder.join()
+        # Первый запрос закончил, а второй держит ту же блокировку
+        self.assertEqual(photo_proxy._key_locks['aa01'][1], 1)
+        releases[1].set()
+        waiter.join()
+        self.assertNotIn('aa01', photo_proxy._key_locks)
+
+
+@override_settings(LKG_REFRESH_BACKOFF=0)
+class LastKnownGoodTests(TestCase):
+    """
+    Последний успешный ответ микросервиса отдаётся с пометкой stale, пока микросервис недоступен.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Command._seed(filials_count=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        caches[last_known_good.CACHE_ALIAS].clear()
+        self.addCleanup(caches[last_known_good.CACHE_ALIAS].clear)
+
+    def get_twice(self, url, params):
+        with StubService(StubConfig(latency_ms=0, reviews=3)) as stub, \
+                override_settings(DGIS_SERVICE_ADDRESS=stub.url):
+            fresh = self.client.get(url, params)
+        with override_settings(DGIS_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE), \
+                mock.patch.object(last_known_good, 'refresh_in_background') as refresh:
+            stale = self.client.get(url, params)
+        refresh.assert_called_once()
+        return fresh, stale
+
+    def test_stale_stats(self):
+        fresh, stale = self.get_twice('/api/external/api_2gis_profiles/stats/',
+                                      {'filial_id': '70000001', 'source': 'service'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['X-Stats-Source'], 'cache')
+        self.assertEqual(stale['Age'], '0')
+        data = stale.json()
+        self.assertEqual((data['stale'], data['stale_age']), (True, 0))
+        self.assertEqual(data['result'], fresh.json()['result'])
+
+    def test_stale_reviews_after_local_store(self):
+        # Локальных отзывов у филиала нет — отдаётся последний ответ микросервиса
+        fresh, stale = self.get_twice('/api/external/api_2gis_profiles/reviews/',
+                                      {'main_user_id': 1, 'filial_id': '70000002'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['X-Reviews-Source'], 'cache')
+        self.assertEqual(stale.json()['reviews'], fresh.json()['reviews'])
+        self.assertTrue(stale.json()['stale'])
+
+        # Для других параметров запомненного ответа нет — отдаётся ошибка микросервиса
+        with override_settings(DGIS_SERVICE_ADDRESS=ReviewStoreTests.DOWN_SERVICE), \
+                mock.patch.object(last_known_good, 'refresh_in_background'):
+            response = self.client.get('/api/external/api_2gis_profiles/reviews/',
+                                       {'main_user_id': 1, 'filial_id': '70000002', 'limit': 5})
+        self.assertEqual(response.status_code, 500)
+
+    def test_background_refresh(self):
+        key = last_known_good.cache_key(DGIS.code, 'stats', self.user.pk, {'filial_id': '70000001'})
+        with StubService(StubConfig(latency_ms=0)) as stub:
+            url = f"{stub.url}/api/stats/70000001"
+            future = last_known_good.refresh_in_background(key, url, None, collected_stats_body)
+            # Пока обновление идёт, повторное для того же ключа не запускается
+            duplicate = last_known_good.refresh_in_background(key, url, None, collected_stats_body)
+            self.assertTrue(future.result(timeout=10))
+        self.assertIsNone(duplicate)
+        self.assertEqual(last_known_good.stale_response(key, 'X-Stats-Source').data['result'], stats_result(STATS))
+
+        failed = last_known_good.refresh_in_background(key, f"{ReviewStoreTests.DOWN_SERVICE}/api/stats/1", None,
+                                                       collected_stats_body)
+        self.assertFalse(failed.result(timeout=10))
+
+
+class ReplicaBalancingTests(SimpleTestCase):
+    """
+    Балансировка между репликами микросервиса: выбор по нагрузке, закрепление аккаунтов и исключение реплик.
+    """
+
+    def test_pool_choice_and_ejection(self):
+        pool = replicas.ReplicaPool(['http://a', 'http://b'], eject_after=2, eject_seconds=30)
+        first, second = pool.replicas
+        first.outstanding = 3
+        self.assertTrue(all(pool.choose() is second for _ in range(20)))
+
+        owner = pool.choose('42')
+        other = second if owner is first else first
+        for _ in range(2):
+            pool.begin(owner)
+            pool.end(owner, ok=False)
+        self.assertIs(pool.choose('42'), other)
+
+        # Срок исключения вышел — аккаунт возвращается, но одной ошибки достаточно, чтобы реплика снова выпала
+        owner.ejected_until = 0
+        self.assertIs(pool.choose('42'), owner)
+        pool.begin(owner)
+        pool.end(owner, ok=False)
+        self.assertIs(pool.choose('42'), other)
+
+        request = httpx.Request('POST', 'http://a/api/reply', json={'main_user_id': 7})
+        self.assertEqual(replicas.sticky_key(request), '7')
+
+    def test_accounts_stick_to_replicas(self):
+        with StubService(StubConfig(latency_ms=0)) as a, StubService(StubConfig(latency_ms=0)) as b, \
+                override_settings(DGIS_SERVICE_ADDRESS=a.url, DGIS_SERVICE_REPLICAS=(a.url, b.url)):
+            pool = replicas.get_pool(a.url)
+            expected = {a.url: 0, b.url: 0}
+            with upstream.client(timeout=5) as client:
+                for user_id in range(20):
+                    expected[pool.choose(str(user_id)).address] += 2
+                    for _ in range(2):
+                        client.get(f"{settings.DGIS_SERVICE_ADDRESS}/api/stats/1", params={'main_user_id': user_id})
+            self.assertEqual((len(a.requests), len(b.requests)), (expected[a.url], expected[b.url]))
+            self.assertTrue(a.requests and b.requests)
+
+    def test_unreachable_replica_is_ejected(self):
+        down = ReviewStoreTests.DOWN_SERVICE
+        with StubService(StubConfig(latency_ms=0)) as stub, \
+                override_settings(DGIS_SERVICE_ADDRESS=stub.url, DGIS_SERVICE_REPLICAS=(down, stub.url),
+                                  UPSTREAM_STICKY_PARAM=None, UPSTREAM_EJECT_AFTER=1):
+            failures = 0
+            with upstream.client(timeout=5) as client:
+                for _ in range(10):
+                    try:
+                        client.get(f"{stub.url}/api/stats/1")
+                    except httpx.ConnectError:
+                        failures += 1
+            self.assertLessEqual(failures, 1)
+            self.assertEqual(len(stub.requests), 10 - failures)
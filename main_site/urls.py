@@ -8,11 +8,19 @@ from main_site.views.DGis.dgis_filials import DgisFilialAPIView
 from main_site.views.Flamp.flamp_api.flamp_api_profiles import APIFlampProfiles
 from main_site.views.Flamp.flamp_filials import FlampFilialAPIView
 from main_site.views.Flamp.flamp_profiles import FlampProfiles
+from main_site.views.bootstrap import BootstrapAPIView
+from main_site.views.inbox import InboxAPIView
+from main_site.views.photos import PhotoProxyAPIView
+from main_site.views.search import ReviewSearchAPIView
+from main_site.views.stats import AnalyticsAPIView, StatsAPIView
 
 # Внутренние маршруты (работают с БД и логикой внутри текущего микросервиса)
 internal_patterns = [
     path('csrf/', get_csrf_token),  # +  +
 
+    # Все профили и филиалы пользователя на обеих площадках (первая загрузка фронта, ETag/304)
+    path('bootstrap/', BootstrapAPIView.as_view()),
+
     # ПРОФИЛЬ 2ГИС
     # Список профилей и создание нового профиля
     path('2gis_profiles/', DGISProfiles.as_view()),
@@ -22,6 +30,7 @@ internal_patterns = [
     path('2gis_profiles/<str:action>/<int:profile_id>/', DGISProfiles.as_view()),
 
     # ФИЛИАЛЫ 2ГИС
+    # Список филиалов профиля (GET) и выбор филиалов (PUT)
     path('2gis_filials/<int:profile_id>/', DgisFilialAPIView.as_view()),
 
     # ПРОФИЛЬ Flamp
@@ -33,7 +42,20 @@ internal_patterns = [
     path('flamp_profiles/<str:action>/<int:profile_id>/', FlampProfiles.as_view()),
 
     # ФИЛИАЛЫ Flamp
+    # Список филиалов профиля (GET) и выбор филиалов (PUT)
     path('flamp_filials/<int:profile_id>/', FlampFilialAPIView.as_view()),
+
+    # Сводная статистика по всем профилям и филиалам пользователя (по локально сохранённым отзывам)
+    path('stats/', StatsAPIView.as_view()),
+    # Динамика оценок по дням/неделям/месяцам (по дневным агрегатам)
+    path('analytics/', AnalyticsAPIView.as_view()),
+
+    # Полнотекстовый поиск по сохранённым отзывам и ответам
+    path('reviews/search/', ReviewSearchAPIView.as_view()),
+    # Общая лента отзывов по всем филиалам обеих площадок
+    path('reviews/inbox/', InboxAPIView.as_view()),
+    # Миниатюры фото отзывов через кеш на диске (?url=<URL фото>&width=<px>)
+    path('reviews/photo/', PhotoProxyAPIView.as_view()),
 ]
 
 # Внешние маршруты (Django проксирует запросы к другим микросервисам)
@@ -43,6 +65,8 @@ external_patterns = [
     path('api_2gis_profiles/<str:action>/', APIDGISProfiles.as_view()),
 
     # # Действия с отзывами
+    # # Массовые действия с отзывами (bulk_reply)
+    path('api_2gis_reviews/<str:action>/', APIDGISReviews.as_view()),
     path('api_2gis_reviews/<str:action>/<int:review_id>/', APIDGISReviews.as_view()),
 
 
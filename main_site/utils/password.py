@@ -1,12 +1,7 @@
 import logging
-import os
 
-from cryptography.fernet import Fernet
+from django.conf import settings
 
-from dotenv import load_dotenv
-
-load_dotenv()
-KEY = os.getenv("ENCRYPTION_KEY").encode()
 logger = logging.getLogger(__name__)
 
 
@@ -18,8 +13,11 @@ def encrypt_password(password: str) -> str:
     :return: Зашифрованный пароль в виде строки.
     """
     try:
+        # cryptography импортируем только при реальном шифровании, чтобы не грузить её при старте воркера
+        from cryptography.fernet import Fernet
+
         # Преобразуем ключ в формат bytes
-        cipher = Fernet(KEY)
+        cipher = Fernet(settings.ENCRYPTION_KEY.encode())
 
         # Шифруем пароль
         encrypted_password = cipher.encrypt(password.encode())
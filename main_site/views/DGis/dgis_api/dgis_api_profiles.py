@@ -1,27 +1,39 @@
-import json
 import logging
-import os
+from functools import partial
 
-import httpx
 from asgiref.sync import async_to_sync
-from dotenv import load_dotenv
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.exceptions import ParseError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from FeedbackGenerator.utils.json_codec import loads, response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
 from FeedbackGenerator.utils.logging_templates import log_request_not_allowed, log_request_missing_items, \
     log_successful_response, log_request_to_service, log_response, log_error_response, log_unexpected_error
 from main_site.models.Dgis_models import DgisFilial
+from main_site.services.Dgis.Dgis_reviews import decode_reviews, encode_reviews_page, filter_review
+from main_site.services import last_known_good, upstream
+from main_site.services.platforms import DGIS
+from main_site.services.review_stats import COUNTER_FIELDS, collected_stats_body, counters_result, \
+    get_filial_stats, stats_result
+from main_site.services.review_store import find_local_reviews, get_user_filial, parse_flag, serialize_review
 
-load_dotenv()
-
-DGIS_SERVER_URL = os.getenv("DGIS_SERVICE_ADDRESS")
+httpx = lazy_module('httpx')
 
 logger = logging.getLogger(__name__)
 
 
+def _reviews_page(filial_id, content):
+    """
+    Ответ fetch_reviews по сырому ответу микросервиса (для фонового обновления last_known_good).
+    """
+    return encode_reviews_page(decode_reviews(content), filial_id)
+
+
 class APIDGISProfiles(APIView):
     """
     Синхронный вариант вью, но сами запросы к внешнему сервису выполняются асинхронно
@@ -80,6 +92,10 @@ class APIDGISProfiles(APIView):
             - rating (int): Рейтинг отзывов для фильтрации (необязательный).
             - without_answer (bool): Флаг, показывающий, выводить ли только отзывы без ответа (необязательный).
             - is_favorite (bool): Флаг, показывающий, выводить ли только избранные отзывы (необязательный).
+            - source (str): `local` — отдать отзывы из локальной БД, не обращаясь к микросервису (необязательный).
+              Если микросервис недоступен, отзывы тоже отдаются из локальной БД (с заголовком X-Reviews-Source: local),
+              а если в ней ничего нет — последний успешный ответ микросервиса с "stale": true, "stale_age"
+              и заголовками Age, X-Reviews-Source: cache.
 
         :return: Объект Response с JSON-ответом:
             - reviews (list): Список отфильтрованных отзывов с полями:
@@ -129,7 +145,10 @@ class APIDGISProfiles(APIView):
                      }
                      )
 
-        service_url = f"{DGIS_SERVER_URL}/api/get_reviews"
+        if request.GET.get('source') == 'local':
+            return self._local_reviews(request, filial_id)
+
+        service_url = f"{settings.DGIS_SERVICE_ADDRESS}/api/get_reviews"
 
         params = {
             "main_user_id": main_user_id,
@@ -140,16 +159,17 @@ class APIDGISProfiles(APIView):
             params["offset_date"] = offset_date
         if rating:
             params["rating"] = rating
-        if without_answer:
+        if parse_flag(without_answer):
             params["without_answer"] = True
-        if is_favorite:
+        if parse_flag(is_favorite):
             params["is_favorite"] = True
 
         log_request_to_service("2GIS", service_url, 'GET', params=params)
+        lkg_key = last_known_good.cache_key(DGIS.code, 'reviews', request.user.pk, params)
 
         try:
-            # Выполняем асинхронный запрос через async_to_sync
-            response_data = async_to_sync(self._async_get)(service_url, params)
+            # Выполняем асинхронный запрос через async_to_sync, тело ответа берём сырыми байтами
+            response_data = async_to_sync(self._async_get)(service_url, params, raw=True)
 
             # Если _async_get вернёт объект DRF-Response (ошибка)
             if isinstance(response_data, Response):
@@ -160,56 +180,51 @@ class APIDGISProfiles(APIView):
                     params=params,
                     response=response_data
                 )
+                # Микросервис недоступен — отдаём то, что уже есть в локальной БД, иначе последний успешный ответ
+                if response_data.status_code >= 500:
+                    return (self._local_reviews(request, filial_id, fallback=True)
+                            or last_known_good.serve_stale(lkg_key, 'X-Reviews-Source', service_url, params,
+                                                           partial(_reviews_page, filial_id))
+                            or response_data)
                 return response_data
 
+            # Быстрый путь: msgspec декодирует сразу в структуры и кодирует ответ без рендерера DRF
+            try:
+                reviews = decode_reviews(response_data)
+            except ValueError:
+                reviews = None
+
+            if reviews is not None:
+                log_successful_response("2GIS", service_url, params, {"reviews": reviews})
+                log_response(request=request, request_name="Отзывы 2GIS с микросервиса",
+                             review_count=len(reviews),
+                             filial_id=filial_id
+                             )
+                body = encode_reviews_page(reviews, filial_id)
+                last_known_good.remember(lkg_key, body)
+                return HttpResponse(body, content_type='application/json', status=200)
+
+            # Медленный путь: ответ не совпал со схемой, разбираем как обычный JSON
+            response_data = loads(response_data)
+
             # Если ответ валидный (например, словарь)
             if isinstance(response_data, dict):
                 log_successful_response("2GIS", service_url, params, response_data)
 
-                reviews = response_data.get("reviews", [])
-                filtered_reviews = []
-
-                for review in reviews:
-                    photos = review.get("photos")
-                    if isinstance(photos, list) and all(isinstance(photo, str) for photo in photos):
-                        filtered_photos = photos
-                    elif isinstance(photos, list):
-                        filtered_photos = [
-                            photo.get("preview_urls", {}).get("url") for photo in photos if isinstance(photo, dict)
-                        ]
-                    else:
-                        filtered_photos = None
-
-                    filtered_review = {
-                        "id": review.get("id"),
-                        "rating": (review.get("rating", 0)),
-                        "text": review.get("text", "Без текста"),
-                        "dateCreated": review.get("created_at"),
-                        "name": review.get("user_name"),
-                        "commentsCount": review.get("comments_count", 0),
-                        "likesCount": review.get("likes_count", 0),
-                        "photos": filtered_photos,
-                        "is_favorite": review.get('is_favorite'),
-                    }
-                    filtered_reviews.append(filtered_review)
-
-                logger.debug(f"Отзывы",
-                             extra={"filtred_reviews": filtered_reviews}
-                             )
+                filtered_reviews = [filter_review(review) for review in response_data.get("reviews", [])]
 
                 log_response(request=request, request_name="Отзывы 2GIS с микросервиса",
                              review_count=len(filtered_reviews),
                              filial_id=filial_id
                              )
 
-                return Response(
-                    {
-                        "reviews": filtered_reviews,
-                        "count": len(filtered_reviews),
-                        "filial_id": filial_id
-                    },
-                    status=200
-                )
+                body = {
+                    "reviews": filtered_reviews,
+                    "count": len(filtered_reviews),
+                    "filial_id": filial_id
+                }
+                last_known_good.remember(lkg_key, body)
+                return Response(body, status=200)
 
             # Если формат ответа неожиданный
             log_unexpected_error(
@@ -243,6 +258,70 @@ class APIDGISProfiles(APIView):
             )
             raise
 
+    def _local_reviews(self, request, filial_id, fallback=False):
+        """
+        Отзывы филиала из локальной БД в том же формате, что и с микросервиса.
+        При fallback=True (микросервис ответил ошибкой) возвращает None, если отдать нечего.
+        """
+        try:
+            reviews = find_local_reviews(DGIS, request.user, filial_id, request.GET, rating=request.GET.get('rating'))
+        except ValueError as e:
+            if fallback:
+                return None
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+
+        if reviews is None:
+            if fallback:
+                return None
+            return Response({'error': "Филиал не найден"}, status=404)
+        if fallback and not reviews:
+            return None
+
+        log_response(request=request, request_name="Отзывы 2GIS из локальной БД",
+                     review_count=len(reviews),
+                     filial_id=filial_id,
+                     fallback=fallback
+                     )
+
+        response = Response(
+            {
+                "reviews": [serialize_review(DGIS, review) for review in reviews],
+                "count": len(reviews),
+                "filial_id": filial_id
+            },
+            status=200
+        )
+        response['X-Reviews-Source'] = 'local'
+        return response
+
+    def _local_stats(self, request, filial_id, complete_only=True):
+        """
+        Статистика филиала по локально сохранённым отзывам в том же формате, что и с микросервиса.
+        Возвращает None, если отзывы филиала ещё не синхронизировались, а при complete_only — и если история
+        отзывов ещё не загружена целиком (history_synced_at): счётчики по части истории неверны.
+        Неполная статистика (source=local) помечается "partial": true.
+        """
+        filial = get_user_filial(DGIS, request.user, filial_id)
+        if filial is None or (complete_only and filial.history_synced_at is None):
+            return None
+        stats = get_filial_stats(DGIS, filial)
+        if stats is None:
+            return None
+
+        counters = {field: getattr(stats, field) for field in COUNTER_FIELDS}
+        result = counters_result(counters)
+        log_response(request=request, request_name="Статистика 2GIS из локальной БД",
+                     result={"count_reviews": result["count_reviews"], "rating": result["rating"]},
+                     status="Данные собраны",
+                     )
+
+        body = {"status": "Данные собраны", "result": result}
+        if filial.history_synced_at is None:
+            body["partial"] = True
+        response = Response(body, status=200)
+        response['X-Stats-Source'] = 'local'
+        return response
+
     def fetch_stats(self, request):
         """
         Получение статистики филиала 2GIS.
@@ -252,6 +331,12 @@ class APIDGISProfiles(APIView):
 
         :param request: Объект HTTP-запроса, содержащий параметры:
             - filial_id (int): ID филиала 2GIS (обязательный).
+            - source (str): `service` — всегда запрашивать микросервис, `local` — всегда считать по локальной БД,
+              даже если история отзывов загружена не целиком (тогда в ответе "partial": true) (необязательный).
+              По умолчанию статистика считается по локальной БД (X-Stats-Source: local), только если история
+              отзывов филиала синхронизирована целиком, иначе запрашивается микросервис.
+              Если микросервис недоступен, отдаётся последняя собранная им статистика с "stale": true, "stale_age"
+              и заголовками Age, X-Stats-Source: cache.
 
         :return: Объект Response с JSON-ответом:
             - status (str): Статус ответа ("Данных нет", "В очереди", "В процессе", "Данные собраны").
@@ -284,10 +369,19 @@ class APIDGISProfiles(APIView):
             log_request_missing_items(request, ['filial_id'], 'params', 'missing_params')
             return Response({"error": "Отсутствует обязательный параметр - filial_id"}, status=400)
 
-        service_url = f"{DGIS_SERVER_URL}/api/stats/{filial_id}"
+        # Статистика по локально сохранённым отзывам отдаётся сразу, без сбора на микросервисе, если история
+        # отзывов загружена целиком; source=local — всегда из локальной БД, source=service — всегда с микросервиса
+        source = request.GET.get('source')
+        if source != 'service':
+            local_stats = self._local_stats(request, filial_id, complete_only=source != 'local')
+            if local_stats is not None:
+                return local_stats
+
+        service_url = f"{settings.DGIS_SERVICE_ADDRESS}/api/stats/{filial_id}"
 
         # Логируем запрос
         log_request_to_service("2GIS", service_url, 'GET', params={"filial_id": filial_id})
+        lkg_key = last_known_good.cache_key(DGIS.code, 'stats', request.user.pk, {"filial_id": filial_id})
 
         try:
             response_data = async_to_sync(self._async_get)(service_url)
@@ -305,6 +399,9 @@ class APIDGISProfiles(APIView):
                     service_name='Микросервис 2GIS', service_url=service_url, method="GET",
                     params={"filial_id": filial_id}, response=response_data,
                 )
+                if response_data.status_code >= 500:
+                    return last_known_good.serve_stale(lkg_key, 'X-Stats-Source', service_url, None,
+                                                       collected_stats_body) or response_data
                 return response_data
 
             if isinstance(response_data, dict):
@@ -326,22 +423,7 @@ class APIDGISProfiles(APIView):
                     return Response({"status": status_message}, status=200)
 
                 # Обработка успешного ответа: считаем проценты
-                data = response_data
-                count_reviews = data.get("count_reviews") or 1  # На случай деления на 0
-                result = {
-                    "one_star_count": data["one_star"],
-                    "one_star_percent": round((data["one_star"] / count_reviews) * 100),
-                    "two_stars_count": data["two_stars"],
-                    "two_stars_percent": round((data["two_stars"] / count_reviews) * 100),
-                    "three_stars_count": data["three_stars"],
-                    "three_stars_percent": round((data["three_stars"] / count_reviews) * 100),
-                    "four_stars_count": data["four_stars"],
-                    "four_stars_percent": round((data["four_stars"] / count_reviews) * 100),
-                    "five_stars_count": data["five_stars"],
-                    "five_stars_percent": round((data["five_stars"] / count_reviews) * 100),
-                    "rating": data["rating"],
-                    "count_reviews": data["count_reviews"],
-                }
+                result = stats_result(response_data)
 
                 log_response(request=request, request_name="Отзывы 2GIS с микросервиса",
                              result={
@@ -358,7 +440,9 @@ class APIDGISProfiles(APIView):
                              status="Данные собраны",
                              )
 
-                return Response({"status": "Данные собраны", "result": result}, status=200)
+                body = {"status": "Данные собраны", "result": result}
+                last_known_good.remember(lkg_key, body)
+                return Response(body, status=200)
 
         except httpx.RequestError as exc:
             log_error_response(
@@ -446,15 +530,16 @@ class APIDGISProfiles(APIView):
             main_user_id = filial.profile.id
 
             # Формируем данные для запроса
-            url = f"{DGIS_SERVER_URL}/api/start_stats_collection"
+            url = f"{settings.DGIS_SERVICE_ADDRESS}/api/start_stats_collection"
             payload = {
                 "main_user_id": main_user_id,
                 "filial_id": filial_id
             }
 
             log_request_to_service("2GIS", url, 'POST', payload=payload)
-            # Отправляем запрос к сервису (асинхронно, но с async_to_sync)
-            response_httpx = async_to_sync(self._async_post)(url, payload)
+            # Отправляем запрос к сервису (асинхронно, но с async_to_sync).
+            # Сбор статистики — фоновая работа, она не должна занимать слоты пользовательских чтений
+            response_httpx = async_to_sync(self._async_post)(url, payload, priority=upstream.BACKGROUND)
 
             # Если _async_post вернул сразу DRF Response — значит упали на ошибке
             if isinstance(response_httpx, Response):
@@ -471,14 +556,14 @@ class APIDGISProfiles(APIView):
             # Если пришёл ответ, смотрим код
             if response_httpx.status_code == 200:
                 log_response(request=request, request_name="Статистика 2GIS с микросервиса",
-                             message="Сбор статистики инициирован"
+                             status="Сбор статистики инициирован"  # Ключ message зарезервирован в LogRecord
                              )
 
                 return Response({"message": "Сбор статистики инициирован"}, status=status.HTTP_200_OK)
             else:
                 # Если сервис вернул не 200
                 try:
-                    details = response_httpx.json()
+                    details = response_json(response_httpx)
                 except Exception:
                     details = {"raw_body": response_httpx.text}
 
@@ -512,26 +597,26 @@ class APIDGISProfiles(APIView):
     # --------------------------------------------------
     # Вспомогательные асинхронные методы для запросов
     # --------------------------------------------------
-    async def _async_get(self, url, params=None):
+    async def _async_get(self, url, params=None, raw=False, priority=upstream.INTERACTIVE):
         """
-        Асинхронный GET-запрос, возвращает либо словарь (response.json()),
+        Асинхронный GET-запрос, возвращает либо словарь (тело ответа, декодированное msgspec),
         либо DRF Response (при ошибке).
+        При raw=True вместо словаря возвращаются байты тела ответа (для быстрого пути через msgspec).
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
+            response = await upstream.request('GET', url, priority=priority, params=params)
+            response.raise_for_status()
 
-                logger.info(
-                    "Успешный GET-запрос к микросервису",
-                    extra={
-                        "url": url,
-                        "method": "GET",
-                        "params": params,
-                        "status_code": response.status_code,
-                    }
-                )
-                return response.json()
+            logger.info(
+                "Успешный GET-запрос к микросервису",
+                extra={
+                    "url": url,
+                    "method": "GET",
+                    "params": params,
+                    "status_code": response.status_code,
+                }
+            )
+            return response.content if raw else response_json(response)
         except httpx.TimeoutException as exc:
             logger.error(
                 "Тайм-аут при запросе к микросервису",
@@ -569,25 +654,24 @@ class APIDGISProfiles(APIView):
             return Response({"error": f"Ошибка микросервиса 2gis: {exc.response.status_code}"},
                             status=exc.response.status_code)
 
-    async def _async_post(self, url, payload):
+    async def _async_post(self, url, payload, priority=upstream.INTERACTIVE):
         """
         Асинхронный POST-запрос, возвращает сам объект response (чтобы мы взяли .status_code и т.п.),
         либо DRF Response (при ошибке).
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
+            response = await upstream.request('POST', url, priority=priority, json=payload)
 
-                logger.info(
-                    "Успешный POST-запрос к микросервису",
-                    extra={
-                        "url": url,
-                        "method": "POST",
-                        "payload": payload,
-                        "status_code": response.status_code,
-                    }
-                )
-                return response
+            logger.info(
+                "Успешный POST-запрос к микросервису",
+                extra={
+                    "url": url,
+                    "method": "POST",
+                    "payload": payload,
+                    "status_code": response.status_code,
+                }
+            )
+            return response
 
         except httpx.TimeoutException as exc:
             logger.error(
@@ -1,21 +1,25 @@
-import json
 import logging
-import os
+import math
 
-import httpx
 from asgiref.sync import async_to_sync
-from dotenv import load_dotenv
+from django.conf import settings
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from FeedbackGenerator.utils.json_codec import response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
 from FeedbackGenerator.utils.logging_templates import log_request_not_allowed, log_request_to_service, \
-    log_error_response, log_unexpected_error, log_response
+    log_error_response, log_unexpected_error, log_response, log_request_missing_items
+from main_site.models import DgisProfile
+from main_site.services import upstream
+from main_site.services.bulk import batch_results, batches, bulk_response, error_result, validate_items
+from main_site.services.platforms import DGIS
+from main_site.services.rate_limit import RateLimited, acquire
+from main_site.services.review_store import add_reply, favorite_review_ids, review_profile_id, set_favorite
 
-load_dotenv()
-
-DGIS_SERVER_URL = os.getenv("DGIS_SERVICE_ADDRESS")
+httpx = lazy_module('httpx')
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +33,7 @@ class APIDGISReviews(APIView):
         (toggle_favorite / toggle_complaint / toggle_reply),
         также синхронные. Но сами запросы к микросервису будут асинхронными
         (через _async_post) и обёрнуты в async_to_sync.
+        Массовые действия (bulk_reply / bulk_favorite / bulk_complaint) вызываются без review_id.
         """
         if action == 'toggle_favorite':
             return self.toggle_favorite(request, review_id)
@@ -36,6 +41,12 @@ class APIDGISReviews(APIView):
             return self.toggle_complaint(request, review_id)
         elif action == 'toggle_reply':
             return self.toggle_reply(request, review_id)
+        elif action == 'bulk_reply' and review_id is None:
+            return self.bulk_reply(request)
+        elif action == 'bulk_favorite' and review_id is None:
+            return self.bulk_favorite(request)
+        elif action == 'bulk_complaint' and review_id is None:
+            return self.bulk_complaint(request)
         else:
             log_request_not_allowed(request=request, action=action, method="POST")
             return Response(
@@ -47,7 +58,7 @@ class APIDGISReviews(APIView):
         """
         Переключение статуса избранного для отзыва (СИНХРОННО).
         """
-        service_url = f"{DGIS_SERVER_URL}/api/favorite/{review_id}"
+        service_url = f"{settings.DGIS_SERVICE_ADDRESS}/api/favorite/{review_id}"
 
         # Формируем payload
         payload = {'review_id': review_id}
@@ -56,6 +67,10 @@ class APIDGISReviews(APIView):
 
         log_request_to_service("2GIS", service_url, 'POST', payload={"review_id": review_id})
 
+        limited = self._wait_account_limit(request, review_id)
+        if limited:
+            return limited
+
         # Вызываем асинхронный метод через async_to_sync
         response = async_to_sync(self._async_post)(service_url, payload)
 
@@ -94,14 +109,15 @@ class APIDGISReviews(APIView):
 
         # Парсим JSON
         try:
-            response_data = response.json()
+            response_data = response_json(response)
+            set_favorite(DGIS, request.user, review_id, response_data.get('is_favorite'))
             log_response(
                 request=request,
                 request_name="Микросервис 2GIS",
                 is_favorite=response_data.get('is_favorite')
             )
             return Response({'is_favorite': response_data.get('is_favorite')}, status=200)
-        except json.JSONDecodeError:
+        except ValueError:
             logger.error(
                 "Некорректный формат JSON в ответе",
                 extra={
@@ -121,7 +137,7 @@ class APIDGISReviews(APIView):
         main_user_id = body.get('main_user_id')
         is_no_client_complaint = body.get('is_no_client_complaint')
 
-        service_url = f"{DGIS_SERVER_URL}/api/complaints/{review_id}"
+        service_url = f"{settings.DGIS_SERVICE_ADDRESS}/api/complaints/{review_id}"
 
         data = {
             "text": text,
@@ -138,6 +154,10 @@ class APIDGISReviews(APIView):
 
         log_request_to_service("2GIS", service_url, 'POST', payload=data)
 
+        limited = self._wait_account_limit(request, review_id)
+        if limited:
+            return limited
+
         response = async_to_sync(self._async_post)(service_url, data)
         if isinstance(response, Response):
             log_error_response(
@@ -186,7 +206,7 @@ class APIDGISReviews(APIView):
         text = body.get('text')
         is_official = body.get('is_official')
 
-        service_url = f"{DGIS_SERVER_URL}/api/post_review_reply/{review_id}"
+        service_url = f"{settings.DGIS_SERVICE_ADDRESS}/api/post_review_reply/{review_id}"
 
         data = {
             "main_user_id": main_user_id,
@@ -203,6 +223,10 @@ class APIDGISReviews(APIView):
 
         log_request_to_service("Микросервис 2GIS", service_url, 'POST', payload=data)
 
+        limited = self._wait_account_limit(request, review_id)
+        if limited:
+            return limited
+
         response = async_to_sync(self._async_post)(service_url, data)
         if isinstance(response, Response):
             log_error_response(
@@ -215,6 +239,7 @@ class APIDGISReviews(APIView):
             return response
 
         if response.status_code == 200:
+            add_reply(DGIS, request.user, review_id, text, is_official)
             return Response({"status": "ok"}, status=200)
         else:
             error_message = response.text.strip() or "Неизвестная ошибка от внешнего сервиса"
@@ -235,26 +260,268 @@ class APIDGISReviews(APIView):
                 status=502,
             )
 
+    def bulk_reply(self, request):
+        """
+        Ответы на много отзывов одним запросом.
+
+        Ответы отправляются в микросервис параллельно (не больше BULK_CONCURRENCY одновременно)
+        и не чаще лимита аккаунта (ACCOUNT_RATE_LIMIT_*), результаты отдаются потоком по мере готовности.
+
+        :param request: Объект HTTP-запроса с JSON-телом:
+            - main_user_id (int): ID профиля 2GIS, от имени которого отправляются ответы (обязательный).
+            - replies (list): Ответы — объекты {review_id, text, is_official} (обязательный, до BULK_MAX_ITEMS).
+
+        :return: StreamingHttpResponse (application/x-ndjson), по строке на отзыв:
+            - {"review_id": ..., "status": "ok"} или {"review_id": ..., "status": "error", "error": ...}
+            и последней строкой {"summary": {"total": ..., "ok": ..., "failed": ...}}.
+        """
+        body = request.data
+        main_user_id = body.get('main_user_id')
+        replies = body.get('replies')
+
+        if not main_user_id:
+            log_request_missing_items(request, ['main_user_id'], 'fields', 'missing_fields')
+            return Response({"error": "Отсутствует обязательное поле - main_user_id"}, status=400)
+
+        error = validate_items(replies, required=('review_id', 'text'))
+        if error:
+            return Response({"error": f"replies: {error}"}, status=400)
+
+        # Результаты сопоставляются с текстами по review_id, а два ответа на один отзыв — ошибка клиента
+        review_ids = [str(item['review_id']) for item in replies]
+        if len(set(review_ids)) != len(review_ids):
+            return Response({"error": "replies: повторяющиеся review_id"}, status=400)
+
+        # Ответы уходят от имени аккаунта площадки — он должен принадлежать пользователю
+        if not DgisProfile.objects.filter(id=main_user_id, user=request.user).exists():
+            return Response({"error": "Профиль не найден"}, status=404)
+
+        log_request_to_service("Микросервис 2GIS", f"{settings.DGIS_SERVICE_ADDRESS}/api/post_review_reply/",
+                               'POST', payload={"main_user_id": main_user_id, "replies_count": len(replies)})
+
+        async def send(client, item):
+            response = await client.post(
+                f"{settings.DGIS_SERVICE_ADDRESS}/api/post_review_reply/{item['review_id']}",
+                json={"main_user_id": main_user_id, "text": item['text'], "is_official": item.get('is_official')},
+            )
+            if response.status_code != 200:
+                return error_result(item['review_id'], response)
+            return {"review_id": item['review_id'], "status": "ok"}
+
+        texts = {str(item['review_id']): item for item in replies}
+
+        def on_result(result):
+            if result["status"] == "ok":
+                item = texts[str(result["review_id"])]
+                add_reply(DGIS, request.user, item['review_id'], item['text'], item.get('is_official'))
+            else:
+                log_error_response(service_name="Микросервис 2GIS", method="POST", exception=result["error"],
+                                   review_id=result["review_id"])
+
+        log_response(request=request, request_name="Массовые ответы на отзывы 2GIS",
+                     main_user_id=main_user_id,
+                     replies_count=len(replies),
+                     )
+        return bulk_response(request, replies, send, (DGIS.code, main_user_id), on_result)
+
+    def bulk_favorite(self, request):
+        """
+        Добавление в избранное (или удаление из него) многих отзывов одним запросом.
+
+        Площадка только переключает избранное, поэтому отзывы, которые по локальной БД уже в нужном
+        состоянии, пропускаются без запроса к микросервису. Остальные отправляются пачками
+        (если DGIS_BATCH_ACTIONS) или по одному параллельно, как в bulk_reply.
+
+        :param request: Объект HTTP-запроса с JSON-телом:
+            - main_user_id (int): ID профиля 2GIS (обязательный).
+            - review_ids (list): ID отзывов (обязательный, до BULK_MAX_ITEMS).
+            - is_favorite (bool): Нужное состояние, по умолчанию true.
+
+        :return: StreamingHttpResponse (application/x-ndjson), по строке на отзыв:
+            - {"review_id": ..., "status": "ok", "is_favorite": ...} (с "skipped": true, если запрос не понадобился)
+            или {"review_id": ..., "status": "error", "error": ...}, последней строкой — summary.
+        """
+        body = request.data
+        is_favorite = bool(body.get('is_favorite', True))
+        checked = self._bulk_check(request, body.get('review_ids'))
+        if isinstance(checked, Response):
+            return checked
+        main_user_id, review_ids = checked
+
+        in_place = favorite_review_ids(DGIS, request.user, review_ids, is_favorite)
+        pending = [review_id for review_id in review_ids if str(review_id) not in in_place]
+        skipped = [{"review_id": review_id, "status": "ok", "is_favorite": is_favorite, "skipped": True}
+                   for review_id in review_ids if str(review_id) in in_place]
+
+        # Площадка только переключает избранное: если локальная БД отстала (или отзыва в ней нет),
+        # переключение могло снять избранное — тогда переключаем ещё раз, а при повторном расхождении
+        # отдаём ошибку вместо "ok" с неверным состоянием
+        def settled(result):
+            if result["status"] != "ok" or result.get("is_favorite") == is_favorite:
+                return result
+            return {"review_id": result["review_id"], "status": "error", "is_favorite": result.get("is_favorite"),
+                    "error": "Не удалось привести избранное в нужное состояние"}
+
+        async def toggle(client, review_id):
+            response = await client.post(f"{settings.DGIS_SERVICE_ADDRESS}/api/favorite/{review_id}",
+                                         json={"review_id": review_id})
+            if response.status_code != 200:
+                return error_result(review_id, response)
+            return {"review_id": review_id, "status": "ok", "is_favorite": response_json(response).get('is_favorite')}
+
+        async def send(client, item):
+            result = await toggle(client, item['review_id'])
+            if result["status"] == "ok" and result["is_favorite"] == (not is_favorite):
+                result = await toggle(client, item['review_id'])
+            return settled(result)
+
+        async def toggle_batch(client, review_ids):
+            response = await client.post(f"{settings.DGIS_SERVICE_ADDRESS}/api/favorite/batch",
+                                         json={"main_user_id": main_user_id, "review_ids": review_ids})
+            return batch_results(review_ids, response)
+
+        async def send_batch(client, item):
+            results = await toggle_batch(client, item['review_ids'])
+            flipped = [result["review_id"] for result in results
+                       if result["status"] == "ok" and result.get("is_favorite") == (not is_favorite)]
+            if flipped:
+                retried = {result["review_id"]: result for result in await toggle_batch(client, flipped)}
+                results = [retried.get(result["review_id"], result) for result in results]
+            return [settled(result) for result in results]
+
+        def mirror(result):
+            set_favorite(DGIS, request.user, result["review_id"], result.get("is_favorite"))
+
+        return self._bulk_dispatch(request, "Массовое избранное 2GIS", "/api/favorite/", main_user_id, pending,
+                                   send, send_batch, mirror, skipped)
+
+    def bulk_complaint(self, request):
+        """
+        Одна и та же жалоба на многие отзывы одним запросом (например, на серию спама).
+
+        :param request: Объект HTTP-запроса с JSON-телом:
+            - main_user_id (int): ID профиля 2GIS (обязательный).
+            - review_ids (list): ID отзывов (обязательный, до BULK_MAX_ITEMS).
+            - complaint_text (str): Текст жалобы.
+            - is_no_client_complaint (bool): Жалоба «не был клиентом».
+
+        :return: StreamingHttpResponse (application/x-ndjson), как в bulk_favorite.
+        """
+        body = request.data
+        checked = self._bulk_check(request, body.get('review_ids'))
+        if isinstance(checked, Response):
+            return checked
+        main_user_id, review_ids = checked
+        data = {
+            "text": body.get('complaint_text'),
+            "main_user_id": main_user_id,
+            "is_no_client_complaint": body.get('is_no_client_complaint'),
+        }
+
+        async def send(client, item):
+            response = await client.post(f"{settings.DGIS_SERVICE_ADDRESS}/api/complaints/{item['review_id']}",
+                                         json=data)
+            if response.status_code != 200:
+                return error_result(item['review_id'], response)
+            return {"review_id": item['review_id'], "status": "ok"}
+
+        async def send_batch(client, item):
+            response = await client.post(f"{settings.DGIS_SERVICE_ADDRESS}/api/complaints/batch",
+                                         json={**data, "review_ids": item['review_ids']})
+            return batch_results(item['review_ids'], response)
+
+        return self._bulk_dispatch(request, "Массовые жалобы 2GIS", "/api/complaints/", main_user_id, review_ids,
+                                   send, send_batch)
+
+    def _wait_account_limit(self, request, review_id):
+        """
+        Ждёт очереди на запрос от имени аккаунта 2GIS (не дольше ACCOUNT_RATE_LIMIT_MAX_WAIT).
+        Аккаунт — main_user_id из тела запроса, иначе профиль филиала отзыва в локальной БД.
+
+        :return: DRF Response 429 с Retry-After, если лимит аккаунта исчерпан, иначе None.
+        """
+        profile_id = request.data.get('main_user_id') or review_profile_id(DGIS, request.user, review_id)
+        if not profile_id:
+            return None
+        try:
+            acquire(DGIS.code, profile_id, max_wait=settings.ACCOUNT_RATE_LIMIT_MAX_WAIT)
+        except RateLimited as exc:
+            logger.warning("Превышен лимит запросов аккаунта 2GIS",
+                           extra={'main_user_id': profile_id, 'retry_after': exc.retry_after})
+            response = Response({"error": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(math.ceil(exc.retry_after))
+            return response
+        return None
+
+    def _bulk_check(self, request, review_ids):
+        """
+        Общая проверка тела массового запроса по списку ID отзывов.
+
+        :return: (main_user_id, review_ids) или DRF Response с ошибкой.
+        """
+        main_user_id = request.data.get('main_user_id')
+        if not main_user_id:
+            log_request_missing_items(request, ['main_user_id'], 'fields', 'missing_fields')
+            return Response({"error": "Отсутствует обязательное поле - main_user_id"}, status=400)
+
+        error = validate_items(review_ids, required=())
+        if error:
+            return Response({"error": f"review_ids: {error}"}, status=400)
+
+        if not DgisProfile.objects.filter(id=main_user_id, user=request.user).exists():
+            return Response({"error": "Профиль не найден"}, status=404)
+
+        # Повторы ID в одном запросе отправлять незачем (а избранное повтор переключил бы обратно)
+        return main_user_id, list(dict.fromkeys(review_ids))
+
+    def _bulk_dispatch(self, request, request_name, service_path, main_user_id, review_ids, send, send_batch,
+                       mirror=None, done=()):
+        """
+        Отправляет отзывы пачками, если микросервис это умеет (DGIS_BATCH_ACTIONS), иначе по одному параллельно.
+        Успешные результаты отражаются в локальной БД через mirror, ошибки логируются.
+
+        :param done: Готовые результаты, которые отдаются в начале потока без запросов к микросервису.
+        """
+        if settings.DGIS_BATCH_ACTIONS:
+            items, sender = batches(review_ids), send_batch
+        else:
+            items, sender = [{"review_id": review_id} for review_id in review_ids], send
+
+        log_request_to_service("Микросервис 2GIS", f"{settings.DGIS_SERVICE_ADDRESS}{service_path}", 'POST',
+                               payload={"main_user_id": main_user_id, "reviews_count": len(review_ids),
+                                        "batched": settings.DGIS_BATCH_ACTIONS})
+
+        def on_result(result):
+            if result["status"] == "ok":
+                if mirror:
+                    mirror(result)
+            else:
+                log_error_response(service_name="Микросервис 2GIS", method="POST", exception=result["error"],
+                                   review_id=result["review_id"])
+
+        log_response(request=request, request_name=request_name, main_user_id=main_user_id,
+                     reviews_count=len(review_ids))
+        return bulk_response(request, items, sender, (DGIS.code, main_user_id), on_result, done)
+
     # --------------------------------------------------
     # Вспомогательный асинхронный метод для запросов
     # --------------------------------------------------
-    async def _async_post(self, url, payload):
+    async def _async_post(self, url, payload, priority=upstream.INTERACTIVE):
         """
         Асинхронный POST-запрос, возвращаем либо httpx.Response (если всё ок),
         либо DRF Response (если словили RequestError).
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
-                logger.info(
-                    "Успешный POST-запрос к микросервису",
-                    extra={
-                        "url": url,
-                        "payload": payload,
-                        "status_code": response.status_code,
-                    }
-                )
-                return response  # Вернём httpx.Response
+            response = await upstream.request('POST', url, priority=priority, json=payload)
+            logger.info(
+                "Успешный POST-запрос к микросервису",
+                extra={
+                    "url": url,
+                    "payload": payload,
+                    "status_code": response.status_code,
+                }
+            )
+            return response  # Вернём httpx.Response
         except httpx.TimeoutException as exc:
             logger.error(
                 "Тайм-аут при запросе к микросервису",
@@ -1,20 +1,20 @@
 import logging
-import os
 
 from django.shortcuts import get_object_or_404
-
-from dotenv import load_dotenv
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from FeedbackGenerator.utils.logging_templates import log_response, log_error_response
 from main_site.models.Dgis_models import DgisProfile
-
-load_dotenv()
+from main_site.services.filial_selection import UnknownFilials, parse_active_ids, set_active_filials
+from main_site.services.list_page import list_page, parse_fields
+from main_site.services.platforms import DGIS
 
 logger = logging.getLogger(__name__)
 
+FILIAL_FIELDS = ('id', 'dgis_filial_id', 'name', 'is_active')
+
 
 class DgisFilialAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -22,10 +22,15 @@ class DgisFilialAPIView(APIView):
     def get(self, request, profile_id):
         """
         Возвращает список филиалов для указанного профиля пользователя.
+
+        Query-параметры (необязательные):
+            - limit (int): Размер страницы (по умолчанию и максимум 500); остальное — по next_cursor.
+            - cursor (str): Курсор из next_cursor предыдущей страницы.
+            - fields (str): Нужные поля через запятую, например "id,name" (id отдаётся всегда).
         """
         try:
             # Проверяем, что профиль принадлежит текущему пользователю
-            profile = get_object_or_404(DgisProfile, id=profile_id, user=request.user)
+            profile = get_object_or_404(DgisProfile.objects.only('id', 'name'), id=profile_id, user=request.user)
         except Exception as e:
             log_error_response(
                 request=request,
@@ -35,30 +40,60 @@ class DgisFilialAPIView(APIView):
                 profile_id=profile_id,
             )
             raise
-        # Получаем все филиалы, связанные с профилем
-        filials = profile.dgis_filials.all()
-
-        # Формируем JSON-ответ с данными филиалов
-        filials_data = [
-            {
-                'id': filial.id,
-                'dgis_filial_id': filial.dgis_filial_id,
-                'name': filial.name,
-                'is_active': filial.is_active,
-            }
-            for filial in filials
-        ]
-
-        logger.debug(f"Список филиалов:\n\n{filials_data}")
+
+        try:
+            fields = parse_fields(request.GET.get('fields'), FILIAL_FIELDS)
+            # Из БД берутся только запрошенные поля текущей страницы
+            filials_data, next_cursor = list_page(profile.dgis_filials.all(), fields, request.GET)
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+
+        logger.debug("Список филиалов:\n\n%s", filials_data)
 
         log_response(request=request, request_name="Филиалы 2GIS",
                      profile_id=profile.id,
                      profile_name=profile.name,
-                     filials_count=len(filials),
+                     filials_count=len(filials_data),
                      )
 
         return Response({
             'profile_id': profile.id,
             'profile_name': profile.name,
             'filials': filials_data,
+            'next_cursor': next_cursor,
+        }, status=200)
+
+    def put(self, request, profile_id):
+        """
+        Задаёт выбранные филиалы профиля: филиалы из active_ids включаются, остальные выключаются.
+
+        Тело запроса: {"active_ids": [int, ...]} — ID филиалов (поле id из списка филиалов).
+        :return: Объект Response с JSON-ответом:
+            - profile_id (int), active_ids (list[int]).
+            - activated (int): Сколько филиалов выбрано.
+            - deactivated (int): Со скольких филиалов снят выбор.
+        """
+        active_ids, error = parse_active_ids(request.data)
+        if error:
+            return Response({'error': error}, status=400)
+
+        try:
+            selection = set_active_filials(DGIS, request.user, profile_id, active_ids)
+        except UnknownFilials as e:
+            log_error_response(request=request, service_name='Профили 2GIS', exception=str(e), profile_id=profile_id)
+            return Response({'error': str(e), 'unknown_ids': e.ids}, status=400)
+        if selection is None:
+            return Response({'error': "Профиль не найден"}, status=404)
+
+        log_response(request=request, request_name="Филиалы 2GIS: выбор",
+                     profile_id=profile_id,
+                     activated=selection.activated,
+                     deactivated=selection.deactivated,
+                     )
+
+        return Response({
+            'profile_id': profile_id,
+            'active_ids': selection.active_ids,
+            'activated': selection.activated,
+            'deactivated': selection.deactivated,
         }, status=200)
@@ -10,12 +10,18 @@ from FeedbackGenerator.utils.check_method import check_method
 from FeedbackGenerator.utils.logging_templates import log_request_missing_items, log_request_not_allowed, log_response, \
     log_error_response
 from FeedbackGenerator.utils.mask_data import mask_sensitive_data
-from main_site.models.Dgis_models import DgisProfile, DgisFilial
+from main_site.models.Dgis_models import DgisProfile
 from main_site.services.Dgis.Dgis_service_api import link_profile_to_2gis
+from main_site.services.filial_selection import link_filials
+from main_site.services.platforms import DGIS
+from main_site.services.list_page import list_page, parse_fields
 from main_site.utils.password import encrypt_password
 
 logger = logging.getLogger(__name__)
 
+# Поля профиля в списке; is_active — связан ли профиль с сервисом
+PROFILE_FIELDS = ('id', 'username', 'name', 'is_active')
+
 
 class DGISProfiles(APIView):
     permission_classes = [IsAuthenticated]
@@ -28,29 +34,21 @@ class DGISProfiles(APIView):
                 status=status.HTTP_405_METHOD_NOT_ALLOWED
             )
 
-        user = request.user
-        # Получаем все профили пользователя
-        dgis_profiles = user.dgis_profiles.all()
-        logger.debug(f'dgis_profiles: {dgis_profiles}')
-
-        # Формируем JSON-ответ
-        profiles_data = [
-            {
-                'id': profile.id,
-                'username': profile.username,
-                'name': profile.name,
-                'is_active': profile.is_active,  # Связано ли с сервисом
-            }
-            for profile in dgis_profiles
-        ]
+        try:
+            fields = parse_fields(request.GET.get('fields'), PROFILE_FIELDS)
+            # Из БД берутся только запрошенные поля текущей страницы
+            profiles_data, next_cursor = list_page(request.user.dgis_profiles.all(), fields, request.GET)
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
 
-        logger.debug(f'profiles_data: {profiles_data}')
+        # Ленивое форматирование: строка собирается, только если DEBUG-запись реально пишется
+        logger.debug('profiles_data: %s', profiles_data)
 
         log_response(request=request, request_name="Профиль 2GIS",
                      action=action, profiles_count=len(profiles_data),
                      )
 
-        return Response({'profiles': profiles_data}, status=200)
+        return Response({'profiles': profiles_data, 'next_cursor': next_cursor}, status=200)
 
     def post(self, request, action=None, profile_id=None):
         # Проверяем разрешённые методы для каждого действия
@@ -322,16 +320,8 @@ class DGISProfiles(APIView):
                                     'name': fil['name']
                                 })
 
-            # Синхронно удаляем старые филиалы
-            DgisFilial.objects.filter(profile=profile).delete()
-
-            # Синхронно создаём новые
-            for filial in filial_data:
-                DgisFilial.objects.create(
-                    dgis_filial_id=int(filial['id']),
-                    profile=profile,
-                    name=filial['name']
-                )
+            # Обновляем филиалы по ID на площадке: отзывы и метки синхронизации сохранившихся филиалов остаются
+            link_filials(DGIS, profile, filial_data, user_id=user_id)
 
             # Активируем профиль
             profile.is_active = True
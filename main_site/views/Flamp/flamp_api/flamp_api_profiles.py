@@ -1,24 +1,40 @@
 import logging
-import os
 
-import httpx
 from asgiref.sync import async_to_sync
-from dotenv import load_dotenv
+from django.conf import settings
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from FeedbackGenerator.utils.json_codec import loads, response_json
+from FeedbackGenerator.utils.lazy_import import lazy_module
 from FeedbackGenerator.utils.logging_templates import log_request_not_allowed, log_request_missing_items, \
     log_request_to_service, log_response, log_error_response, log_successful_response, log_unexpected_error
+from main_site.services import last_known_good, upstream
+from main_site.services.platforms import FLAMP
+from main_site.services.review_stats import COUNTER_FIELDS, counters_result, get_filial_stats
+from main_site.services.review_store import find_local_reviews, get_user_filial, parse_flag, serialize_review
 
-load_dotenv()
-
-FLAMP_SERVER_URL = os.getenv("FLAMP_SERVICE_ADDRESS")
+httpx = lazy_module('httpx')
 
 logger = logging.getLogger(__name__)
 
 
+def _reviews_body(content):
+    """
+    Ответ fetch_reviews по сырому ответу микросервиса (для фонового обновления last_known_good).
+    Возвращает None, если отзывов нет: такой ответ не запоминается.
+    """
+    data = loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается объект с отзывами")
+    reviews = data.get("data")
+    if data.get("message") == "Нет отзывов" or not reviews:
+        return None
+    return {"status": "Данные собраны", "result": {"reviews_count": len(reviews), "reviews": reviews}}
+
+
 class APIFlampProfiles(APIView):
     """
     Синхронный вариант вью, но сами запросы к внешнему сервису выполняются асинхронно
@@ -76,6 +92,10 @@ class APIFlampProfiles(APIView):
             - rating (int): Рейтинг отзывов для фильтрации (необязательный).
             - without_answer (bool): Флаг, показывающий, выводить ли только отзывы без ответа (необязательный).
             - is_favorite (bool): Флаг, показывающий, выводить ли только избранные отзывы (необязательный).
+            - source (str): `local` — отдать отзывы из локальной БД, не обращаясь к микросервису (необязательный).
+              Если микросервис недоступен, отзывы тоже отдаются из локальной БД (с заголовком X-Reviews-Source: local),
+              а если в ней ничего нет — последний успешный ответ микросервиса с "stale": true, "stale_age"
+              и заголовками Age, X-Reviews-Source: cache.
 
         :return: Объект Response с JSON-ответом:
             - reviews_count (int): Кол-во отзывов которое вернул микросервис.
@@ -123,7 +143,10 @@ class APIFlampProfiles(APIView):
                      }
                      )
 
-        service_url = f"{FLAMP_SERVER_URL}/api/reviews/{filial_id}"
+        if request.GET.get('source') == 'local':
+            return self._local_reviews(request, filial_id, rating)
+
+        service_url = f"{settings.FLAMP_SERVICE_ADDRESS}/api/reviews/{filial_id}"
 
         params = {
             "filial_id": filial_id,
@@ -134,12 +157,13 @@ class APIFlampProfiles(APIView):
             params["offset_date"] = offset_date
         if rating:
             params["rating"] = rating
-        if without_answer:
+        if parse_flag(without_answer):
             params["without_answer"] = True
-        if is_favorite:
+        if parse_flag(is_favorite):
             params["is_favorite"] = True
 
         log_request_to_service("Flamp", service_url, 'GET', params=params)
+        lkg_key = last_known_good.cache_key(FLAMP.code, 'reviews', request.user.pk, params)
 
         try:
             response_data = async_to_sync(self._async_get)(service_url)
@@ -150,6 +174,12 @@ class APIFlampProfiles(APIView):
                     service_name='Микросервис Flamp', service_url=service_url, method="GET",
                     params={"filial_id": filial_id}, response=response_data,
                 )
+                # Микросервис недоступен — отдаём то, что уже есть в локальной БД
+                if response_data.status_code >= 500:
+                    return (self._local_reviews(request, filial_id, rating, fallback=True)
+                            or last_known_good.serve_stale(lkg_key, 'X-Reviews-Source', service_url, None,
+                                                           _reviews_body)
+                            or response_data)
                 return response_data
 
             # Если ответ - это JSON-словарь
@@ -176,7 +206,9 @@ class APIFlampProfiles(APIView):
                              status="Данные собраны",
                              )
 
-                return Response({"status": "Данные собраны", "result": result}, status=200)
+                body = {"status": "Данные собраны", "result": result}
+                last_known_good.remember(lkg_key, body)
+                return Response(body, status=200)
 
         except httpx.RequestError as exc:
             log_error_response(
@@ -196,61 +228,124 @@ class APIFlampProfiles(APIView):
             )
             return Response({"error": "Внутренняя ошибка сервера"}, status=500)
 
-    def fetch_stats(self, request):
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    def _local_reviews(self, request, filial_id, rating, fallback=False):
+        """
+        Отзывы филиала из локальной БД в том же формате, что и с микросервиса.
+        При fallback=True (микросервис ответил ошибкой) возвращает None, если отдать нечего.
+        """
+        try:
+            reviews = find_local_reviews(FLAMP, request.user, filial_id, request.GET, rating=rating)
+        except ValueError as e:
+            if fallback:
+                return None
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+
+        if reviews is None:
+            if fallback:
+                return None
+            return Response({'error': "Филиал не найден"}, status=404)
+        if fallback and not reviews:
+            return None
+
+        if reviews:
+            result = {
+                "reviews_count": len(reviews),
+                "reviews": [serialize_review(FLAMP, review) for review in reviews],
+            }
+            response = Response({"status": "Данные собраны", "result": result}, status=200)
+        else:
+            response = Response({"status": "Нет отзывов"}, status=200)
 
+        log_response(request=request, request_name="Отзывы Flamp из локальной БД",
+                     review_count=len(reviews),
+                     filial_id=filial_id,
+                     fallback=fallback
+                     )
 
+        response['X-Reviews-Source'] = 'local'
+        return response
 
+    def _local_stats(self, request, filial_id):
+        """
+        Статистика филиала по локально сохранённым отзывам в формате статистики 2GIS.
+        Возвращает None, если отзывы филиала ещё не синхронизировались. Пока история отзывов не загружена
+        целиком (history_synced_at), статистика помечается "partial": true.
+        """
+        filial = get_user_filial(FLAMP, request.user, filial_id)
+        if filial is None:
+            return None
+        stats = get_filial_stats(FLAMP, filial)
+        if stats is None:
+            return None
+
+        counters = {field: getattr(stats, field) for field in COUNTER_FIELDS}
+        result = counters_result(counters)
+        log_response(request=request, request_name="Статистика Flamp из локальной БД",
+                     result={"count_reviews": result["count_reviews"], "rating": result["rating"]},
+                     status="Данные собраны",
+                     )
 
+        body = {"status": "Данные собраны", "result": result}
+        if filial.history_synced_at is None:
+            body["partial"] = True
+        response = Response(body, status=200)
+        response['X-Stats-Source'] = 'local'
+        return response
 
+    def fetch_stats(self, request):
+        """
+        Получение статистики филиала Flamp.
 
+        Микросервис Flamp отдаёт только страницы отзывов, отдельного эндпоинта статистики у него нет, поэтому
+        статистика считается по отзывам, сохранённым синхронизацией (X-Stats-Source: local).
+        Формат ответа совпадает с аналогичным эндпоинтом 2GIS.
 
+        :param request: Объект HTTP-запроса, содержащий параметры:
+            - filial_id (int): ID филиала Flamp (обязательный).
 
+        :return: Объект Response с JSON-ответом:
+            - status (str): Статус ответа ("Данных нет", "Данные собраны").
+            - result (dict, optional): Количество и процент оценок по звёздам, средний рейтинг и кол-во отзывов.
+            - partial (bool, optional): true, если история отзывов филиала ещё не загружена целиком.
+        """
+        filial_id = request.GET.get('filial_id')
 
+        # Проверка обязательного параметра
+        if not filial_id:
+            log_request_missing_items(request, ['filial_id'], 'params', 'missing_params')
+            return Response({"error": "Отсутствует обязательный параметр - filial_id"}, status=400)
 
+        local_stats = self._local_stats(request, filial_id)
+        if local_stats is not None:
+            return local_stats
 
+        log_response(request=request, request_name="Статистика Flamp из локальной БД",
+                     result=None, status="Данных нет",
+                     )
+        return Response({"status": "Данных нет"}, status=200)
 
     # --------------------------------------------------
     # Вспомогательные асинхронные методы для запросов
     # --------------------------------------------------
-    async def _async_get(self, url, params=None):
+    async def _async_get(self, url, params=None, priority=upstream.INTERACTIVE):
         """
-        Асинхронный GET-запрос, возвращает либо словарь (response.json()),
+        Асинхронный GET-запрос, возвращает либо словарь (тело ответа, декодированное msgspec),
         либо DRF Response (при ошибке).
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-
-                logger.info(
-                    "Успешный GET-запрос к микросервису",
-                    extra={
-                        "url": url,
-                        "method": "GET",
-                        "params": params,
-                        "status_code": response.status_code,
-                    }
-                )
-                return response.json()
+            response = await upstream.request('GET', url, priority=priority, params=params)
+            response.raise_for_status()
+
+            logger.info(
+                "Успешный GET-запрос к микросервису",
+                extra={
+                    "url": url,
+                    "method": "GET",
+                    "params": params,
+                    "status_code": response.status_code,
+                }
+            )
+            return response_json(response)
         except httpx.TimeoutException as exc:
             logger.error(
                 "Тайм-аут при запросе к микросервису",
@@ -288,25 +383,24 @@ class APIFlampProfiles(APIView):
             return Response({"error": f"Ошибка микросервиса Flamp: {exc.response.status_code}"},
                             status=exc.response.status_code)
 
-    async def _async_post(self, url, payload):
+    async def _async_post(self, url, payload, priority=upstream.INTERACTIVE):
         """
         Асинхронный POST-запрос, возвращает сам объект response (чтобы мы взяли .status_code и т.п.),
         либо DRF Response (при ошибке).
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
-
-                logger.info(
-                    "Успешный POST-запрос к микросервису",
-                    extra={
-                        "url": url,
-                        "method": "POST",
-                        "payload": payload,
-                        "status_code": response.status_code,
-                    }
-                )
-                return response
+            response = await upstream.request('POST', url, priority=priority, json=payload)
+
+            logger.info(
+                "Успешный POST-запрос к микросервису",
+                extra={
+                    "url": url,
+                    "method": "POST",
+                    "payload": payload,
+                    "status_code": response.status_code,
+                }
+            )
+            return response
 
         except httpx.TimeoutException as exc:
             logger.error(
@@ -11,12 +11,18 @@ from FeedbackGenerator.utils.check_method import check_method
 from FeedbackGenerator.utils.logging_templates import log_request_not_allowed, log_response, log_error_response, \
     log_request_missing_items
 from FeedbackGenerator.utils.mask_data import mask_sensitive_data
-from main_site.models import FlampProfile, FlampFilial
+from main_site.models import FlampProfile
 from main_site.services.Flamp.Flamp_service_api import link_profile_to_flamp
+from main_site.services.filial_selection import link_filials
+from main_site.services.platforms import FLAMP
+from main_site.services.list_page import list_page, parse_fields
 from main_site.utils.password import encrypt_password
 
 logger = logging.getLogger(__name__)
 
+# Поля профиля в списке; is_active — связан ли профиль с сервисом
+PROFILE_FIELDS = ('id', 'username', 'name', 'is_active')
+
 
 class FlampProfiles(APIView):
     """
@@ -37,13 +43,14 @@ class FlampProfiles(APIView):
 
         Как работает:
         - Проверяет, что `action` не требует `POST` (иначе возвращает 405).
-        - Берёт у пользователя все его профили из БД.
-        - Формирует JSON-ответ с данными профилей.
+        - Берёт у пользователя его профили из БД: страницу (limit, cursor; по умолчанию 500), только поля из fields.
+        - Формирует JSON-ответ с данными профилей и курсором следующей страницы (next_cursor).
         - Логирует запрос и ответ.
 
         :param request: Запрос от клиента.
         :param action: Игнорируется, но проверяется на некорректные значения.
         :param profile_id: Не используется.
+        Query-параметры (необязательные): limit, cursor, fields (например, "id,name").
         :return: JSON-ответ со списком профилей.
         """
         if action in ['create', 'link', 'update']:
@@ -53,29 +60,21 @@ class FlampProfiles(APIView):
                 status=status.HTTP_405_METHOD_NOT_ALLOWED
             )
 
-        user = request.user
-        # Получаем все профили пользователя
-        flamp_profiles = user.flamp_profiles.all()
-        logger.debug(f'flamp_profiles: {flamp_profiles}')
-
-        # Формируем JSON-ответ
-        profiles_data = [
-            {
-                'id': profile.id,
-                'username': profile.username,
-                'name': profile.name,
-                'is_active': profile.is_active,  # Связано ли с сервисом
-            }
-            for profile in flamp_profiles
-        ]
+        try:
+            fields = parse_fields(request.GET.get('fields'), PROFILE_FIELDS)
+            # Из БД берутся только запрошенные поля текущей страницы
+            profiles_data, next_cursor = list_page(request.user.flamp_profiles.all(), fields, request.GET)
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
 
-        logger.debug(f'profiles_data: {profiles_data}')
+        # Ленивое форматирование: строка собирается, только если DEBUG-запись реально пишется
+        logger.debug('profiles_data: %s', profiles_data)
 
         log_response(request=request, request_name="Профиль Flamp",
                      action=action, profiles_count=len(profiles_data),
                      )
 
-        return Response({'profiles': profiles_data}, status=200)
+        return Response({'profiles': profiles_data, 'next_cursor': next_cursor}, status=200)
 
     def post(self, request, action=None, profile_id=None):
         """
@@ -416,16 +415,8 @@ class FlampProfiles(APIView):
                     'name': filial['name']
                 })
 
-            # Синхронно удаляем старые филиалы
-            FlampFilial.objects.filter(profile=profile).delete()
-
-            # Синхронно создаём новые
-            for filial in filial_data:
-                FlampFilial.objects.create(
-                    flamp_filial_id=int(filial['id']),
-                    profile=profile,
-                    name=filial['name']
-                )
+            # Обновляем филиалы по ID на площадке: отзывы и метки синхронизации сохранившихся филиалов остаются
+            link_filials(FLAMP, profile, filial_data, user_id=user_id)
 
             # Активируем профиль, если есть филиалы
             profile.is_active = True
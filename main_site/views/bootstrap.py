@@ -0,0 +1,49 @@
+import logging
+
+from django.utils.http import parse_etags
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from FeedbackGenerator.utils.logging_templates import log_response
+from main_site.services.bootstrap import tree_etag, user_tree
+
+logger = logging.getLogger(__name__)
+
+
+class BootstrapAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Все профили и филиалы пользователя на 2GIS и Flamp одним запросом (для первой загрузки фронта).
+
+        Поддерживает повторную проверку: если заголовок If-None-Match совпадает с ETag текущего дерева,
+        возвращается 304 без тела. ETag считается по версии дерева (кол-во и updated_at профилей и филиалов),
+        само дерево строится только для ответа 200.
+
+        :return: Объект Response с JSON-ответом:
+            - 2gis (dict): {"profiles": [{id, username, name, is_active,
+              filials: [{id, dgis_filial_id, name, is_active}]}]}.
+            - flamp (dict): То же для Flamp (filials с flamp_filial_id).
+            Заголовок ETag — версия дерева.
+        """
+        etag = tree_etag(request.user)
+
+        if_none_match = request.headers.get('If-None-Match')
+        # Слабое сравнение: после сжатия ответа клиент присылает ETag с префиксом W/
+        not_modified = bool(if_none_match) and (
+            if_none_match.strip() == '*'
+            or etag in (tag.removeprefix('W/') for tag in parse_etags(if_none_match))
+        )
+        tree = {} if not_modified else user_tree(request.user)
+        response = Response(status=304) if not_modified else Response(tree, status=200)
+        response['ETag'] = etag
+        # Браузер может хранить ответ, но обязан перепроверять его при каждом запросе
+        response['Cache-Control'] = 'private, no-cache'
+
+        log_response(request=request, request_name="Профили и филиалы",
+                     not_modified=not_modified,
+                     profiles_count=sum(len(platform['profiles']) for platform in tree.values()),
+                     )
+        return response
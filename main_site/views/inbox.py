@@ -0,0 +1,57 @@
+import logging
+
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from FeedbackGenerator.utils.logging_templates import log_response
+from main_site.services.platforms import PLATFORMS
+from main_site.services.review_inbox import inbox_page, inbox_streams
+from main_site.services.review_store import parse_limit
+
+logger = logging.getLogger(__name__)
+
+
+class InboxAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Общая лента отзывов по всем выбранным филиалам пользователя на 2GIS и Flamp, от новых к старым.
+
+        :param request: Объект HTTP-запроса, содержащий параметры:
+            - platform (str): Только одна площадка — `2gis` или `flamp` (необязательный).
+            - limit (int): Отзывов на странице (необязательный, по умолчанию 20, максимум 100).
+            - cursor (str): Курсор следующей страницы из предыдущего ответа (необязательный).
+
+        :return: Объект Response с JSON-ответом:
+            - reviews (list): Отзывы с полями микросервиса (id, rating, text, created_at, user_name,
+              comments_count, likes_count, photos, is_favorite), а также platform, filial_id и source:
+              `service` — с микросервиса, `local` — из локальной БД, потому что микросервис был недоступен
+              или занят (данные могут отставать на интервал синхронизации).
+            - count (int): Кол-во отзывов на странице.
+            - next_cursor (str | None): Курсор следующей страницы, None — лента закончилась.
+            - local_fallback (list): Потоки («площадка:ID филиала в БД»), прочитанные из локальной БД,
+              потому что микросервис был недоступен.
+        """
+        platform_code = request.GET.get('platform')
+        if platform_code and platform_code not in PLATFORMS:
+            return Response({"error": f"Неизвестная площадка: {platform_code}"}, status=400)
+
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            streams = inbox_streams(request.user, [platform_code] if platform_code else None,
+                                    cursor=request.GET.get('cursor'))
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+
+        reviews, next_cursor, local_fallback = inbox_page(streams, limit)
+
+        log_response(request=request, request_name="Лента отзывов",
+                     streams_count=len(streams),
+                     review_count=len(reviews),
+                     local_fallback=local_fallback,
+                     )
+
+        return Response({"reviews": reviews, "count": len(reviews), "next_cursor": next_cursor,
+                         "local_fallback": local_fallback}, status=200)
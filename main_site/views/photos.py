@@ -0,0 +1,52 @@
+import logging
+
+from django.http import FileResponse, HttpResponseRedirect
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from FeedbackGenerator.utils.logging_templates import log_error_response
+from main_site.services.photo_proxy import PhotoProxyError, check_url, open_thumbnail, thumbnail_width
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра по URL и ширине не меняется: браузер может хранить её год без перепроверки
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+class PhotoProxyAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'photos'
+
+    def get(self, request):
+        """
+        Миниатюра фото отзыва (WebP) из кеша на диске; при первом запросе фото скачивается с CDN площадки.
+
+        :param request: Объект HTTP-запроса, содержащий параметры:
+            - url (str): URL фото из photos отзыва (обязательный, только хосты PHOTO_PROXY_ALLOWED_HOSTS).
+            - width (int): Ширина миниатюры (необязательный), округляется вверх до PHOTO_THUMBNAIL_SIZES.
+        :return: Файл image/webp. Если Pillow недоступен — редирект на оригинал.
+        """
+        url = request.GET.get('url')
+        try:
+            width = thumbnail_width(request.GET.get('width'))
+            check_url(url)
+            file = open_thumbnail(url, width)
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+        except PhotoProxyError as e:
+            if e.status_code >= 500:
+                log_error_response(request=request, service_name='Прокси фото', service_url=url, exception=str(e))
+            return Response({'error': str(e)}, status=e.status_code)
+        except ImportError as e:
+            # Без Pillow миниатюры не сделать — браузер загрузит оригинал напрямую
+            log_error_response(request=request, service_name='Прокси фото', service_url=url, exception=str(e))
+            return HttpResponseRedirect(url)
+        except FileNotFoundError as e:
+            # Очистка кеша другими воркерами удаляет миниатюру быстрее, чем её успевают открыть
+            log_error_response(request=request, service_name='Прокси фото', service_url=url, exception=str(e))
+            return HttpResponseRedirect(url)
+
+        response = FileResponse(file, content_type='image/webp')
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
@@ -0,0 +1,83 @@
+import logging
+
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from FeedbackGenerator.utils.logging_templates import log_request_missing_items, log_response
+from main_site.services.platforms import PLATFORMS
+from main_site.services.review_search import search_reviews
+from main_site.services.review_store import parse_flag, parse_limit, serialize_review
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 2
+
+
+class ReviewSearchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'search'
+
+    def get(self, request):
+        """
+        Полнотекстовый поиск по локально сохранённым отзывам и ответам на них в филиалах пользователя.
+
+        :param request: Объект HTTP-запроса, содержащий параметры:
+            - platform (str): Площадка — `2gis` или `flamp` (обязательный).
+            - q (str): Поисковый запрос, не короче 2 символов (обязательный).
+            - filial_id (str): ID филиала на площадке (необязательный).
+            - rating (int): Рейтинг отзывов для фильтрации (необязательный).
+            - without_answer (bool): Только отзывы без ответа (необязательный).
+            - is_favorite (bool): Только избранные отзывы (необязательный).
+            - limit (int): Лимит количества отзывов (необязательный, по умолчанию 20, максимум 100).
+
+        :return: Объект Response с JSON-ответом:
+            - reviews (list): Отзывы в формате fetch_reviews площадки, от лучших совпадений к худшим, плюс:
+                - filial_id (str): ID филиала на площадке.
+                - rank (float): Релевантность (больше — лучше).
+                - highlight (str): Фрагмент текста с совпадениями в <mark></mark> (HTML, текст отзыва экранирован).
+            - count (int): Кол-во найденных отзывов.
+        """
+        missing_params = [param for param in ('platform', 'q') if not request.GET.get(param)]
+        if missing_params:
+            log_request_missing_items(request, missing_params, 'params', 'missing_params')
+            return Response(
+                {'error': f"Отсутствуют обязательные параметры: {', '.join(missing_params)}"},
+                status=400
+            )
+
+        platform_code = request.GET['platform']
+        query = request.GET['q'].strip()
+        if platform_code not in PLATFORMS:
+            return Response({"error": f"Неизвестная площадка: {platform_code}"}, status=400)
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response({"error": f"Запрос должен быть не короче {MIN_QUERY_LENGTH} символов"}, status=400)
+
+        platform = PLATFORMS[platform_code]
+        rating = request.GET.get('rating')
+        try:
+            hits = search_reviews(
+                platform, request.user, query,
+                limit=parse_limit(request.GET.get('limit')),
+                filial_id=request.GET.get('filial_id'),
+                rating=int(rating) if rating else None,
+                without_answer=parse_flag(request.GET.get('without_answer')),
+                is_favorite=parse_flag(request.GET.get('is_favorite')),
+            )
+        except ValueError as e:
+            return Response({'error': f"Некорректные параметры: {e}"}, status=400)
+
+        reviews = []
+        for review, rank, highlight in hits:
+            data = serialize_review(platform, review)
+            data["filial_id"] = getattr(review.filial, platform.filial_id_field)
+            data["rank"] = rank
+            data["highlight"] = highlight
+            reviews.append(data)
+
+        log_response(request=request, request_name="Поиск по отзывам",
+                     platform=platform_code,
+                     review_count=len(reviews),
+                     )
+
+        return Response({"reviews": reviews, "count": len(reviews)}, status=200)
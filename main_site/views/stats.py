@@ -0,0 +1,97 @@
+import logging
+
+from django.utils.dateparse import parse_date
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from FeedbackGenerator.utils.logging_templates import log_request_missing_items, log_response
+from main_site.services.platforms import PLATFORMS
+from main_site.services.review_analytics import PERIODS, rating_series
+from main_site.services.review_stats import user_stats
+
+logger = logging.getLogger(__name__)
+
+
+class StatsAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Сводная статистика оценок пользователя по локально сохранённым отзывам.
+
+        :return: Объект Response с JSON-ответом:
+            - platforms (dict): По каждой площадке (`2gis`, `flamp`):
+                - profiles (list): Статистика по профилям (profile_id, username, filials_count, result).
+                - total (dict): Итог по площадке.
+            - total (dict): Итог по всем площадкам.
+            Формат result/total совпадает с result в fetch_stats.
+        """
+        stats = user_stats(request.user)
+
+        log_response(request=request, request_name="Сводная статистика",
+                     count_reviews=stats["total"]["count_reviews"],
+                     rating=stats["total"]["rating"],
+                     )
+
+        return Response(stats, status=200)
+
+
+class AnalyticsAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Динамика оценок по периодам по дневным агрегатам локально сохранённых отзывов.
+
+        :param request: Объект HTTP-запроса, содержащий параметры:
+            - platform (str): Площадка — `2gis` или `flamp` (обязательный).
+            - period (str): `day`, `week` (по умолчанию) или `month`.
+            - date_from (str): Первый день диапазона, YYYY-MM-DD (необязательный, по умолчанию год назад).
+            - date_to (str): Последний день диапазона включительно, YYYY-MM-DD (необязательный, по умолчанию сегодня).
+            - filial_id (str): ID филиала на площадке — ряд только по нему (необязательный).
+            - profile_id (int): ID профиля — ряд по всем его филиалам (необязательный).
+
+        :return: Объект Response с JSON-ответом:
+            - platform (str), period (str): Параметры запроса.
+            - series (list): По одному элементу на период, в котором были отзывы:
+                - period (str): Начало периода, YYYY-MM-DD.
+                - Остальные поля совпадают с result в fetch_stats (кол-во и проценты по звёздам, rating, count_reviews).
+        """
+        platform_code = request.GET.get('platform')
+        if not platform_code:
+            log_request_missing_items(request, ['platform'], 'params', 'missing_params')
+            return Response({"error": "Отсутствует обязательный параметр - platform"}, status=400)
+        if platform_code not in PLATFORMS:
+            return Response({"error": f"Неизвестная площадка: {platform_code}"}, status=400)
+
+        period = request.GET.get('period', 'week')
+        if period not in PERIODS:
+            return Response({"error": f"period должен быть одним из: {', '.join(PERIODS)}"}, status=400)
+
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            value = request.GET.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response({"error": f"Некорректная дата {param}: {value}"}, status=400)
+
+        profile_id = request.GET.get('profile_id')
+        if profile_id and not profile_id.isdigit():
+            return Response({"error": f"Некорректный profile_id: {profile_id}"}, status=400)
+
+        series = rating_series(
+            PLATFORMS[platform_code], request.user, period=period,
+            filial_id=request.GET.get('filial_id'), profile_id=profile_id, **dates,
+        )
+
+        log_response(request=request, request_name="Динамика оценок",
+                     platform=platform_code,
+                     period=period,
+                     points=len(series),
+                     )
+
+        return Response({"platform": platform_code, "period": period, "series": series}, status=200)